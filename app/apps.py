@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
+
+    def ready(self):
+        # Hook up catalog / customer lookup cache invalidation and the
+        # sales rollup's handling of deleted cashiers
+        from . import catalog, customers, rollup  # noqa: F401
@@ -0,0 +1,168 @@
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from .catalog import product_cache
+from .db import UPSERT_VENDORS
+from .models import CartItem
+
+# Cart line mutations for the till.
+#
+# Scans are applied as increments in the database instead of
+# read-modify-write in Python, so two scans of the same item arriving
+# together (double trigger on a barcode gun, two tabs) both count and
+# never trip unique_together('cart', 'product').
+#
+# On PostgreSQL / SQLite a whole batch of scans is ONE statement:
+#   INSERT ... ON CONFLICT (cart_id, product_id)
+#   DO UPDATE SET quantity = quantity + EXCLUDED.quantity
+
+MAX_UNITS_PER_SCAN = 999
+
+
+class BadCartOperation(ValueError):
+    pass
+
+
+class InvalidQuantity(BadCartOperation):
+    pass
+
+
+def parse_units(value, default=1):
+    if value in (None, ""):
+        return default
+    try:
+        units = int(value)
+    except (TypeError, ValueError):
+        raise InvalidQuantity("quantity must be a whole number.")
+    if not 1 <= units <= MAX_UNITS_PER_SCAN:
+        raise InvalidQuantity(f"quantity must be between 1 and {MAX_UNITS_PER_SCAN}.")
+    return units
+
+
+def add_items(cart_id, quantities):
+    # quantities: {product_id: units to add}
+    if not quantities:
+        return
+    if connection.vendor in UPSERT_VENDORS:
+        _upsert(cart_id, quantities)
+    else:
+        for product_id, units in sorted(quantities.items()):
+            _increment(cart_id, product_id, units)
+
+
+def add_item(cart_id, product_id, units=1):
+    add_items(cart_id, {product_id: units})
+
+
+def set_quantity(cart_id, product_id, units):
+    # Absolute quantity (the +/- buttons); 0 or less removes the line
+    lines = CartItem.objects.filter(cart_id=cart_id, product_id=product_id)
+    if units <= 0:
+        lines.delete()
+    else:
+        lines.update(quantity=units)
+
+
+# ======================================================
+# BATCHED OPERATIONS (one request per burst of scans)
+# ======================================================
+
+OPERATIONS = ("add", "set", "remove")
+
+
+def _resolve(op):
+    if op.get("product_id") is not None:
+        try:
+            return product_cache.get(op["product_id"])
+        except (TypeError, ValueError):
+            return None
+    return product_cache.get_by_code(str(op.get("code", "")).strip())
+
+
+def build_operations(raw_ops):
+    # -> ([(op, product_id, units)], [unknown product ids / codes])
+    if not isinstance(raw_ops, list):
+        raise BadCartOperation("ops must be a list.")
+    ops, missing = [], []
+    for raw in raw_ops:
+        if not isinstance(raw, dict):
+            raise BadCartOperation("Each operation must be an object.")
+        kind = raw.get("op", "add")
+        if kind not in OPERATIONS:
+            raise BadCartOperation(f"Unknown operation '{kind}'.")
+
+        if kind == "add":
+            units = parse_units(raw.get("quantity"))
+        elif kind == "set":
+            units = _whole_number(raw.get("quantity"))
+        else:
+            units = 0
+
+        product = _resolve(raw)
+        if product is None:
+            missing.append(raw.get("product_id") or raw.get("code"))
+            continue
+        ops.append((kind, product.id, units))
+    return ops, missing
+
+
+def _whole_number(value):
+    try:
+        units = int(value)
+    except (TypeError, ValueError):
+        raise InvalidQuantity("quantity must be a whole number.")
+    if units > MAX_UNITS_PER_SCAN:
+        raise InvalidQuantity(f"quantity must be at most {MAX_UNITS_PER_SCAN}.")
+    return units
+
+
+def apply_operations(cart_id, ops):
+    # Applied in order, in one transaction. Runs of adds are merged into
+    # a single upsert; a set/remove flushes the adds queued before it.
+    pending = {}
+    with transaction.atomic():
+        for kind, product_id, units in ops:
+            if kind == "add":
+                pending[product_id] = pending.get(product_id, 0) + units
+                continue
+            add_items(cart_id, pending)
+            pending = {}
+            set_quantity(cart_id, product_id, units)
+        add_items(cart_id, pending)
+
+
+def _upsert(cart_id, quantities):
+    meta = CartItem._meta
+    qn = connection.ops.quote_name
+    table = qn(meta.db_table)
+    cart_col = qn(meta.get_field("cart").column)
+    product_col = qn(meta.get_field("product").column)
+    quantity_col = qn(meta.get_field("quantity").column)
+
+    # Fixed row order so concurrent batches lock rows in the same order
+    rows = sorted(quantities.items())
+    params = []
+    for product_id, units in rows:
+        params += [cart_id, product_id, units]
+
+    sql = (
+        f"INSERT INTO {table} ({cart_col}, {product_col}, {quantity_col}) "
+        f"VALUES {', '.join(['(%s, %s, %s)'] * len(rows))} "
+        f"ON CONFLICT ({cart_col}, {product_col}) "
+        f"DO UPDATE SET {quantity_col} = {table}.{quantity_col} + EXCLUDED.{quantity_col}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _increment(cart_id, product_id, units):
+    # Portable fallback: UPDATE ... quantity = quantity + n, INSERT on the
+    # first scan, and retry the UPDATE if another scan won the INSERT.
+    lines = CartItem.objects.filter(cart_id=cart_id, product_id=product_id)
+    if lines.update(quantity=F("quantity") + units):
+        return
+    try:
+        with transaction.atomic():
+            CartItem.objects.create(cart_id=cart_id, product_id=product_id, quantity=units)
+    except IntegrityError:
+        lines.update(quantity=F("quantity") + units)
@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Product
+
+# In-process product cache for the till hot path (scans and lookups).
+#
+# - bounded LRU, keyed by id and by product_code
+# - unknown ids/codes go to a small LRU of their own, so partial barcodes
+#   typed on the till neither hit the database on every keystroke nor
+#   evict real products
+# - every entry remembers the catalog version it was read under; any
+#   product save/delete bumps the version (see signals below), which
+#   makes all older entries misses
+# - the version lives in Django's cache, so with a shared cache backend
+#   (memcached/redis) an edit in one worker invalidates every worker.
+#   With the default local-memory cache the TTL bounds staleness.
+#
+# Cached products are shared between requests: treat them as read-only,
+# and never trust their stock_quantity (checkout re-reads stock under a
+# row lock).
+
+VERSION_KEY = "catalog_version"
+MISSING = object()
+
+
+class ProductCache:
+    def __init__(self, max_size=None, ttl=None, miss_size=None):
+        self.max_size = max_size or getattr(settings, "CATALOG_CACHE_SIZE", 5000)
+        self.miss_size = miss_size or getattr(settings, "CATALOG_MISS_CACHE_SIZE", 256)
+        self.ttl = ttl or getattr(settings, "CATALOG_CACHE_TTL", 60)
+        self._entries = OrderedDict()
+        self._unknown = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ---------- public API ----------
+
+    def get(self, product_id):
+        return self._get(("id", int(product_id)), lambda: Product.objects.filter(id=product_id).first())
+
+    def get_by_code(self, code):
+        return self._get(("code", code), lambda: Product.objects.filter(product_code=code).first())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._unknown.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "unknown_size": len(self._unknown),
+                "max_size": self.max_size,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+    # ---------- internals ----------
+
+    def _get(self, key, load):
+        version = current_version()
+        now = time.monotonic()
+
+        with self._lock:
+            for entries in (self._entries, self._unknown):
+                entry = entries.get(key)
+                if entry is not None:
+                    value, entry_version, expires = entry
+                    if entry_version == version and expires > now:
+                        entries.move_to_end(key)
+                        self.hits += 1
+                        return None if value is MISSING else value
+                    del entries[key]
+            self.misses += 1
+
+        product = load()
+
+        with self._lock:
+            if product is None:
+                self._unknown[key] = (MISSING, version, now + self.ttl)
+                self._unknown.move_to_end(key)
+                while len(self._unknown) > self.miss_size:
+                    self._unknown.popitem(last=False)
+            else:
+                # Fill the other key as well
+                other = ("code", product.product_code) if key[0] == "id" else ("id", product.id)
+                self._put(key, product, version, now)
+                self._put(other, product, version, now)
+        return product
+
+    def _put(self, key, value, version, now):
+        self._entries[key] = (value, version, now + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+def current_version():
+    return cache.get(VERSION_KEY, 0)
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def invalidate_catalog():
+    # Call this after bulk writes (bulk_create / update) that skip signals
+    _bump(VERSION_KEY)
+
+
+product_cache = ProductCache()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def _product_changed(sender, **kwargs):
+    invalidate_catalog()
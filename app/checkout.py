@@ -0,0 +1,115 @@
+from django.db import transaction
+from django.db.models import F, Q, Case, When, PositiveIntegerField
+
+from .models import Product, Cart, Invoice, InvoiceItem, compute_totals
+from .rollup import record_invoice
+from .sequences import next_invoice_number
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class EmptyCart(CheckoutError):
+    def __init__(self):
+        super().__init__("Cart is empty.")
+
+
+class OutOfStock(CheckoutError):
+    def __init__(self, product_name):
+        self.product_name = product_name
+        super().__init__(f"Not enough stock for {product_name}")
+
+
+# ======================================================
+# INVOICE FINALIZATION
+# ======================================================
+
+def finalize_invoice(cart, cashier, customer, payment_method):
+    # Everything happens in ONE transaction with a fixed number of
+    # queries, whatever the basket size:
+    #   lock cart -> read lines -> lock products (id order) -> insert
+    #   invoice -> bulk insert items -> one conditional stock update
+    #   -> bump the daily and per-product sales rollups
+    #
+    # The invoice number is taken first: its block reservation commits on
+    # its own and must not be rolled back with a failed checkout.
+    invoice_number = next_invoice_number()
+
+    with transaction.atomic():
+        # Lock the cart so two clicks on "pay" can't bill it twice
+        cart = (
+            Cart.objects.select_for_update()
+            .filter(id=cart.id, status="active")
+            .first()
+        )
+        if cart is None:
+            raise EmptyCart()
+
+        lines = dict(cart.items.values_list("product_id", "quantity"))
+        if not lines:
+            raise EmptyCart()
+
+        # Lock only the products in this basket, always in id order so
+        # two tills selling overlapping baskets can't deadlock.
+        products = list(
+            Product.objects.select_for_update()
+            .filter(id__in=lines)
+            .order_by("id")
+        )
+
+        # Stock check in one pass over the locked rows
+        for product in products:
+            if lines[product.id] > product.stock_quantity:
+                raise OutOfStock(product.product_name)
+
+        sub_total = sum(p.price * lines[p.id] for p in products)
+        totals = compute_totals(sub_total)
+
+        invoice = Invoice.objects.create(
+            invoice_number=invoice_number,
+            cashier=cashier,
+            customer=customer,
+            sub_total=totals["sub_total"],
+            total_gst=totals["total_gst"],
+            grand_total=totals["grand_total"],
+            payment_method=payment_method,
+            status="paid",
+        )
+
+        items = InvoiceItem.objects.bulk_create([
+            InvoiceItem(
+                invoice=invoice,
+                product=p,
+                product_name=p.product_name,
+                price_at_sale=p.price,
+                cost_at_sale=p.cost_price,
+                quantity=lines[p.id],
+            )
+            for p in products
+        ])
+
+        # Single UPDATE for every line. Each row only matches if it
+        # still has enough stock, so even without the row locks the
+        # update can never take stock below zero.
+        enough_stock = Q()
+        for product_id, qty in lines.items():
+            enough_stock |= Q(id=product_id, stock_quantity__gte=qty)
+
+        updated = Product.objects.filter(enough_stock).update(
+            stock_quantity=Case(
+                *[When(id=pid, then=F("stock_quantity") - qty) for pid, qty in lines.items()],
+                default=F("stock_quantity"),
+                output_field=PositiveIntegerField(),
+            )
+        )
+        if updated != len(lines):
+            # Rolls back the invoice and items as well
+            raise CheckoutError("Stock changed during checkout, please retry.")
+
+        # Keep the reporting rollups in step, in the same transaction
+        record_invoice(invoice, list(zip(items, products)))
+
+        cart.status = "completed"
+        cart.save(update_fields=["status", "updated_at"])
+    return invoice, cart
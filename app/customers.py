@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Customer, normalize_phone, DEFAULT_COUNTRY_CODE
+
+# Customer lookup by phone for the checkout screen.
+#
+# Every stage is an indexed prefix scan with a LIMIT (no substring
+# scans), tried in rank order until enough candidates are found:
+#
+#   exact   phone_normalized = <full number>
+#   prefix  phone_normalized LIKE '<digits>%'  (typed from the start)
+#   suffix  phone_reversed LIKE '<reversed>%'  (typed the last digits)
+#
+# Results for recent queries are kept in a small LRU; any customer
+# save/delete bumps a version in Django's cache and invalidates it.
+
+MIN_DIGITS = 3
+MAX_CANDIDATES = 5
+VERSION_KEY = "customers_version"
+FIELDS = ("id", "name", "phone", "email")
+
+
+def _candidates(digits, limit):
+    normalized = normalize_phone(digits)
+    stages = []
+    if len(normalized) > len(digits):
+        stages.append(Customer.objects.filter(phone_normalized=normalized))
+    prefixes = {digits, DEFAULT_COUNTRY_CODE + digits}
+    for prefix in sorted(prefixes, key=len, reverse=True):
+        stages.append(Customer.objects.filter(phone_normalized__startswith=prefix))
+    stages.append(Customer.objects.filter(phone_reversed__startswith=digits[::-1]))
+
+    found = OrderedDict()
+    for stage in stages:
+        if len(found) >= limit:
+            break
+        rows = stage.exclude(id__in=list(found)).order_by("phone_normalized").values(*FIELDS)
+        for row in rows[:limit - len(found)]:
+            found[row["id"]] = row
+    return list(found.values())
+
+
+class CustomerLookupCache:
+    def __init__(self, max_size=None, ttl=None):
+        self.max_size = max_size or getattr(settings, "CUSTOMER_LOOKUP_CACHE_SIZE", 2048)
+        self.ttl = ttl or getattr(settings, "CUSTOMER_LOOKUP_CACHE_TTL", 30)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digits, load):
+        key = (cache.get(VERSION_KEY, 0), digits)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        value = load()
+        with self._lock:
+            self._entries[key] = (value, now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+lookup_cache = CustomerLookupCache()
+
+
+def find_customers(query, limit=MAX_CANDIDATES):
+    digits = "".join(ch for ch in str(query or "") if ch.isdigit())
+    if len(digits) < MIN_DIGITS:
+        return []
+    return lookup_cache.get((digits, limit), lambda: _candidates(digits, limit))
+
+
+def get_or_create_customer(phone, name=""):
+    # Matches on the normalized number, so "+91 98765 43210" at one till
+    # and "9876543210" at another are the same customer.
+    normalized = normalize_phone(phone)
+    if normalized:
+        customer = Customer.objects.filter(phone_normalized=normalized).order_by("id").first()
+        if customer:
+            return customer, False
+    return Customer.objects.get_or_create(phone=phone, defaults={"name": name or "Guest"})
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def _customer_changed(sender, **kwargs):
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, timeout=None)
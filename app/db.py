@@ -0,0 +1,6 @@
+# Database capabilities shared by the modules that write with raw SQL
+# (carts.py, rollup.py).
+
+# Backends with INSERT ... ON CONFLICT ... DO UPDATE. Elsewhere callers
+# fall back to an F() update / create loop.
+UPSERT_VENDORS = ("postgresql", "sqlite")
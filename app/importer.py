@@ -0,0 +1,307 @@
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .catalog import invalidate_catalog
+from .models import Product
+from .sequences import allocate_product_codes
+
+# Bulk catalog import for upload_products.
+#
+#   parse (JSON array / NDJSON / CSV, streamed) -> validate in batches
+#   -> upsert on product_code with bulk_create(update_conflicts=True)
+#
+# Bad rows are skipped and reported; good rows are written in chunks
+# that commit one at a time, so memory use is bounded by the batch size
+# rather than the file size, and no lock is held for the whole upload.
+# If an upload stops half way, the batches before that point stay
+# imported; uploading the file again is safe (it's an upsert).
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 500
+# Longest partial token that can sit at the end of a read buffer: a
+# literal ("fals"), number ("-1.5e") or escape ("\\u12")
+MAX_PARTIAL_TOKEN = 8
+# Largest value a PositiveIntegerField holds on PostgreSQL
+MAX_COUNT = 2147483647
+
+UPDATE_FIELDS = [
+    "product_name", "category", "price", "cost_price", "manufacturer",
+    "stock_quantity", "low_stock_threshold", "description", "status",
+]
+CATEGORIES = {c for c, _ in Product.CATEGORY_CHOICES}
+STATUSES = {s for s, _ in Product.STATUS_CHOICES}
+
+
+class RowError(Exception):
+    pass
+
+
+# ======================================================
+# PARSERS (all yield dicts, one row at a time)
+# ======================================================
+
+def iter_json_array(stream, chunk_size=64 * 1024):
+    # Incremental parser for a top-level JSON array: decodes one element
+    # at a time from a sliding buffer instead of loading the whole file.
+    # Only an element cut off by the end of the buffer triggers a read;
+    # any other decode error is reported at once.
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    offset = 0  # characters dropped from the front of buf
+    started = False
+    eof = False
+
+    def read_more():
+        nonlocal buf, pos, offset, eof
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+            return
+        offset += pos
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    while True:
+        # skip whitespace and separators
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise RowError("Unexpected end of file: the JSON array is not closed.")
+            read_more()
+            continue
+        if not started:
+            if buf[pos] != "[":
+                raise RowError("Expected a JSON array of products.")
+            started = True
+            pos += 1
+            continue
+        if buf[pos] == "]":
+            return
+
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError as e:
+            if eof or not _truncated(buf, e):
+                raise RowError(f"Malformed JSON at character {offset + e.pos}: {e.msg}.")
+            read_more()
+            continue
+
+        # An object/array ending at the buffer edge is complete, but a
+        # number might continue in the next chunk ("-5" + ".0")
+        follows = buf[end:end + 1]
+        cut_off = follows == "" or (follows not in " \t\r\n,]" and len(buf) - end <= MAX_PARTIAL_TOKEN)
+        if cut_off and not eof and not isinstance(item, (dict, list)):
+            read_more()
+            if not eof:
+                continue
+
+        yield item
+        pos = end
+
+
+def _truncated(buf, error):
+    # An unterminated string runs to the end of the buffer (a string
+    # can't contain a raw newline, so a bad one fails earlier on that);
+    # anything else must fail within the last few characters.
+    if error.msg.startswith("Unterminated string"):
+        return True
+    return len(buf) - error.pos <= MAX_PARTIAL_TOKEN
+
+
+def iter_ndjson(stream):
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield RowError(f"Line {line_no} is not valid JSON.")
+
+
+def iter_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+def detect_format(filename, stream):
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+
+    # Sniff the first non-blank character
+    head = stream.read(1)
+    while head and head.isspace():
+        head = stream.read(1)
+    stream.seek(0)
+    if head == "[":
+        return "json"
+    if head == "{":
+        return "ndjson"
+    return "csv"
+
+
+def iter_rows(uploaded_file):
+    stream = io.TextIOWrapper(uploaded_file, encoding="utf-8-sig", newline="")
+    fmt = detect_format(getattr(uploaded_file, "name", ""), stream)
+    if fmt == "json":
+        return iter_json_array(stream)
+    if fmt == "ndjson":
+        return iter_ndjson(stream)
+    return iter_csv(stream)
+
+
+# ======================================================
+# VALIDATION
+# ======================================================
+
+def _text(row, field, required=False, max_length=None):
+    value = row.get(field)
+    value = "" if value is None else str(value).strip()
+    if required and not value:
+        raise RowError(f"{field} is required.")
+    if max_length and len(value) > max_length:
+        raise RowError(f"{field} is longer than {max_length} characters.")
+    return value
+
+
+def _decimal(row, field, default=None):
+    value = row.get(field)
+    if value in (None, ""):
+        if default is None:
+            raise RowError(f"{field} is required.")
+        return default
+    try:
+        value = Decimal(str(value)).quantize(Decimal("0.01"))
+        # quantize() lets "NaN" through, and NaN can't be compared
+        if not value.is_finite():
+            raise InvalidOperation
+        in_range = 0 <= value < Decimal("1e8")
+    except InvalidOperation:
+        raise RowError(f"{field} must be a number.")
+    if not in_range:
+        raise RowError(f"{field} is out of range.")
+    return value
+
+
+def _count(row, field, default=None):
+    value = row.get(field)
+    if value in (None, ""):
+        if default is None:
+            raise RowError(f"{field} is required.")
+        return default
+    # int() would truncate 5.7 from JSON and accept true/false
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise RowError(f"{field} must be a whole number.")
+    try:
+        value = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise RowError(f"{field} must be a whole number.")
+    if value < 0:
+        raise RowError(f"{field} cannot be negative.")
+    if value > MAX_COUNT:
+        raise RowError(f"{field} must be at most {MAX_COUNT}.")
+    return value
+
+
+def build_product(row):
+    if isinstance(row, RowError):
+        raise row
+    if not isinstance(row, dict):
+        raise RowError("Each product must be an object.")
+
+    category = _text(row, "category", required=True).lower()
+    if category not in CATEGORIES:
+        raise RowError(f"Unknown category '{category}'.")
+    status = _text(row, "status").lower() or "active"
+    if status not in STATUSES:
+        raise RowError(f"Unknown status '{status}'.")
+
+    return Product(
+        product_name=_text(row, "product_name", required=True, max_length=100),
+        # Blank codes are allocated from the product code sequence on flush
+        product_code=_text(row, "product_code", max_length=20),
+        category=category,
+        price=_decimal(row, "price"),
+        cost_price=_decimal(row, "cost_price", default=Decimal("0")),
+        manufacturer=_text(row, "manufacturer", max_length=255) or None,
+        stock_quantity=_count(row, "stock_quantity"),
+        low_stock_threshold=_count(row, "low_stock_threshold", default=10),
+        description=_text(row, "description"),
+        status=status,
+    )
+
+
+# ======================================================
+# IMPORT
+# ======================================================
+
+def _flush(batch):
+    # Codes are reserved before the write, outside any transaction (see
+    # sequences.py), so add_product never waits for an import.
+    new = [p for p in batch if not p.product_code]
+    for product, code in zip(new, allocate_product_codes(len(new))):
+        product.product_code = code
+    with transaction.atomic():
+        Product.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=["product_code"],
+            update_fields=UPDATE_FIELDS,
+        )
+
+
+def import_products(rows, batch_size=BATCH_SIZE):
+    report = {"imported": 0, "failed": 0, "errors": []}
+    # Codes in the current batch only, so memory doesn't grow with the
+    # file. A code repeated in a later batch is upserted again (the last
+    # row wins), as if the rows had come in two uploads.
+    seen_codes = {}
+    batch = []
+
+    def fail(row_no, code, message):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": row_no, "product_code": code, "error": message})
+
+    try:
+        for row_no, row in enumerate(rows, start=1):
+            try:
+                product = build_product(row)
+            except RowError as e:
+                code = row.get("product_code") if isinstance(row, dict) else None
+                fail(row_no, code, str(e))
+                continue
+
+            # ON CONFLICT can't touch the same row twice in one statement
+            code = product.product_code
+            if code and code in seen_codes:
+                fail(row_no, code, f"Duplicate product_code (first seen on row {seen_codes[code]}).")
+                continue
+            if code:
+                seen_codes[code] = row_no
+
+            batch.append(product)
+            if len(batch) >= batch_size:
+                _flush(batch)
+                report["imported"] += len(batch)
+                batch = []
+                seen_codes.clear()
+    except RowError as e:
+        # The file itself is unreadable past this point
+        fail(None, None, str(e))
+
+    if batch:
+        _flush(batch)
+        report["imported"] += len(batch)
+
+    # bulk_create skips the post_save signal
+    invalidate_catalog()
+    return report
@@ -0,0 +1,194 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection
+
+# Per-route request instrumentation.
+#
+# For every request the middleware records wall time, number of SQL
+# queries, time spent in SQL and response size, keyed by URL pattern
+# (e.g. "/api/report/profit/", "/print-invoice/<int:invoice_id>/"),
+# not by raw path. It:
+#
+# - adds a Server-Timing header (visible in the browser dev tools) with
+#   DEBUG on or for staff, so anonymous clients can't profile the server
+# - logs requests slower than SLOW_REQUEST_MS, or issuing more than
+#   SLOW_REQUEST_QUERIES queries, together with their slowest SQL
+# - keeps counters and latency histograms that /metrics/ serves in the
+#   Prometheus text format
+#
+# Queries are counted with a connection execute_wrapper, so this works
+# with DEBUG off. Counters are per process: with several workers, scrape
+# each one (or sum them in Prometheus).
+
+logger = logging.getLogger("app.slow_requests")
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_SQL_SHOWN = 5
+# Method label values; anything else a client sends is counted as OTHER,
+# so made-up methods can't create new series
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.seconds += elapsed
+            # Keep only the few slowest statements for the slow log
+            self.slowest.append((elapsed, sql))
+            if len(self.slowest) > SLOW_SQL_SHOWN * 4:
+                self.slowest.sort(reverse=True)
+                del self.slowest[SLOW_SQL_SHOWN:]
+
+    def top(self):
+        return sorted(self.slowest, reverse=True)[:SLOW_SQL_SHOWN]
+
+
+class RouteStats:
+    __slots__ = ("requests", "errors", "seconds", "db_queries", "db_seconds", "bytes", "buckets")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.bytes = 0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+
+class Registry:
+    def __init__(self):
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route, method, status, seconds, queries, db_seconds, size):
+        with self._lock:
+            stats = self._routes.get((route, method))
+            if stats is None:
+                stats = self._routes[(route, method)] = RouteStats()
+            stats.requests += 1
+            stats.errors += status >= 500
+            stats.seconds += seconds
+            stats.db_queries += queries
+            stats.db_seconds += db_seconds
+            stats.bytes += size
+            stats.buckets[bisect_left(BUCKETS, seconds)] += 1
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {key: _copy(stats) for key, stats in self._routes.items()}
+
+    def render(self):
+        # Prometheus text exposition format 0.0.4
+        routes = sorted(self.snapshot().items())
+        lines = []
+
+        def family(name, kind, help_text, attr):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (route, method), stats in routes:
+                lines.append(f'{name}{{route="{_escape(route)}",method="{_escape(method)}"}} {getattr(stats, attr)}')
+
+        family("http_requests_total", "counter", "Requests handled.", "requests")
+        family("http_server_errors_total", "counter", "Requests that returned 5xx.", "errors")
+        family("http_db_queries_total", "counter", "SQL queries issued.", "db_queries")
+        family("http_db_seconds_total", "counter", "Time spent in SQL.", "db_seconds")
+        family("http_response_bytes_total", "counter", "Response bytes (non-streaming).", "bytes")
+
+        name = "http_request_duration_seconds"
+        lines.append(f"# HELP {name} Wall time per request.")
+        lines.append(f"# TYPE {name} histogram")
+        for (route, method), stats in routes:
+            labels = f'route="{_escape(route)}",method="{_escape(method)}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), stats.buckets):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {stats.seconds}")
+            lines.append(f"{name}_count{{{labels}}} {stats.requests}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _copy(stats):
+    copy = RouteStats()
+    for attr in RouteStats.__slots__:
+        value = getattr(stats, attr)
+        setattr(copy, attr, list(value) if isinstance(value, list) else value)
+    return copy
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry()
+
+
+def route_of(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "<unmatched>"
+    return "/" + match.route
+
+
+def _is_staff(request):
+    # Only looks at a user the request already loaded (AuthenticationMiddleware
+    # caches it on first access), so anonymous and cookie-only requests don't
+    # pay a session and user query just for the header
+    user = getattr(request, "_cached_user", None)
+    return user is not None and user.is_staff
+
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        seconds = time.perf_counter() - start
+
+        # Streaming bodies are produced after we return; only the time
+        # to the first byte and the queries before it are counted.
+        size = 0 if response.streaming else len(response.content)
+        route = route_of(request)
+        method = request.method if request.method in METHODS else "OTHER"
+        registry.observe(route, method, response.status_code, seconds, recorder.count, recorder.seconds, size)
+
+        if settings.DEBUG or _is_staff(request):
+            response["Server-Timing"] = (
+                f'app;dur={seconds * 1000:.1f}, '
+                f'db;dur={recorder.seconds * 1000:.1f};desc="{recorder.count} queries"'
+            )
+
+        slow_ms = getattr(settings, "SLOW_REQUEST_MS", 500)
+        slow_queries = getattr(settings, "SLOW_REQUEST_QUERIES", 50)
+        if seconds * 1000 >= slow_ms or recorder.count > slow_queries:
+            logger.warning(
+                "Slow request %s %s (%s): %.0f ms, %d queries, %.0f ms in SQL\n%s",
+                request.method, request.path, route, seconds * 1000, recorder.count,
+                recorder.seconds * 1000,
+                "\n".join(f"  {elapsed * 1000:8.1f} ms  {sql[:500]}" for elapsed, sql in recorder.top()),
+            )
+        return response
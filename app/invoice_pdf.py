@@ -3,44 +3,161 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from reportlab.lib.units import inch
+from PIL import Image as PILImage
 from django.http import HttpResponse
+from django.db.models import prefetch_related_objects
+from collections import OrderedDict
+from functools import lru_cache
+import hashlib
+import io
 import os
+import threading
 from django.conf import settings
 
+# Bump when the layout below changes so cached PDFs are not reused
+LAYOUT_VERSION = 2
+
+LOGO_WIDTH, LOGO_HEIGHT = 120, 50
+
+
+# ──────────────────────────────────────────────────────────
+# SHARED RESOURCES (built once per process)
+# ──────────────────────────────────────────────────────────
+@lru_cache(maxsize=None)
+def get_styles():
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name="InvoiceTitle", fontSize=22, leading=28, alignment=1, spaceAfter=20))
+    styles.add(ParagraphStyle(name="Heading", fontSize=14, leading=16, spaceAfter=10, textColor=colors.HexColor("#007bff")))
+    styles.add(ParagraphStyle(name="NormalBold", fontSize=12, leading=14, spaceAfter=8, fontName="Helvetica-Bold"))
+    return styles
+
+
+@lru_cache(maxsize=None)
+def get_logo_bytes():
+    # The source logo is a 1024x1024 PNG drawn at 120x50pt. Embedding it
+    # as-is makes ReportLab re-compress ~3 MB of pixels into every PDF,
+    # which dominates render time, so downscale it once to 3x the drawn
+    # size (plenty for print).
+    logo_path = os.path.join(settings.STATICFILES_DIRS[0], "logo.png")
+    if not os.path.exists(logo_path):
+        return None
+
+    with PILImage.open(logo_path) as img:
+        img = img.convert("RGB").resize((LOGO_WIDTH * 3, LOGO_HEIGHT * 3), PILImage.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def get_logo():
+    # A new flowable per document: Image keeps per-draw state (and its
+    # own file position), so one instance can't be shared by concurrent
+    # renders. Only the resized bytes are cached.
+    data = get_logo_bytes()
+    if data is None:
+        return None
+    return Image(io.BytesIO(data), width=LOGO_WIDTH, height=LOGO_HEIGHT)
+
+
+# ──────────────────────────────────────────────────────────
+# RENDERED PDF CACHE
+# ──────────────────────────────────────────────────────────
+class PdfCache:
+    # In-process LRU of rendered PDFs, bounded by total bytes. Keys are
+    # a hash of everything printed that can change after checkout
+    # (status, the customer's name and phone) plus the invoice identity
+    # and layout version.
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes or getattr(settings, "INVOICE_PDF_CACHE_BYTES", 64 * 1024 * 1024)
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(invoice):
+        customer = invoice.customer
+        raw = repr((
+            LAYOUT_VERSION, invoice.id, invoice.invoice_number, invoice.status, str(invoice.grand_total),
+            customer.name if customer else None, customer.phone if customer else None,
+        ))
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key))
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self._size -= len(old)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+
+
+pdf_cache = PdfCache()
+
 
 def generate_invoice_pdf(invoice):
+    # Fetch the invoice with .select_related("customer") to keep this
+    # at zero extra queries on a cache hit.
+    key = pdf_cache.key(invoice)
+    data = pdf_cache.get(key)
+    if data is None:
+        data = render_invoice_pdf(invoice)
+        pdf_cache.put(key, data)
+
+    response = HttpResponse(data, content_type="application/pdf")
+    response['Content-Disposition'] = f'attachment; filename="invoice_{invoice.invoice_number}.pdf"'
+    return response
+
+
+def render_invoice_pdf(invoice):
     # ──────────────────────────────────────────────────────────
     # PDF CONFIG
     # ──────────────────────────────────────────────────────────
-    response = HttpResponse(content_type="application/pdf")
-    response['Content-Disposition'] = f'attachment; filename="invoice_{invoice.invoice_number}.pdf"'
+    buffer = io.BytesIO()
 
     pdf = SimpleDocTemplate(
-        response,
+        buffer,
         pagesize=A4,
         rightMargin=30, leftMargin=30,
         topMargin=30, bottomMargin=18
     )
 
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(name="InvoiceTitle", fontSize=22, leading=28, alignment=1, spaceAfter=20))
-    styles.add(ParagraphStyle(name="Heading", fontSize=14, leading=16, spaceAfter=10, textColor=colors.HexColor("#007bff")))
-    styles.add(ParagraphStyle(name="NormalBold", fontSize=12, leading=14, spaceAfter=8, fontName="Helvetica-Bold"))
+    styles = get_styles()
 
+    # One query for all lines (no-op if the caller already prefetched)
+    prefetch_related_objects([invoice], "items")
 
     elements = []
 
     # ──────────────────────────────────────────────────────────
     # COMPANY LOGO
     # ──────────────────────────────────────────────────────────
-    logo_path = os.path.join(settings.STATICFILES_DIRS[0], "logo.png")
-
-    print("LOGO PATH:", logo_path)
-    print("EXISTS:", os.path.exists(logo_path))
-
-
-    if os.path.exists(logo_path):
-        elements.append(Image(logo_path, width=120, height=50))
+    logo = get_logo()
+    if logo is not None:
+        elements.append(logo)
         elements.append(Spacer(1, 12))
 
     # ──────────────────────────────────────────────────────────
@@ -65,9 +182,10 @@ def generate_invoice_pdf(invoice):
     # ──────────────────────────────────────────────────────────
     elements.append(Paragraph("Customer Details", styles["Heading"]))
 
+    customer = invoice.customer
     customer_info = f"""
-    <b>Name:</b> {invoice.customer.name}<br/>
-    <b>Phone:</b> {invoice.customer.phone}<br/>
+    <b>Name:</b> {customer.name if customer else "Walk-in Customer"}<br/>
+    <b>Phone:</b> {customer.phone if customer else "-"}<br/>
     """
 
     elements.append(Paragraph(customer_info, styles["Normal"]))
@@ -136,4 +254,4 @@ def generate_invoice_pdf(invoice):
     elements.append(footer)
 
     pdf.build(elements)
-    return response
+    return buffer.getvalue()
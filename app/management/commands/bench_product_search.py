@@ -0,0 +1,95 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from app.models import Product
+from app.search import get_search_backend
+
+WORDS = [
+    "basmati", "rice", "sugar", "salt", "atta", "dal", "ghee", "butter",
+    "milk", "paneer", "tea", "coffee", "biscuit", "chips", "namkeen",
+    "juice", "soda", "water", "onion", "potato", "tomato", "soap",
+    "shampoo", "oil", "masala", "noodles", "oats", "honey", "jam", "bread",
+]
+CATEGORIES = [c for c, _ in Product.CATEGORY_CHOICES]
+BENCH_PREFIX = "BENCH"
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    idx = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+    return samples[idx]
+
+
+class Command(BaseCommand):
+    help = "Seed a synthetic catalog and measure product_lookup latency (p50/p99)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100_000)
+        parser.add_argument("--queries", type=int, default=2_000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--cleanup", action="store_true",
+                            help="Delete the seeded BENCH* products afterwards.")
+
+    def handle(self, *args, **opts):
+        rng = random.Random(opts["seed"])
+        self.seed_catalog(opts["products"], rng)
+
+        codes = list(
+            Product.objects.filter(product_code__startswith=BENCH_PREFIX)
+            .values_list("product_code", flat=True)[:5000]
+        )
+        backend = get_search_backend()
+        self.stdout.write(f"Backend: {type(backend).__name__}")
+
+        kinds = {
+            "exact code": lambda: rng.choice(codes),
+            "code prefix": lambda: rng.choice(codes)[:7],
+            "name prefix": lambda: rng.choice(WORDS)[:rng.randint(2, 4)],
+            "fuzzy": lambda: rng.choice(WORDS)[1:5],
+        }
+        per_kind = max(1, opts["queries"] // len(kinds))
+
+        for kind, make_query in kinds.items():
+            timings = []
+            for _ in range(per_kind):
+                query = make_query()
+                start = time.perf_counter()
+                backend.search(query)
+                timings.append((time.perf_counter() - start) * 1000)
+
+            self.stdout.write(
+                f"{kind:<12} n={len(timings):<5} "
+                f"p50={percentile(timings, 50):7.2f} ms  "
+                f"p99={percentile(timings, 99):7.2f} ms  "
+                f"mean={statistics.mean(timings):7.2f} ms"
+            )
+
+        if opts["cleanup"]:
+            deleted, _ = Product.objects.filter(product_code__startswith=BENCH_PREFIX).delete()
+            self.stdout.write(f"Removed {deleted} benchmark products.")
+
+    def seed_catalog(self, target, rng):
+        existing = Product.objects.filter(product_code__startswith=BENCH_PREFIX).count()
+        if existing >= target:
+            return
+
+        self.stdout.write(f"Seeding {target - existing} products...")
+        batch = []
+        for i in range(existing, target):
+            batch.append(Product(
+                product_name=" ".join(rng.sample(WORDS, 3)).title() + f" {i}",
+                product_code=f"{BENCH_PREFIX}{i:07d}",
+                category=rng.choice(CATEGORIES),
+                price=Decimal(rng.randint(100, 99_999)) / 100,
+                cost_price=Decimal(rng.randint(50, 50_000)) / 100,
+                stock_quantity=rng.randint(0, 500),
+                status="active" if rng.random() > 0.05 else "inactive",
+            ))
+            if len(batch) == 5000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        Product.objects.bulk_create(batch)
@@ -0,0 +1,250 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from app.models import Profile, Product, Customer, Invoice, InvoiceItem
+from app.rollup import rebuild_rollup
+
+from .bench_product_search import WORDS, CATEGORIES, percentile
+
+# Seeds a realistic data set and times every report endpoint, printing
+# query counts, SQL time and (with --explain) the plan of each query.
+#
+#   manage.py bench_reports --invoices 200000 --compare --explain
+#
+# --compare runs everything twice: with the indexes from migration 0015
+# and again with them dropped inside a transaction that is rolled back
+# afterwards. On PostgreSQL the drop holds table locks until then, so
+# don't run --compare against a live till database.
+
+# Kept clear of bench_product_search's "BENCH" prefix, whose --cleanup
+# would otherwise pick up (and trip over) these products
+BENCH_PREFIX = "RPTBENCH"
+BENCH_USER = "bench_reports"
+
+ENDPOINTS = [
+    "/api/dashboard/",
+    "/api/products/",
+    "/api/products/?category=grocery",
+    "/api/invoices/",
+    "/api/invoices/?payment_method=upi",
+    "/api/invoices/?from={month_ago}&to={today}",
+    "/api/category-revenue/",
+    "/api/cashier-performance/",
+    "/api/top-products/",
+    "/api/report/profit/",
+    "/api/report/margin/",
+    "/api/report/sales/",
+    "/api/report/stock/",
+    "/api/report/manufacturer/",
+    "/sales-report/",
+    "/manager-dashboard/",
+    "/admin-dashboard/",
+    "/admin-dashboard/invoices/?status=cancelled",
+    "/admin-dashboard/stock/",
+    "/filter-products/?category=grocery",
+]
+
+# From 0015_reporting_indexes
+INDEXES = [
+    "cart_active_cashier_idx",
+    "cart_cashier_number_idx",
+    "invoice_created_idx",
+    "invoice_status_created_idx",
+    "invoice_payment_created_idx",
+    "invoice_cashier_created_idx",
+    "product_created_idx",
+    "product_category_created_idx",
+    "product_category_name_idx",
+    "product_manufacturer_idx",
+]
+
+MANUFACTURERS = ["Acme", "Tata", "ITC", "Nestle", "HUL", "Dabur", "Amul", "Parle", None]
+
+
+class Command(BaseCommand):
+    help = "Seed report data and time every report endpoint (query plans, before/after indexes)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=20_000)
+        parser.add_argument("--customers", type=int, default=50_000)
+        parser.add_argument("--invoices", type=int, default=100_000)
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--explain", action="store_true", help="Print the plan of every query.")
+        parser.add_argument("--compare", action="store_true",
+                            help="Also run without the reporting indexes (rolled back afterwards).")
+        parser.add_argument("--cleanup", action="store_true",
+                            help="Delete the seeded RPTBENCH* data afterwards.")
+
+    def handle(self, *args, **opts):
+        rng = random.Random(opts["seed"])
+        user = self.bench_user()
+        self.seed(opts, rng, user)
+
+        client = Client()
+        client.force_login(user)
+        today = timezone.localdate()
+        urls = [
+            url.format(today=today, month_ago=today - timedelta(days=30))
+            for url in ENDPOINTS
+        ]
+
+        with override_settings(ALLOWED_HOSTS=["*"]):
+            with_indexes = self.run(client, urls, opts, "with indexes")
+            if opts["compare"]:
+                with transaction.atomic():
+                    self.drop_indexes()
+                    without = self.run(client, urls, opts, "without indexes")
+                    transaction.set_rollback(True)
+                self.summary(urls, without, with_indexes)
+
+        if opts["cleanup"]:
+            self.cleanup()
+
+    # ---------- measuring ----------
+
+    def run(self, client, urls, opts, label):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {label} =="))
+        self.stdout.write(f"{'endpoint':<48} {'p50 ms':>9} {'queries':>8} {'sql ms':>9}")
+        results = {}
+        for url in urls:
+            timings = []
+            for _ in range(opts["repeat"]):
+                cache.clear()
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    response = client.get(url)
+                    if response.streaming:
+                        b"".join(response.streaming_content)
+                    timings.append((time.perf_counter() - start) * 1000)
+
+            sql_ms = sum(float(q["time"]) for q in ctx.captured_queries) * 1000
+            results[url] = percentile(timings, 50)
+            self.stdout.write(
+                f"{url[:48]:<48} {results[url]:9.1f} {len(ctx.captured_queries):8} {sql_ms:9.1f}"
+                + ("" if response.status_code == 200 else f"  (HTTP {response.status_code})")
+            )
+            if opts["explain"]:
+                for query in ctx.captured_queries:
+                    self.explain(query["sql"])
+        return results
+
+    def explain(self, sql):
+        if not sql.lstrip().upper().startswith("SELECT"):
+            return
+        prefix = "EXPLAIN ANALYZE " if connection.vendor == "postgresql" else "EXPLAIN QUERY PLAN "
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql)
+            plan = [" ".join(str(col) for col in row) for row in cursor.fetchall()]
+        self.stdout.write(f"    {sql[:150]}")
+        for line in plan:
+            self.stdout.write(f"      {line}")
+
+    def drop_indexes(self):
+        # Plain DROP INDEX statements, so they roll back with the
+        # surrounding transaction (PostgreSQL and SQLite)
+        with connection.cursor() as cursor:
+            for name in INDEXES:
+                cursor.execute(f"DROP INDEX {connection.ops.quote_name(name)}")
+
+    def summary(self, urls, before, after):
+        self.stdout.write(self.style.MIGRATE_HEADING("\n== before -> after (p50 ms) =="))
+        for url in urls:
+            speedup = before[url] / after[url] if after[url] else 0
+            self.stdout.write(f"{url[:48]:<48} {before[url]:9.1f} -> {after[url]:9.1f}  x{speedup:.1f}")
+
+    # ---------- data ----------
+
+    def bench_user(self):
+        user, created = User.objects.get_or_create(
+            username=BENCH_USER, defaults={"is_superuser": True, "is_staff": True}
+        )
+        Profile.objects.get_or_create(user=user, defaults={"full_name": "Bench", "role": "manager"})
+        return user
+
+    def seed(self, opts, rng, user):
+        if Invoice.objects.filter(invoice_number__startswith=BENCH_PREFIX).exists():
+            self.stdout.write("Using previously seeded data.")
+            return
+
+        start = time.perf_counter()
+        products = []
+        for i in range(opts["products"]):
+            products.append(Product(
+                product_name=" ".join(rng.sample(WORDS, 3)).title() + f" {i}",
+                product_code=f"{BENCH_PREFIX}{i:07d}",
+                category=rng.choice(CATEGORIES),
+                price=Decimal(rng.randint(100, 99_999)) / 100,
+                cost_price=Decimal(rng.randint(50, 50_000)) / 100,
+                manufacturer=rng.choice(MANUFACTURERS),
+                stock_quantity=rng.randint(0, 500),
+                status="active" if rng.random() > 0.05 else "inactive",
+            ))
+        products = Product.objects.bulk_create(products, batch_size=5000)
+
+        customers = Customer.objects.bulk_create([
+            Customer(name=f"Bench {i}", phone=f"{BENCH_PREFIX}{i:07d}")
+            for i in range(opts["customers"])
+        ], batch_size=5000)
+
+        # One batch per day, backdated with a single UPDATE (auto_now_add)
+        per_day = max(1, opts["invoices"] // opts["days"])
+        now = timezone.now()
+        made = 0
+        for day in range(opts["days"]):
+            count = min(per_day, opts["invoices"] - made)
+            if count <= 0:
+                break
+            invoices, lines = [], []
+            for n in range(count):
+                basket = rng.sample(products, rng.randint(1, 5))
+                qty = [rng.randint(1, 4) for _ in basket]
+                sub_total = sum(p.price * q for p, q in zip(basket, qty))
+                invoices.append(Invoice(
+                    invoice_number=f"{BENCH_PREFIX}-{day:04d}-{n:06d}",
+                    cashier=user,
+                    customer=rng.choice(customers) if rng.random() < 0.6 else None,
+                    sub_total=sub_total,
+                    total_gst=round(sub_total * Decimal("0.05"), 2),
+                    grand_total=round(sub_total * Decimal("1.05"), 2),
+                    status=rng.choices(["paid", "pending", "cancelled"], [90, 7, 3])[0],
+                    payment_method=rng.choice(["cash", "card", "upi"]),
+                ))
+                lines.append(list(zip(basket, qty)))
+            invoices = Invoice.objects.bulk_create(invoices)
+            Invoice.objects.filter(id__in=[i.id for i in invoices]).update(
+                created_at=now - timedelta(days=day, minutes=rng.randint(0, 600))
+            )
+            InvoiceItem.objects.bulk_create([
+                InvoiceItem(invoice=inv, product=p, product_name=p.product_name,
+                            price_at_sale=p.price, cost_at_sale=p.cost_price, quantity=q)
+                for inv, basket in zip(invoices, lines) for p, q in basket
+            ], batch_size=5000)
+            made += count
+
+        rebuild_rollup()
+        self.stdout.write(
+            f"Seeded {len(products)} products, {len(customers)} customers, "
+            f"{made} invoices in {time.perf_counter() - start:.1f}s."
+        )
+
+    def cleanup(self):
+        invoices = Invoice.objects.filter(invoice_number__startswith=BENCH_PREFIX)
+        InvoiceItem.objects.filter(invoice__in=invoices).delete()
+        invoices.delete()
+        Product.objects.filter(product_code__startswith=BENCH_PREFIX).delete()
+        Customer.objects.filter(phone__startswith=BENCH_PREFIX).delete()
+        User.objects.filter(username=BENCH_USER).delete()
+        rebuild_rollup()
+        self.stdout.write("Removed benchmark data.")
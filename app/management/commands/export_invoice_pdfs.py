@@ -0,0 +1,198 @@
+import multiprocessing
+import os
+import shutil
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils.timezone import localdate
+
+from app.invoice_pdf import render_invoice_pdf
+from app.models import Invoice
+
+# Batch (re)print of invoice PDFs, rendered in a local process pool.
+#
+#   manage.py export_invoice_pdfs --from 2025-01-01 --to 2025-01-31 --output jan.zip
+#   manage.py export_invoice_pdfs --ids 10 11 12 --output archive/ --workers 8
+#
+# Files are laid out as YYYY-MM-DD/invoice_<number>.pdf, either in a ZIP
+# or under a directory. Files already present are skipped, so an
+# interrupted run can simply be started again. A ZIP can't be appended
+# to safely (a killed run leaves it without a central directory), so ZIP
+# output is rendered into <output>.parts/ first and packed, together with
+# the entries of any existing archive, into a new file that replaces the
+# old one only once it is complete.
+
+
+def archive_name(invoice_number, created_at):
+    return f"{localdate(created_at).isoformat()}/invoice_{invoice_number}.pdf"
+
+
+def _init_worker():
+    # Safe under both fork and spawn; each worker opens its own DB connection
+    import django
+    django.setup()
+
+
+def render_chunk(ids):
+    invoices = (
+        Invoice.objects
+        .filter(id__in=ids)
+        .select_related("customer")
+        .prefetch_related("items")
+    )
+    return [
+        (archive_name(inv.invoice_number, inv.created_at), render_invoice_pdf(inv))
+        for inv in invoices
+    ]
+
+
+class DirectoryArchive:
+    def __init__(self, path):
+        self.path = path
+
+    def existing(self):
+        found = set()
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if not name.endswith(".part"):
+                    found.add(os.path.relpath(os.path.join(root, name), self.path).replace(os.sep, "/"))
+        return found
+
+    def write(self, name, data):
+        target = os.path.join(self.path, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Write-then-rename so a crash never leaves a half-written PDF
+        tmp = target + ".part"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, target)
+
+    def finish(self):
+        pass
+
+
+class ZipArchive:
+    def __init__(self, path):
+        self.path = path
+        self.parts = DirectoryArchive(path + ".parts")
+        self.packed = set()
+        if os.path.exists(path):
+            try:
+                with zipfile.ZipFile(path) as zf:
+                    self.packed = set(zf.namelist())
+            except zipfile.BadZipFile:
+                raise CommandError(f"{path} is not a readable ZIP archive; move it away and run again.")
+
+    def existing(self):
+        return self.packed | self.parts.existing()
+
+    def write(self, name, data):
+        self.parts.write(name, data)
+
+    def finish(self):
+        staged = sorted(self.parts.existing() - self.packed)
+        if staged:
+            tmp = self.path + ".tmp"
+            with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_STORED) as out:
+                if self.packed:
+                    with zipfile.ZipFile(self.path) as old:
+                        for info in old.infolist():
+                            with old.open(info) as src, out.open(info, "w") as dst:
+                                shutil.copyfileobj(src, dst)
+                for name in staged:
+                    out.write(os.path.join(self.parts.path, name), name)
+            os.replace(tmp, self.path)
+        shutil.rmtree(self.parts.path, ignore_errors=True)
+
+
+class Command(BaseCommand):
+    help = "Render invoice PDFs in bulk (date range or ids) into a ZIP or per-day directory."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="start", type=date.fromisoformat)
+        parser.add_argument("--to", dest="end", type=date.fromisoformat)
+        parser.add_argument("--ids", nargs="+", type=int)
+        parser.add_argument("--output", required=True,
+                            help="Path ending in .zip for a ZIP archive, otherwise a directory.")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--chunk-size", type=int, default=50)
+
+    def handle(self, *args, **opts):
+        if not (opts["start"] or opts["end"] or opts["ids"]):
+            raise CommandError("Pass --from/--to and/or --ids.")
+
+        invoices = Invoice.objects.order_by("id")
+        if opts["ids"]:
+            invoices = invoices.filter(id__in=opts["ids"])
+        if opts["start"]:
+            invoices = invoices.filter(created_at__date__gte=opts["start"])
+        if opts["end"]:
+            invoices = invoices.filter(created_at__date__lte=opts["end"])
+
+        output = opts["output"]
+        archive = ZipArchive(output) if output.endswith(".zip") else DirectoryArchive(output)
+
+        done = archive.existing()
+        todo = [
+            pk for pk, number, created_at
+            in invoices.values_list("id", "invoice_number", "created_at").iterator()
+            if archive_name(number, created_at) not in done
+        ]
+        skipped = invoices.count() - len(todo)
+        if skipped:
+            self.stdout.write(f"Resuming: {skipped} invoices already exported.")
+        if todo:
+            size = opts["chunk_size"]
+            chunks = [todo[i:i + size] for i in range(0, len(todo), size)]
+            self.run(chunks, len(todo), archive, opts["workers"])
+        else:
+            self.stdout.write(self.style.SUCCESS("Nothing to do."))
+        # Only after a complete run: an interrupted one keeps its parts
+        archive.finish()
+
+    def run(self, chunks, total, archive, workers):
+        start = time.perf_counter()
+        written = 0
+
+        def progress(results):
+            nonlocal written
+            for name, data in results:
+                archive.write(name, data)
+            written += len(results)
+            rate = written / (time.perf_counter() - start)
+            self.stdout.write(f"  {written}/{total} ({written * 100 // total}%)  {rate:.1f} invoices/s")
+
+        if workers <= 1:
+            for chunk in chunks:
+                progress(render_chunk(chunk))
+        else:
+            # Children must not share the parent's DB socket
+            connections.close_all()
+            method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(method),
+                initializer=_init_worker,
+            ) as pool:
+                # A few chunks in flight per worker: each finished future
+                # holds its chunk's PDFs until it is written and dropped
+                chunks = iter(chunks)
+                pending = {pool.submit(render_chunk, chunk) for chunk in islice(chunks, workers * 2)}
+                while pending:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        progress(future.result())
+                        for chunk in islice(chunks, 1):
+                            pending.add(pool.submit(render_chunk, chunk))
+                    del finished, future
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {written} invoices in {elapsed:.1f}s "
+            f"({written / elapsed:.1f} invoices/s with {max(workers, 1)} worker(s))."
+        ))
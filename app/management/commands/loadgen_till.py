@@ -0,0 +1,534 @@
+import json
+import random
+import secrets
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count, F, Sum
+from django.test import Client
+from django.test.utils import override_settings
+
+from app.models import Profile, Product, Cart, Invoice, InvoiceItem
+from app.payments import LocalGateway, set_gateway
+from app.rollup import rebuild_rollup
+
+from .bench_product_search import WORDS, CATEGORIES, percentile
+
+# End-to-end till load generator.
+#
+# N simulated cashiers run the real checkout flow concurrently:
+#
+#   login -> cashier_dashboard -> (product_lookup while typing ->
+#   add_to_cart) per line -> update_quantity -> checkout_page ->
+#   start_payment (UPI only) -> generate_invoice -> print_invoice_pdf
+#
+# and every step is timed. The report has p50/p95/p99 latency and the error
+# rate per step, plus throughput. Afterwards the stock ledger and invoice
+# numbers are checked: oversold stock, duplicate numbers or lost invoices
+# make the command fail.
+#
+# In-process (default): cashiers are threads using the Django test client
+# and the LocalGateway, against the configured database. This measures
+# the app and the database from one process, so also reports sales per
+# CPU-second.
+#
+#   manage.py loadgen_till --cashiers 8 --sales 50 --gateway-latency 0.3
+#
+# Over HTTP (--url): against a running server started with
+# PAYMENT_GATEWAY=local. See scripts/loadtest.sh, which starts gunicorn
+# with a fixed number of workers and steps up the number of cashiers to
+# find the capacity per core.
+#
+# Hot products have little stock (--stock), so tills compete for it and
+# some checkouts are rejected as out of stock. That is expected and
+# reported, not counted as an error.
+#
+# The till accounts get a fresh random password on every run, known only
+# to this process. The command still creates real cashier logins, so it
+# refuses to run unless DEBUG is on or --i-know-this-is-not-production
+# is passed.
+
+LOADGEN_PREFIX = "LOADGEN"
+
+STEPS = [
+    "login",
+    "cashier_dashboard",
+    "product_lookup",
+    "add_to_cart",
+    "update_quantity",
+    "checkout_page",
+    "start_payment",
+    "generate_invoice",
+    "print_invoice_pdf",
+]
+
+
+class Response:
+    __slots__ = ("status", "data")
+
+    def __init__(self, status, data):
+        self.status = status
+        self.data = data
+
+
+# ======================================================
+# TRANSPORTS
+# ======================================================
+
+class LocalTill:
+    # In-process, through the whole middleware stack
+    def __init__(self):
+        self.client = Client()
+
+    def request(self, method, path, data=None):
+        if method == "GET":
+            response = self.client.get(path, data)
+        else:
+            response = self.client.post(path, data or {})
+        if response.streaming:
+            body = b"".join(response.streaming_content)
+        else:
+            body = response.content
+        return Response(response.status_code, _json(response.get("Content-Type", ""), body))
+
+    def close(self):
+        # Each thread has its own database connection
+        connections.close_all()
+
+
+class HttpTill:
+    def __init__(self, base_url, timeout):
+        import requests
+
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def request(self, method, path, data=None):
+        headers = {"Referer": self.base_url + "/"}
+        token = self.session.cookies.get("csrftoken")
+        if token:
+            headers["X-CSRFToken"] = token
+        response = self.session.request(
+            method, self.base_url + path,
+            params=data if method == "GET" else None,
+            data=data if method == "POST" else None,
+            headers=headers, timeout=self.timeout, allow_redirects=False,
+        )
+        return Response(response.status_code, _json(response.headers.get("Content-Type", ""), response.content))
+
+    def close(self):
+        self.session.close()
+
+
+def _json(content_type, body):
+    if content_type.startswith("application/json"):
+        return json.loads(body)
+    return None
+
+
+# ======================================================
+# RESULTS
+# ======================================================
+
+class Results:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = {}
+        self.outcomes = defaultdict(int)
+        self.invoice_ids = []
+
+    def step(self, name, ms, ok, detail=""):
+        with self._lock:
+            self.timings[name].append(ms)
+            if not ok:
+                self.errors[name] += 1
+                self.error_samples.setdefault(name, detail)
+
+    def outcome(self, name, invoice_id=None):
+        with self._lock:
+            self.outcomes[name] += 1
+            if invoice_id is not None:
+                self.invoice_ids.append(invoice_id)
+
+
+# ======================================================
+# CASHIER
+# ======================================================
+
+class Cashier:
+    def __init__(self, till, username, password, catalog, results, opts, rng):
+        self.till = till
+        self.username = username
+        self.password = password
+        self.catalog = catalog
+        self.results = results
+        self.opts = opts
+        self.rng = rng
+
+    def call(self, step, method, path, data=None, expect=(200,)):
+        start = time.perf_counter()
+        try:
+            response = self.till.request(method, path, data)
+        except Exception as e:
+            self.results.step(step, (time.perf_counter() - start) * 1000, False, repr(e))
+            return None
+        ok = response.status in expect
+        self.results.step(step, (time.perf_counter() - start) * 1000, ok,
+                          "" if ok else f"HTTP {response.status} {path}")
+        return response if ok else None
+
+    def think(self):
+        if self.opts["think_time"]:
+            time.sleep(self.rng.uniform(0, 2 * self.opts["think_time"]))
+
+    def run(self, sales, deadline):
+        if not self.call("login", "POST", "/", {"username": self.username, "password": self.password},
+                         expect=(302,)):
+            return
+        if not self.call("cashier_dashboard", "GET", "/cashier-dashboard/"):
+            return
+
+        done = 0
+        while done < sales and time.monotonic() < deadline:
+            self.sale()
+            done += 1
+
+    def pick_products(self):
+        hot, cold = self.catalog
+        size = self.rng.randint(self.opts["basket_min"], self.opts["basket_max"])
+        picked = {}
+        while len(picked) < size:
+            pool = hot if self.rng.random() < self.opts["hot_share"] else cold
+            product = self.rng.choice(pool)
+            picked[product["id"]] = product
+        return list(picked.values())
+
+    def lookup(self, product):
+        # One request per keystroke from the second on, like the search
+        # box; if the product isn't suggested by then, the full code is
+        # scanned
+        query = product["product_code"]
+        keystrokes = self.rng.randint(2, max(2, self.opts["keystrokes"]))
+        for length in range(2, min(len(query), keystrokes) + 1):
+            response = self.call("product_lookup", "GET", "/product-lookup/", {"q": query[:length]})
+            if response and any(p["id"] == product["id"] for p in response.data["products"]):
+                return
+        self.call("product_lookup", "GET", "/product-lookup/", {"q": query})
+
+    def sale(self):
+        lines = self.pick_products()
+        for product in lines:
+            self.lookup(product)
+            self.call("add_to_cart", "POST", "/add-to-cart/", {"product_id": product["id"]})
+            self.think()
+
+        if self.rng.random() < self.opts["qty_share"]:
+            product = self.rng.choice(lines)
+            self.call("update_quantity", "POST", "/update-qty/",
+                      {"product_id": product["id"], "qty": self.rng.randint(2, 3)})
+
+        self.call("checkout_page", "GET", "/checkout/")
+
+        payment = {"customer_phone": f"9{self.rng.randint(0, 10 ** 9 - 1):09d}", "customer_name": "Load test",
+                   "payment_method": "cash"}
+        if self.rng.random() < self.opts["upi_share"]:
+            response = self.call("start_payment", "POST", "/start-payment/", expect=(200, 503))
+            if response and response.status == 200 and "simulated" in response.data:
+                payment.update(response.data["simulated"], payment_method="upi")
+            elif response and response.status == 503:
+                # Gateway down: the cashier takes cash instead
+                self.results.outcome("gateway_unavailable")
+            elif response:
+                raise CommandError("start_payment returned no simulated payment; "
+                                   "start the server with PAYMENT_GATEWAY=local.")
+
+        # 302 back to the checkout page means the stock check rejected it
+        response = self.call("generate_invoice", "POST", "/generate-invoice/", payment, expect=(200, 302))
+        if response is None:
+            self.results.outcome("failed")
+            self.call("create_cart", "POST", "/create-cart/")
+            return
+        if response.status == 302:
+            self.results.outcome("out_of_stock")
+            self.call("create_cart", "POST", "/create-cart/")
+            return
+
+        invoice_id = response.data["invoice_id"]
+        self.results.outcome("sold", invoice_id)
+        if self.rng.random() < self.opts["print_share"]:
+            self.call("print_invoice_pdf", "GET", f"/print-invoice/{invoice_id}/")
+
+
+# ======================================================
+# COMMAND
+# ======================================================
+
+class Command(BaseCommand):
+    help = "Simulate concurrent cashiers running the full checkout flow; report latency, throughput and integrity."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cashiers", type=int, default=4, help="Concurrent tills.")
+        parser.add_argument("--sales", type=int, default=25, help="Sales per cashier.")
+        parser.add_argument("--duration", type=float, default=0, help="Stop after this many seconds (0 = no limit).")
+        parser.add_argument("--url", help="Base URL of a running server (default: in-process).")
+        parser.add_argument("--timeout", type=float, default=30, help="HTTP timeout in seconds (--url).")
+        parser.add_argument("--server-cores", type=int,
+                            help="CPU cores the server uses (--url), for the per-core figures.")
+        parser.add_argument("--products", type=int, default=2000)
+        parser.add_argument("--hot", type=int, default=20, help="Number of hot products.")
+        parser.add_argument("--hot-share", type=float, default=0.3, help="Fraction of lines that are hot products.")
+        parser.add_argument("--stock", type=int, default=200,
+                            help="Stock of each hot product at the start of the run.")
+        parser.add_argument("--basket-min", type=int, default=1)
+        parser.add_argument("--basket-max", type=int, default=8)
+        parser.add_argument("--keystrokes", type=int, default=4, help="Lookups typed per line.")
+        parser.add_argument("--qty-share", type=float, default=0.3, help="Fraction of sales that change a quantity.")
+        parser.add_argument("--upi-share", type=float, default=0.5, help="Fraction of sales paid by UPI.")
+        parser.add_argument("--print-share", type=float, default=1.0, help="Fraction of invoices printed.")
+        parser.add_argument("--think-time", type=float, default=0.0, help="Mean pause between scans, seconds.")
+        parser.add_argument("--gateway-latency", type=float, default=0.0,
+                            help="LocalGateway latency in seconds (in-process).")
+        parser.add_argument("--gateway-failure-rate", type=float, default=0.0,
+                            help="LocalGateway failure rate (in-process).")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--cleanup", action="store_true",
+                            help="Delete the LOADGEN products, users and their invoices afterwards.")
+        parser.add_argument("--i-know-this-is-not-production", action="store_true",
+                            help="Run with DEBUG off (creates cashier logins).")
+
+    def handle(self, *args, **opts):
+        if opts["cashiers"] < 1:
+            if opts["cleanup"]:
+                return self.cleanup()
+            raise CommandError("--cashiers must be at least 1.")
+        if not settings.DEBUG and not opts["i_know_this_is_not_production"]:
+            raise CommandError("DEBUG is off. This creates cashier logins; pass "
+                               "--i-know-this-is-not-production if this isn't a live till database.")
+        if opts["basket_min"] < 1 or opts["basket_max"] < opts["basket_min"]:
+            raise CommandError("Need 1 <= --basket-min <= --basket-max.")
+
+        rng = random.Random(opts["seed"])
+        catalog = self.seed_products(opts, rng)
+        password = secrets.token_urlsafe()
+        usernames = self.seed_cashiers(opts["cashiers"], password)
+        stock_before = dict(Product.objects.filter(product_code__startswith=LOADGEN_PREFIX)
+                            .values_list("id", "stock_quantity"))
+        last_invoice = Invoice.objects.order_by("-id").values_list("id", flat=True).first() or 0
+
+        if not opts["url"] and connection.vendor == "sqlite":
+            self.stderr.write("SQLite serializes writers: expect 'database is locked' errors "
+                              "with more than one cashier. Use PostgreSQL for real numbers.")
+
+        results = Results()
+        if opts["url"]:
+            make_till = lambda: HttpTill(opts["url"], opts["timeout"])
+            wall, cpu = self.run_tills(make_till, usernames, password, catalog, results, opts)
+        else:
+            set_gateway(LocalGateway(
+                latency=opts["gateway_latency"],
+                failure_rate=opts["gateway_failure_rate"],
+                seed=opts["seed"],
+            ))
+            try:
+                # The slow-request log would drown the report
+                with override_settings(ALLOWED_HOSTS=["*"], SLOW_REQUEST_MS=10 ** 9, SLOW_REQUEST_QUERIES=10 ** 9):
+                    wall, cpu = self.run_tills(LocalTill, usernames, password, catalog, results, opts)
+            finally:
+                set_gateway(None)
+
+        self.report(results, wall, cpu, opts)
+        problems = self.check_integrity(results, usernames, stock_before, last_invoice)
+
+        if opts["cleanup"]:
+            self.cleanup()
+        if problems:
+            raise CommandError(f"{len(problems)} integrity problem(s), see above.")
+
+    # ---------- running ----------
+
+    def run_tills(self, make_till, usernames, password, catalog, results, opts):
+        deadline = time.monotonic() + (opts["duration"] or 10 ** 9)
+        ready = threading.Barrier(len(usernames) + 1)
+        failures = []
+
+        def work(index, username):
+            till = make_till()
+            cashier = Cashier(till, username, password, catalog, results, opts, random.Random(opts["seed"] + index))
+            try:
+                ready.wait()
+                cashier.run(opts["sales"], deadline)
+            except Exception as e:
+                failures.append(e)
+            finally:
+                till.close()
+
+        threads = [threading.Thread(target=work, args=(i, name), daemon=True) for i, name in enumerate(usernames)]
+        for thread in threads:
+            thread.start()
+        ready.wait()
+        start, cpu_start = time.perf_counter(), time.process_time()
+        for thread in threads:
+            thread.join()
+        wall, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+
+        if failures:
+            raise CommandError(f"{len(failures)} cashier(s) stopped: {failures[0]}")
+        return wall, cpu
+
+    # ---------- reporting ----------
+
+    def report(self, results, wall, cpu, opts):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n== {opts['cashiers']} cashiers, {'HTTP ' + opts['url'] if opts['url'] else 'in-process'} =="
+        ))
+        self.stdout.write(f"{'step':<20} {'n':>7} {'err %':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        requests = 0
+        for step in STEPS + sorted(set(results.timings) - set(STEPS)):
+            timings = results.timings.get(step)
+            if not timings:
+                continue
+            requests += len(timings)
+            errors = results.errors.get(step, 0)
+            self.stdout.write(
+                f"{step:<20} {len(timings):>7} {100 * errors / len(timings):>7.2f} "
+                f"{percentile(timings, 50):>9.1f} {percentile(timings, 95):>9.1f} "
+                f"{percentile(timings, 99):>9.1f} {max(timings):>9.1f}"
+            )
+        for step, detail in sorted(results.error_samples.items()):
+            self.stdout.write(self.style.WARNING(f"  first {step} error: {detail}"))
+
+        sold = results.outcomes["sold"]
+        self.stdout.write("")
+        self.stdout.write(
+            f"sales: {sold} sold, {results.outcomes['out_of_stock']} rejected out of stock, "
+            f"{results.outcomes['failed']} failed, {results.outcomes['gateway_unavailable']} paid cash "
+            f"after the gateway failed"
+        )
+        self.stdout.write(f"wall:  {wall:.1f}s, {sold / wall:.2f} sales/s, {requests / wall:.1f} requests/s")
+        if opts["url"]:
+            cores = opts["server_cores"]
+            if cores:
+                self.stdout.write(f"per core ({cores} server cores): {sold / wall / cores:.2f} sales/s")
+        elif cpu:
+            # App and client share this process, so this is a lower bound
+            self.stdout.write(
+                f"cpu:   {cpu:.1f}s in this process, {sold / cpu:.2f} sales per CPU-second "
+                f"(includes the simulated clients)"
+            )
+
+    def check_integrity(self, results, usernames, stock_before, last_invoice):
+        problems = []
+        invoices = Invoice.objects.filter(id__gt=last_invoice, cashier__username__in=usernames)
+
+        # Oversell: every unit that left the shelf is on exactly one invoice
+        sold = dict(
+            InvoiceItem.objects.filter(invoice__in=invoices, product_id__in=stock_before)
+            .values_list("product_id").annotate(units=Sum("quantity"))
+        )
+        stock_after = dict(Product.objects.filter(id__in=stock_before).values_list("id", "stock_quantity"))
+        for product_id, before in stock_before.items():
+            after = stock_after.get(product_id, 0)
+            if after < 0:
+                problems.append(f"product {product_id}: stock went negative ({after})")
+            if before - sold.get(product_id, 0) != after:
+                problems.append(
+                    f"product {product_id}: {before} in stock - {sold.get(product_id, 0)} sold != {after} left"
+                )
+
+        # Collisions: numbers unique, one invoice per successful checkout
+        duplicates = (
+            Invoice.objects.values("invoice_number").annotate(n=Count("id")).filter(n__gt=1)
+            .values_list("invoice_number", flat=True)[:5]
+        )
+        for number in duplicates:
+            problems.append(f"invoice number {number} issued more than once")
+        if len(set(results.invoice_ids)) != len(results.invoice_ids):
+            problems.append("the same invoice id was returned to two checkouts")
+        created = invoices.count()
+        if created > len(results.invoice_ids):
+            problems.append(
+                f"{created - len(results.invoice_ids)} invoice(s) committed although the till got an error "
+                f"(a retry would bill the customer twice)"
+            )
+        elif created < len(results.invoice_ids):
+            problems.append(f"{len(results.invoice_ids) - created} acknowledged invoice(s) missing from the database")
+
+        # Totals match the lines that were billed
+        billed = invoices.annotate(lines=Sum(F("items__price_at_sale") * F("items__quantity")))
+        for number, sub_total, lines in billed.values_list("invoice_number", "sub_total", "lines")[:10_000]:
+            if lines is None or round(lines, 2) != sub_total:
+                problems.append(f"invoice {number}: sub total {sub_total} but lines add up to {lines}")
+
+        if problems:
+            for problem in problems[:20]:
+                self.stdout.write(self.style.ERROR(f"  {problem}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"integrity: OK ({created} invoices, no oversold stock, no duplicate numbers)"
+            ))
+        return problems
+
+    # ---------- data ----------
+
+    def seed_products(self, opts, rng):
+        existing = Product.objects.filter(product_code__startswith=LOADGEN_PREFIX).count()
+        if existing < opts["products"]:
+            Product.objects.bulk_create([
+                Product(
+                    product_name=" ".join(rng.sample(WORDS, 2)).title() + f" {i}",
+                    product_code=f"{LOADGEN_PREFIX}{i:06d}",
+                    category=rng.choice(CATEGORIES),
+                    price=Decimal(rng.randint(100, 50_000)) / 100,
+                    cost_price=Decimal(rng.randint(50, 25_000)) / 100,
+                    stock_quantity=0,
+                )
+                for i in range(existing, opts["products"])
+            ], batch_size=5000)
+
+        products = list(
+            Product.objects.filter(product_code__startswith=LOADGEN_PREFIX)
+            .order_by("product_code").values("id", "product_code")[:opts["products"]]
+        )
+        if len(products) <= opts["hot"]:
+            raise CommandError("--products must be larger than --hot.")
+        hot, cold = products[:opts["hot"]], products[opts["hot"]:]
+
+        # Fresh stock every run: scarce hot products, plenty of the rest
+        Product.objects.filter(product_code__startswith=LOADGEN_PREFIX).update(stock_quantity=10 ** 6, status="active")
+        Product.objects.filter(id__in=[p["id"] for p in hot]).update(stock_quantity=opts["stock"])
+        return hot, cold
+
+    def seed_cashiers(self, count, password):
+        usernames = []
+        for i in range(count):
+            username = f"{LOADGEN_PREFIX.lower()}_till{i:03d}"
+            user, created = User.objects.get_or_create(username=username)
+            if created:
+                Profile.objects.create(user=user, full_name=f"Till {i}", role="cashier")
+            usernames.append(username)
+        # Hashed once for all tills; last run's password stops working
+        User.objects.filter(username__in=usernames).update(password=make_password(password))
+        # Start every till on an empty cart
+        Cart.objects.filter(cashier__username__in=usernames, status="active").delete()
+        return usernames
+
+    def cleanup(self):
+        users = User.objects.filter(username__startswith=f"{LOADGEN_PREFIX.lower()}_till")
+        invoices = Invoice.objects.filter(cashier__in=users)
+        InvoiceItem.objects.filter(invoice__in=invoices).delete()
+        invoices.delete()
+        Cart.objects.filter(cashier__in=users).delete()
+        users.delete()
+        Product.objects.filter(product_code__startswith=LOADGEN_PREFIX).delete()
+        rebuild_rollup()
+        self.stdout.write("Removed load-test data.")
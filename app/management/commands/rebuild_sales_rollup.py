@@ -0,0 +1,17 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from app.rollup import rebuild_rollup
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily and per-product sales rollups from the Invoice/InvoiceItem history."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", type=date.fromisoformat,
+                            help="Only rebuild days on or after this date (YYYY-MM-DD); per-product totals are always rebuilt in full.")
+
+    def handle(self, *args, **opts):
+        rows = rebuild_rollup(since=opts["since"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt sales rollup: {rows} rows."))
@@ -0,0 +1,46 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Indexes behind search.py. They are Postgres-specific (pattern ops and
+# pg_trgm), so they are created with raw SQL and skipped on other
+# databases. product_code prefix search is already covered by the
+# *_like index Django builds for the unique constraint.
+
+CREATE_NAME_PREFIX = """
+CREATE INDEX IF NOT EXISTS app_product_name_prefix_idx
+    ON app_product (UPPER(product_name) text_pattern_ops)
+    WHERE status = 'active'
+"""
+
+CREATE_NAME_TRGM = """
+CREATE INDEX IF NOT EXISTS app_product_name_trgm_idx
+    ON app_product USING gin (product_name gin_trgm_ops)
+    WHERE status = 'active'
+"""
+
+DROP_NAME_PREFIX = "DROP INDEX IF EXISTS app_product_name_prefix_idx"
+DROP_NAME_TRGM = "DROP INDEX IF EXISTS app_product_name_trgm_idx"
+
+
+def postgres_only(*statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_product_manufacturer'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(
+            postgres_only(CREATE_NAME_PREFIX, CREATE_NAME_TRGM),
+            postgres_only(DROP_NAME_PREFIX, DROP_NAME_TRGM),
+        ),
+    ]
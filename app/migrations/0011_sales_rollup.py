@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_product_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('payment_method', models.CharField(max_length=20)),
+                ('category', models.CharField(blank=True, default='', max_length=50)),
+                ('invoice_count', models.PositiveIntegerField(default=0)),
+                ('sub_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_gst', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('grand_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cashier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('date', 'cashier', 'payment_method', 'category')},
+            },
+        ),
+    ]
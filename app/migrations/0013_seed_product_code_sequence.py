@@ -0,0 +1,31 @@
+import re
+
+from django.db import migrations
+from django.db.models import Max
+
+
+def seed(apps, schema_editor):
+    # Codes used to be PRD<next id>; start the sequence above every
+    # existing PRD number and id so no old code is handed out again.
+    Product = apps.get_model("app", "Product")
+    NumberSequence = apps.get_model("app", "NumberSequence")
+
+    last = Product.objects.aggregate(last=Max("id"))["last"] or 0
+    codes = Product.objects.filter(product_code__startswith="PRD").values_list("product_code", flat=True)
+    for code in codes.iterator():
+        match = re.fullmatch(r"PRD(\d+)", code)
+        if match:
+            last = max(last, int(match.group(1)))
+
+    NumberSequence.objects.update_or_create(key="product_code", defaults={"last_value": last})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0012_number_sequence"),
+    ]
+
+    operations = [
+        migrations.RunPython(seed, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:38
+
+from django.db import migrations, models
+
+BATCH_SIZE = 5000
+
+
+def normalize_phone(raw, country_code="91"):
+    # Frozen copy of app.models.normalize_phone as of this migration, so
+    # later changes to the model helper don't change what this backfill does
+    digits = "".join(ch for ch in str(raw or "") if ch.isdigit())
+    if str(raw or "").strip().startswith("+"):
+        return digits
+    if digits.startswith("00"):
+        return digits[2:]
+    if len(digits) == 11 and digits.startswith("0"):
+        digits = digits[1:]
+    if len(digits) == 10:
+        return country_code + digits
+    return digits
+
+
+def backfill(apps, schema_editor):
+    Customer = apps.get_model("app", "Customer")
+    batch = []
+    for customer in Customer.objects.only("id", "phone").iterator(chunk_size=BATCH_SIZE):
+        customer.phone_normalized = normalize_phone(customer.phone)
+        customer.phone_reversed = customer.phone_normalized[::-1]
+        batch.append(customer)
+        if len(batch) >= BATCH_SIZE:
+            Customer.objects.bulk_update(batch, ["phone_normalized", "phone_reversed"])
+            batch = []
+    if batch:
+        Customer.objects.bulk_update(batch, ["phone_normalized", "phone_reversed"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_seed_product_code_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='phone_normalized',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='phone_reversed',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=20),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:40
+
+from django.conf import settings
+from django.contrib.postgres import operations
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class AddIndexConcurrently(operations.AddIndexConcurrently):
+    # CREATE INDEX CONCURRENTLY on PostgreSQL, so tills keep writing while
+    # the indexes build; a plain CREATE INDEX elsewhere (SQLite test runs).
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('app', '0014_customer_phone_keys'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='cart',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['cashier', 'cart_number'], name='cart_active_cashier_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='cart',
+            index=models.Index(fields=['cashier', '-cart_number'], name='cart_cashier_number_idx'),
+        ),
+        # cart_cashier_number_idx serves every cashier_id lookup on carts,
+        # so the FK's own index goes too
+        migrations.AlterField(
+            model_name='cart',
+            name='cashier',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='carts', to=settings.AUTH_USER_MODEL),
+        ),
+        AddIndexConcurrently(
+            model_name='invoice',
+            index=models.Index(fields=['created_at', 'id'], name='invoice_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='invoice',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='invoice_status_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='invoice',
+            index=models.Index(fields=['payment_method', 'created_at', 'id'], name='invoice_payment_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='invoice',
+            index=models.Index(fields=['cashier', 'created_at'], name='invoice_cashier_created_idx'),
+        ),
+        # The composite index above serves every cashier_id lookup, so drop
+        # the FK's own index once it exists
+        migrations.AlterField(
+            model_name='invoice',
+            name='cashier',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['created_at', 'id'], name='product_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['category', 'created_at', 'id'], name='product_category_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['category', 'product_name'], name='product_category_name_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['manufacturer'], name='product_manufacturer_idx'),
+        ),
+    ]
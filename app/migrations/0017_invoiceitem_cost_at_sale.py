@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:57
+
+from django.contrib.postgres import operations
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 5000
+
+
+class AddIndexConcurrently(operations.AddIndexConcurrently):
+    # CREATE INDEX CONCURRENTLY on PostgreSQL, so checkout keeps inserting
+    # invoice items while the index builds; a plain CREATE INDEX elsewhere.
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+def backfill(apps, schema_editor):
+    # Past sales get the product's current cost (the best we know), one
+    # UPDATE per id range. Not atomic, so each batch commits on its own
+    # and locks only its own rows.
+    InvoiceItem = apps.get_model("app", "InvoiceItem")
+    Product = apps.get_model("app", "Product")
+    cost = Subquery(Product.objects.filter(id=OuterRef("product_id")).values("cost_price")[:1])
+
+    last = InvoiceItem.objects.order_by("-id").values_list("id", flat=True).first() or 0
+    for start in range(0, last + 1, BATCH_SIZE):
+        InvoiceItem.objects.filter(id__gte=start, id__lt=start + BATCH_SIZE).update(cost_at_sale=cost)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('app', '0016_product_sales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='cost_at_sale',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='invoiceitem',
+            index=models.Index(fields=['product', 'quantity', 'price_at_sale', 'cost_at_sale'], name='invoiceitem_product_sales_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:33
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+TOTALS = ("invoice_count", "sub_total", "total_gst", "grand_total", "quantity", "revenue")
+
+
+def merge_no_cashier_rows(apps, schema_editor):
+    # unique_together let rows without a cashier repeat; fold each key's
+    # duplicates into its oldest row before the constraint goes on
+    SalesRollup = apps.get_model("app", "SalesRollup")
+    duplicates = (
+        SalesRollup.objects.filter(cashier=None)
+        .values("date", "payment_method", "category")
+        .annotate(rows=Count("id"), **{f"sum_{field}": Sum(field) for field in TOTALS})
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    for key in duplicates:
+        rows = SalesRollup.objects.filter(
+            cashier=None, date=key["date"], payment_method=key["payment_method"], category=key["category"],
+        )
+        keep = rows.order_by("id").values_list("id", flat=True).first()
+        rows.exclude(id=keep).delete()
+        rows.filter(id=keep).update(**{field: key[f"sum_{field}"] for field in TOTALS})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0017_invoiceitem_cost_at_sale'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_no_cashier_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='salesrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('cashier__isnull', True)), fields=('date', 'payment_method', 'category'), name='sales_rollup_no_cashier_key'),
+        ),
+    ]
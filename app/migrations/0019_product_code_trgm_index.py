@@ -0,0 +1,36 @@
+from django.db import migrations
+
+# Trigram index for the code substring stage of search.py. Like the
+# indexes in 0010 it is Postgres-only raw SQL. It is built on
+# UPPER(product_code) because that is what icontains compares.
+
+CREATE_CODE_TRGM = """
+CREATE INDEX IF NOT EXISTS app_product_code_trgm_idx
+    ON app_product USING gin (UPPER(product_code) gin_trgm_ops)
+    WHERE status = 'active'
+"""
+
+DROP_CODE_TRGM = "DROP INDEX IF EXISTS app_product_code_trgm_idx"
+
+
+def postgres_only(*statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0018_sales_rollup_no_cashier_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            postgres_only(CREATE_CODE_TRGM),
+            postgres_only(DROP_CODE_TRGM),
+        ),
+    ]
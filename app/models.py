@@ -1,15 +1,14 @@
 from django.db import models
+from django.db.models import Sum, F, DecimalField
 from decimal import Decimal
 
-@property
-def get_totals(self):
-    items = self.items.all()
+GST_RATE = Decimal("0.05")   # GST as Decimal, NOT float
 
-    sub_total = sum(item.total_price for item in items)
-
-    gst_rate = Decimal("0.05")   # GST as Decimal, NOT float
-    gst = Decimal(sub_total) * gst_rate
 
+def compute_totals(sub_total):
+    # Same rounding as the old per-line loop: GST is taken on the
+    # unrounded subtotal and every figure is rounded at the end.
+    gst = sub_total * GST_RATE
     grand = sub_total + gst
 
     return {
@@ -18,6 +17,25 @@ def get_totals(self):
         'grand_total': round(grand, 2)
     }
 
+
+DEFAULT_COUNTRY_CODE = "91"
+
+
+def normalize_phone(raw, country_code=DEFAULT_COUNTRY_CODE):
+    # E.164 digits without the "+": "098765 43210", "+91-98765-43210"
+    # and "9876543210" all become "919876543210". Partial input (fewer
+    # than 10 digits) is returned as bare digits.
+    digits = "".join(ch for ch in str(raw or "") if ch.isdigit())
+    if str(raw or "").strip().startswith("+"):
+        return digits
+    if digits.startswith("00"):
+        return digits[2:]
+    if len(digits) == 11 and digits.startswith("0"):
+        digits = digits[1:]
+    if len(digits) == 10:
+        return country_code + digits
+    return digits
+
 from django.contrib.auth.models import User
 
 # ======================================================
@@ -74,6 +92,17 @@ class Product(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # keyset pages (pagination.py), optionally per category
+            models.Index(fields=["created_at", "id"], name="product_created_idx"),
+            models.Index(fields=["category", "created_at", "id"], name="product_category_created_idx"),
+            # manager dashboard listing
+            models.Index(fields=["category", "product_name"], name="product_category_name_idx"),
+            # manufacturer report (GROUP BY / ORDER BY manufacturer)
+            models.Index(fields=["manufacturer"], name="product_manufacturer_idx"),
+        ]
+
     def __str__(self):
         return f"{self.product_name} ({self.product_code})"
 
@@ -86,6 +115,20 @@ class Customer(models.Model):
     email = models.EmailField(max_length=255, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Lookup keys (see customers.py): normalized digits for prefix
+    # search, and the same digits reversed so "last 4 digits" searches
+    # are prefix searches too.
+    phone_normalized = models.CharField(max_length=20, db_index=True, blank=True, default="")
+    phone_reversed = models.CharField(max_length=20, db_index=True, blank=True, default="")
+
+    def save(self, *args, **kwargs):
+        self.phone_normalized = normalize_phone(self.phone)
+        self.phone_reversed = self.phone_normalized[::-1]
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "phone" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "phone_normalized", "phone_reversed"}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.name} ({self.phone})"
 
@@ -100,32 +143,46 @@ class Cart(models.Model):
         ('on_hold', 'On Hold'),
     ]
 
-    cashier = models.ForeignKey(User, on_delete=models.CASCADE, related_name="carts")
+    # No single-column index: cart_cashier_number_idx leads with cashier
+    cashier = models.ForeignKey(User, on_delete=models.CASCADE, related_name="carts", db_index=False)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
     customer = models.ForeignKey(Customer, null=True, blank=True, on_delete=models.SET_NULL)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     cart_number = models.IntegerField(default=1)
 
+    class Meta:
+        indexes = [
+            # open bills tabs on the cashier dashboard
+            models.Index(
+                fields=["cashier", "cart_number"],
+                name="cart_active_cashier_idx",
+                condition=models.Q(status="active"),
+            ),
+            # last cart number when opening a new bill
+            models.Index(fields=["cashier", "-cart_number"], name="cart_cashier_number_idx"),
+        ]
+
     def __str__(self):
         return f"Cart {self.id} ({self.status}) by {self.cashier.username}"
 
     @property
     def get_totals(self):
-        items = self.items.all()
-        sub_total = sum(item.total_price for item in items)
-
-        # Use Decimal("0.05") NOT the float 0.05
-        gst_rate = Decimal("0.05")
-        gst = sub_total * gst_rate  # <-- THE FIX
-
-        grand = sub_total + gst
-
-        return {
-            'sub_total': round(sub_total, 2),
-            'total_gst': round(gst, 2),
-            'grand_total': round(grand, 2)
-        }
+        # Use the prefetched rows if the caller already loaded them,
+        # otherwise let the database add up the lines in ONE query
+        # (no per-line product lookups).
+        prefetched = getattr(self, '_prefetched_objects_cache', {})
+        if 'items' in prefetched:
+            sub_total = sum(item.total_price for item in prefetched['items'])
+        else:
+            sub_total = self.items.aggregate(
+                total=Sum(
+                    F('product__price') * F('quantity'),
+                    output_field=DecimalField(max_digits=12, decimal_places=2)
+                )
+            )['total'] or 0
+
+        return compute_totals(sub_total)
 
 
 class CartItem(models.Model):
@@ -160,7 +217,8 @@ class Invoice(models.Model):
     ]
 
     invoice_number = models.CharField(max_length=100, unique=True)
-    cashier = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    # No single-column index: invoice_cashier_created_idx leads with cashier
+    cashier = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, db_index=False)
     customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -171,6 +229,16 @@ class Invoice(models.Model):
     status = models.CharField(max_length=20, choices=STATUS, default="pending")
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHODS, default="cash")
 
+    class Meta:
+        indexes = [
+            # keyset pages and date ranges, plain and per filter
+            models.Index(fields=["created_at", "id"], name="invoice_created_idx"),
+            models.Index(fields=["status", "created_at", "id"], name="invoice_status_created_idx"),
+            models.Index(fields=["payment_method", "created_at", "id"], name="invoice_payment_created_idx"),
+            # per-cashier history and rollup rebuilds
+            models.Index(fields=["cashier", "created_at"], name="invoice_cashier_created_idx"),
+        ]
+
 
 
 class InvoiceItem(models.Model):
@@ -178,8 +246,100 @@ class InvoiceItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
     product_name = models.CharField(max_length=100)
     price_at_sale = models.DecimalField(max_digits=10, decimal_places=2)
+    # Product cost when sold, so later cost edits don't rewrite past profit
+    cost_at_sale = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     quantity = models.PositiveIntegerField()
 
+    class Meta:
+        indexes = [
+            # covers per-product revenue/cost totals (rebuild_product_sales)
+            models.Index(
+                fields=["product", "quantity", "price_at_sale", "cost_at_sale"],
+                name="invoiceitem_product_sales_idx",
+            ),
+        ]
+
     @property
     def total_price(self):
         return self.price_at_sale * self.quantity
+
+
+# ======================================================
+# REPORTING ROLLUP
+# ======================================================
+
+class SalesRollup(models.Model):
+    # One row per (day, cashier, payment method, category), updated in
+    # the same transaction that creates each invoice (see checkout.py)
+    # and rebuilt from history with `manage.py rebuild_sales_rollup`.
+    #
+    # Invoice-level figures (count, sub total, GST, grand total) live on
+    # the category=ALL row; line-level figures (units, revenue before
+    # GST) live on the per-category rows.
+    ALL = ""
+
+    date = models.DateField()
+    cashier = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    payment_method = models.CharField(max_length=20)
+    category = models.CharField(max_length=50, blank=True, default=ALL)
+
+    invoice_count = models.PositiveIntegerField(default=0)
+    sub_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_gst = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    grand_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('date', 'cashier', 'payment_method', 'category')
+        constraints = [
+            # cashier is NULL for invoices without one and after a cashier
+            # is deleted, and NULLs never collide in unique_together: keep
+            # those to one row per key with a partial index (works on every
+            # backend, unlike nulls_distinct=False)
+            models.UniqueConstraint(
+                fields=["date", "payment_method", "category"],
+                condition=models.Q(cashier__isnull=True),
+                name="sales_rollup_no_cashier_key",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.payment_method} {self.category or 'ALL'}"
+
+
+class ProductSales(models.Model):
+    # One row per product with lifetime units, revenue (before GST) and
+    # cost at the time of sale, for the profit / margin / sales reports.
+    # Updated with each invoice like SalesRollup, and rebuilt along with
+    # it by `manage.py rebuild_sales_rollup`.
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name="sales")
+    product_name = models.CharField(max_length=100)
+
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-units"], name="product_sales_units_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_name}: {self.units}"
+
+
+# ======================================================
+# NUMBER SEQUENCES
+# ======================================================
+
+class NumberSequence(models.Model):
+    # Counter rows for sequences.py, e.g. "invoice:01:20250131". Workers
+    # reserve blocks of numbers by bumping last_value, so most numbers
+    # are handed out without touching this table.
+    key = models.CharField(max_length=64, unique=True)
+    last_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key} = {self.last_value}"
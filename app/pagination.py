@@ -0,0 +1,88 @@
+import base64
+import json
+from datetime import date, datetime, time, timedelta
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import make_aware
+
+# Keyset (cursor) pagination over (created_at, id), newest first (or
+# another timestamp column via order_field).
+#
+# Each page is an index range scan that starts where the previous page
+# stopped, so page 1000 costs the same as page 1 (no OFFSET).
+# Cursors are opaque base64 strings handed back in the "next" field.
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(value, pk):
+    raw = json.dumps([value.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        value = parse_datetime(value)
+    except (ValueError, TypeError):
+        raise ValidationError("Invalid cursor.")
+    if value is None or not isinstance(pk, int):
+        raise ValidationError("Invalid cursor.")
+    return value, pk
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValidationError("limit must be an integer.")
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def parse_date(value, name):
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError(f"{name} must be YYYY-MM-DD.")
+
+
+def day_start(day):
+    return make_aware(datetime.combine(day, time.min))
+
+
+def date_range(request, queryset):
+    # ?from=YYYY-MM-DD&to=YYYY-MM-DD, both inclusive. Compared as local
+    # day boundaries on the raw column (not created_at__date) so the
+    # (created_at, id) indexes can be used.
+    start = parse_date(request.GET.get("from"), "from")
+    end = parse_date(request.GET.get("to"), "to")
+    if start:
+        queryset = queryset.filter(created_at__gte=day_start(start))
+    if end:
+        queryset = queryset.filter(created_at__lt=day_start(end + timedelta(days=1)))
+    return queryset
+
+
+def keyset_page(queryset, fields, cursor=None, limit=DEFAULT_PAGE_SIZE, order_field="created_at"):
+    # `fields` must include "id" and `order_field`
+    queryset = queryset.order_by(f"-{order_field}", "-id")
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{f"{order_field}__lt": value}) | Q(**{order_field: value, "id__lt": pk})
+        )
+
+    # Fetch one extra row to know whether there is a next page
+    rows = list(queryset.values(*fields)[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[order_field], last["id"])
+
+    return {"results": rows, "next": next_cursor}
@@ -0,0 +1,217 @@
+import hashlib
+import hmac
+import random
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Payment gateways for UPI / online checkout.
+#
+#   PAYMENT_GATEWAY = "razorpay"  real orders via the Razorpay API
+#   PAYMENT_GATEWAY = "local"     in-process stand-in for development and
+#                                 load tests (no network, no keys)
+#
+# Gateways are built on first use, so a missing key only breaks online
+# payments instead of every import of app.views.
+#
+# Both sign payments the same way (HMAC-SHA256 of "order_id|payment_id"
+# with the key secret), so verification code is shared.
+
+
+class PaymentError(Exception):
+    pass
+
+
+class GatewayUnavailable(PaymentError):
+    # Timeout, connection error or 5xx after retries
+    pass
+
+
+class VerificationFailed(PaymentError):
+    pass
+
+
+def sign(secret, order_id, payment_id):
+    message = f"{order_id}|{payment_id}".encode()
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+class PaymentGateway:
+    name = ""
+    key_id = ""
+
+    def __init__(self, key_secret):
+        self.key_secret = key_secret
+
+    def create_order(self, amount_paise, receipt=""):
+        # -> order id
+        raise NotImplementedError
+
+    def verify_payment(self, order_id, payment_id, signature):
+        if not (order_id and payment_id and signature):
+            raise VerificationFailed("Missing payment details.")
+        expected = sign(self.key_secret, order_id, payment_id)
+        if not hmac.compare_digest(expected, signature):
+            raise VerificationFailed("Signature mismatch.")
+        return payment_id
+
+    def checkout_options(self, order_id):
+        # Extra fields for the browser (see checkout.html)
+        return {}
+
+
+# ======================================================
+# RAZORPAY
+# ======================================================
+
+class RazorpayGateway(PaymentGateway):
+    name = "razorpay"
+
+    def __init__(self, key_id, key_secret, timeout=(3.05, 10), retries=2, pool_size=10):
+        if not (key_id and key_secret):
+            raise ImproperlyConfigured("RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET must be set.")
+        super().__init__(key_secret)
+        self.key_id = key_id
+        self.timeout = timeout
+        self.client = self._client(retries, pool_size)
+
+    def _client(self, retries, pool_size):
+        import razorpay
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        # One keep-alive pool per process instead of a TLS handshake per
+        # order. Only failed connects are retried: the request never reached
+        # Razorpay, so resending a POST cannot create a second order. Read
+        # timeouts and 5xx fail straight away, which also bounds checkout to
+        # (retries + 1) connect timeouts plus one read timeout.
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=0,
+            other=0,
+            backoff_factor=0.3,
+            allowed_methods=None,
+            raise_on_status=False,
+        )
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry))
+        return razorpay.Client(session=session, auth=(self.key_id, self.key_secret))
+
+    def create_order(self, amount_paise, receipt=""):
+        import requests
+        from razorpay.errors import BadRequestError, ServerError, GatewayError
+
+        data = {"amount": amount_paise, "currency": "INR", "payment_capture": "1"}
+        if receipt:
+            data["receipt"] = receipt
+        try:
+            order = self.client.order.create(data=data, timeout=self.timeout)
+        except (requests.RequestException, BadRequestError, ServerError, GatewayError) as e:
+            # BadRequestError: rejected keys or amount; the till can still take cash
+            raise GatewayUnavailable(str(e) or "Payment gateway did not respond.")
+        return order["id"]
+
+    def verify_payment(self, order_id, payment_id, signature):
+        from razorpay.errors import BadRequestError, SignatureVerificationError
+
+        if not (order_id and payment_id and signature):
+            raise VerificationFailed("Missing payment details.")
+        try:
+            self.client.utility.verify_payment_signature({
+                "razorpay_order_id": order_id,
+                "razorpay_payment_id": payment_id,
+                "razorpay_signature": signature,
+            })
+        except (BadRequestError, SignatureVerificationError) as e:
+            raise VerificationFailed(str(e) or "Signature mismatch.")
+        return payment_id
+
+
+# ======================================================
+# LOCAL STAND-IN
+# ======================================================
+
+class LocalGateway(PaymentGateway):
+    # Behaves like a remote gateway without leaving the process:
+    # `latency` seconds (+/- `jitter`) per order, and `failure_rate` of
+    # orders fail with GatewayUnavailable. The browser skips the payment
+    # popup and submits the simulated payment returned in
+    # checkout_options().
+    name = "local"
+    key_id = "local"
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, key_secret="local-secret", seed=None):
+        super().__init__(key_secret)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.orders = 0
+        self.failures = 0
+
+    def create_order(self, amount_paise, receipt=""):
+        with self._lock:
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            fail = self.random.random() < self.failure_rate
+            self.orders += 1
+            self.failures += fail
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise GatewayUnavailable("Injected gateway failure.")
+        return f"order_local_{uuid.uuid4().hex[:14]}"
+
+    def checkout_options(self, order_id):
+        payment_id = f"pay_local_{uuid.uuid4().hex[:14]}"
+        return {
+            "simulated": {
+                "razorpay_order_id": order_id,
+                "razorpay_payment_id": payment_id,
+                "razorpay_signature": sign(self.key_secret, order_id, payment_id),
+            }
+        }
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def build_gateway(name=None):
+    name = name or getattr(settings, "PAYMENT_GATEWAY", "razorpay")
+    if name == "razorpay":
+        return RazorpayGateway(
+            getattr(settings, "RAZORPAY_KEY_ID", ""),
+            getattr(settings, "RAZORPAY_KEY_SECRET", ""),
+            timeout=getattr(settings, "PAYMENT_GATEWAY_TIMEOUT", (3.05, 10)),
+            retries=getattr(settings, "PAYMENT_GATEWAY_RETRIES", 2),
+        )
+    if name == "local":
+        return LocalGateway(
+            latency=getattr(settings, "LOCAL_GATEWAY_LATENCY", 0.0),
+            jitter=getattr(settings, "LOCAL_GATEWAY_JITTER", 0.0),
+            failure_rate=getattr(settings, "LOCAL_GATEWAY_FAILURE_RATE", 0.0),
+        )
+    raise ImproperlyConfigured(f"Unknown PAYMENT_GATEWAY '{name}'.")
+
+
+def get_gateway():
+    # One gateway (and one HTTP pool) per process
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = build_gateway()
+    return _gateway
+
+
+def set_gateway(gateway):
+    # For tests and the load generator; None goes back to settings
+    global _gateway
+    _gateway = gateway
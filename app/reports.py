@@ -0,0 +1,87 @@
+import calendar
+from datetime import date, timedelta
+
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+from .models import SalesRollup
+
+# ======================================================
+# DASHBOARD CHART SERIES
+# ======================================================
+# Each series is built from ONE grouped query over the daily sales
+# rollup; missing days/months are filled with zeros in Python.
+
+
+def invoice_totals():
+    # Invoice-level rows of the rollup (see SalesRollup)
+    return SalesRollup.objects.filter(category=SalesRollup.ALL)
+
+
+def shift_month(day, months):
+    # Calendar-month arithmetic on the first of the month
+    index = day.year * 12 + (day.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def daily_totals(start, end):
+    rows = (
+        invoice_totals()
+        .filter(date__gte=start, date__lte=end)
+        .values("date")
+        .annotate(total=Sum("grand_total"))
+        .order_by()
+    )
+    return {row["date"]: row["total"] for row in rows}
+
+
+def monthly_totals(start, end):
+    # start/end are first-of-month dates, both inclusive
+    rows = (
+        invoice_totals()
+        .filter(date__gte=start, date__lt=shift_month(end, 1))
+        .annotate(month=TruncMonth("date"))
+        .values("month")
+        .annotate(total=Sum("grand_total"))
+        .order_by()
+    )
+    return {(row["month"].year, row["month"].month): row["total"] for row in rows}
+
+
+def weekly_series(today):
+    start = today - timedelta(days=6)
+    totals = daily_totals(start, today)
+
+    days = [start + timedelta(days=i) for i in range(7)]
+    labels = [day.strftime("%a") for day in days]   # Mon, Tue
+    data = [float(totals.get(day) or 0) for day in days]
+    return labels, data
+
+
+def daily_series(today, days=30):
+    # ISO dates (for the admin dashboard, which formats them itself)
+    start = today - timedelta(days=days - 1)
+    totals = daily_totals(start, today)
+
+    dates = [start + timedelta(days=i) for i in range(days)]
+    return [day.isoformat() for day in dates], [float(totals.get(day) or 0) for day in dates]
+
+
+def monthly_series(today, months=6):
+    # Jan–Dec of the current year plus the last `months` calendar months,
+    # from a single grouped query spanning both windows.
+    this_month = today.replace(day=1)
+    six_start = shift_month(this_month, -(months - 1))
+    year_start = date(today.year, 1, 1)
+    year_end = date(today.year, 12, 1)
+
+    totals = monthly_totals(min(six_start, year_start), max(this_month, year_end))
+
+    monthly_labels = [calendar.month_abbr[m] for m in range(1, 13)]   # Jan, Feb, Mar
+    monthly_data = [float(totals.get((today.year, m)) or 0) for m in range(1, 13)]
+
+    six_months = [shift_month(six_start, i) for i in range(months)]
+    six_month_labels = [f"{calendar.month_abbr[d.month]} {d.year}" for d in six_months]
+    six_month_data = [float(totals.get((d.year, d.month)) or 0) for d in six_months]
+
+    return monthly_labels, monthly_data, six_month_labels, six_month_data
@@ -0,0 +1,247 @@
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum, Count, F
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+from django.utils.timezone import localdate
+
+from .db import UPSERT_VENDORS
+from .models import Invoice, InvoiceItem, Product, SalesRollup, ProductSales
+
+# ======================================================
+# INCREMENTAL UPDATE (called inside finalize_invoice)
+# ======================================================
+
+def _bump(key, **deltas):
+    # UPDATE ... SET col = col + delta, falling back to INSERT for the
+    # first invoice of the day. If two tills race on the INSERT the loser
+    # retries the UPDATE.
+    increments = {field: F(field) + value for field, value in deltas.items()}
+    if SalesRollup.objects.filter(**key).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            SalesRollup.objects.create(**key, **deltas)
+    except IntegrityError:
+        SalesRollup.objects.filter(**key).update(**increments)
+
+
+@receiver(pre_delete, sender=User)
+def _fold_deleted_cashier(sender, instance, **kwargs):
+    # SalesRollup.cashier is SET_NULL, and NULL cashiers are part of the
+    # unique key: move the cashier's rows onto the NULL-cashier rows
+    # first, so the SET_NULL update has nothing left to collide with.
+    rows = SalesRollup.objects.filter(cashier=instance)
+    totals = ("invoice_count", "sub_total", "total_gst", "grand_total", "quantity", "revenue")
+    for row in rows.values("date", "payment_method", "category", *totals):
+        key = {field: row.pop(field) for field in ("date", "payment_method", "category")}
+        _bump(dict(key, cashier=None), **row)
+    rows.delete()
+
+
+def record_invoice(invoice, items):
+    # items: (InvoiceItem, Product) pairs just written, with the products
+    # locked by the caller (no extra queries for the category).
+    key = {
+        "date": localdate(invoice.created_at),
+        "cashier": invoice.cashier,
+        "payment_method": invoice.payment_method,
+    }
+
+    _bump(
+        dict(key, category=SalesRollup.ALL),
+        invoice_count=1,
+        sub_total=invoice.sub_total,
+        total_gst=invoice.total_gst,
+        grand_total=invoice.grand_total,
+    )
+
+    per_category = defaultdict(lambda: [0, 0])
+    for item, product in items:
+        per_category[product.category][0] += item.quantity
+        per_category[product.category][1] += item.price_at_sale * item.quantity
+
+    for category, (quantity, revenue) in per_category.items():
+        _bump(dict(key, category=category), quantity=quantity, revenue=revenue)
+
+    record_product_sales([
+        (product.id, product.product_name, item.quantity, item.price_at_sale * item.quantity,
+         item.cost_at_sale * item.quantity)
+        for item, product in items
+    ])
+
+
+def record_product_sales(rows):
+    # rows: (product_id, product_name, units, revenue, cost), one per
+    # product, named after the current Product like rebuild_product_sales
+    # (renames are copied over by _product_renamed below). One INSERT ... ON CONFLICT for the whole basket where the
+    # database supports it, in product id order like the stock locks.
+    rows = sorted(rows)
+    if not rows:
+        return
+    if connection.vendor in UPSERT_VENDORS:
+        _upsert_product_sales(rows)
+        return
+    for product_id, name, units, revenue, cost in rows:
+        lines = ProductSales.objects.filter(product_id=product_id)
+        increments = {"units": F("units") + units, "revenue": F("revenue") + revenue, "cost": F("cost") + cost}
+        if lines.update(product_name=name, **increments):
+            continue
+        try:
+            with transaction.atomic():
+                ProductSales.objects.create(product_id=product_id, product_name=name,
+                                            units=units, revenue=revenue, cost=cost)
+        except IntegrityError:
+            lines.update(product_name=name, **increments)
+
+
+def _upsert_product_sales(rows):
+    meta = ProductSales._meta
+    qn = connection.ops.quote_name
+    table = qn(meta.db_table)
+    product_col = qn(meta.get_field("product").column)
+    name_col, units_col, revenue_col, cost_col = (
+        qn(meta.get_field(name).column) for name in ("product_name", "units", "revenue", "cost")
+    )
+
+    params = [value for row in rows for value in row]
+    sql = (
+        f"INSERT INTO {table} ({product_col}, {name_col}, {units_col}, {revenue_col}, {cost_col}) "
+        f"VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(rows))} "
+        f"ON CONFLICT ({product_col}) DO UPDATE SET "
+        f"{name_col} = EXCLUDED.{name_col}, "
+        + ", ".join(f"{col} = {table}.{col} + EXCLUDED.{col}" for col in (units_col, revenue_col, cost_col))
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+@receiver(post_save, sender=Product)
+def _product_renamed(sender, instance, created, update_fields=None, **kwargs):
+    # Keep the report's product names current between sales
+    if not created and (update_fields is None or "product_name" in update_fields):
+        (ProductSales.objects.filter(product_id=instance.id)
+         .exclude(product_name=instance.product_name)
+         .update(product_name=instance.product_name))
+
+
+# ======================================================
+# FULL REBUILD (manage.py rebuild_sales_rollup)
+# ======================================================
+
+def _lock_against_writers(model):
+    # EXCLUSIVE blocks checkouts' increments (they wait and then apply on
+    # top of the rebuilt rows) but not readers, until the rebuild commits.
+    # Without it a sale committed between reading the invoices and
+    # replacing the rows would be lost. SQLite has a single writer anyway.
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {connection.ops.quote_name(model._meta.db_table)} IN EXCLUSIVE MODE")
+
+
+def rebuild_rollup(since=None):
+    with transaction.atomic():
+        _lock_against_writers(SalesRollup)
+        rollups = _read_rollups(since)
+
+        existing = SalesRollup.objects.all()
+        if since:
+            existing = existing.filter(date__gte=since)
+        existing.delete()
+        SalesRollup.objects.bulk_create(rollups, batch_size=1000)
+
+    return len(rollups) + rebuild_product_sales()
+
+
+def _read_rollups(since):
+    invoices = Invoice.objects.all()
+    items = InvoiceItem.objects.all()
+    if since:
+        invoices = invoices.filter(created_at__date__gte=since)
+        items = items.filter(invoice__created_at__date__gte=since)
+
+    invoice_rows = (
+        invoices
+        .annotate(day=TruncDate("created_at"))
+        .values("day", "cashier_id", "payment_method")
+        .annotate(
+            invoice_count=Count("id"),
+            sub_total=Sum("sub_total"),
+            total_gst=Sum("total_gst"),
+            grand_total=Sum("grand_total"),
+        )
+        .order_by()
+    )
+    item_rows = (
+        items
+        .annotate(day=TruncDate("invoice__created_at"))
+        .values("day", "invoice__cashier_id", "invoice__payment_method", "product__category")
+        .annotate(
+            units=Sum("quantity"),
+            line_revenue=Sum(F("price_at_sale") * F("quantity")),
+        )
+        .order_by()
+    )
+
+    rollups = [
+        SalesRollup(
+            date=row["day"],
+            cashier_id=row["cashier_id"],
+            payment_method=row["payment_method"],
+            category=SalesRollup.ALL,
+            invoice_count=row["invoice_count"],
+            sub_total=row["sub_total"],
+            total_gst=row["total_gst"],
+            grand_total=row["grand_total"],
+        )
+        for row in invoice_rows.iterator()
+    ]
+    rollups += [
+        SalesRollup(
+            date=row["day"],
+            cashier_id=row["invoice__cashier_id"],
+            payment_method=row["invoice__payment_method"],
+            category=row["product__category"],
+            quantity=row["units"],
+            revenue=row["line_revenue"],
+        )
+        for row in item_rows.iterator()
+    ]
+    return rollups
+
+
+def rebuild_product_sales():
+    # Lifetime totals, so always rebuilt in full (even with `since`).
+    # Cost comes from the items themselves (cost_at_sale): one scan of
+    # InvoiceItem, covered by invoiceitem_product_sales_idx, no join.
+    with transaction.atomic():
+        _lock_against_writers(ProductSales)
+        rows = (
+            InvoiceItem.objects
+            .values("product_id")
+            .annotate(
+                units=Sum("quantity"),
+                line_revenue=Sum(F("price_at_sale") * F("quantity")),
+                line_cost=Sum(F("cost_at_sale") * F("quantity")),
+            )
+            .order_by()
+        )
+        names = dict(Product.objects.values_list("id", "product_name"))
+        sales = [
+            ProductSales(
+                product_id=row["product_id"],
+                product_name=names[row["product_id"]],
+                units=row["units"],
+                revenue=row["line_revenue"],
+                cost=row["line_cost"],
+            )
+            for row in rows.iterator()
+        ]
+
+        ProductSales.objects.all().delete()
+        ProductSales.objects.bulk_create(sales, batch_size=1000)
+
+    return len(sales)
@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Product
+from .catalog import product_cache
+
+# Product search for the till. Results are ranked in stages, and each
+# stage only runs if the earlier ones didn't fill the page:
+#   1. exact product code (barcode scan)      -> catalog cache
+#   2. code prefix, then name prefix          -> pattern-ops indexes
+#   3. fuzzy match (name trigram on Postgres, substring elsewhere)
+#   4. code substring (Postgres only; the basic fuzzy stage covers it)
+#
+# The backend is picked from settings.PRODUCT_SEARCH_BACKEND (dotted
+# path) or, if unset, from the database vendor.
+
+RESULT_FIELDS = ("id", "product_name", "price", "product_code")
+
+
+class BasicSearchBackend:
+    stages = ("code_prefix", "name_prefix", "fuzzy")
+
+    def __init__(self, limit=10):
+        self.limit = limit
+
+    def active(self):
+        return Product.objects.filter(status="active")
+
+    def exact(self, query):
+        # Served from the in-process catalog cache: a scanned barcode
+        # usually never reaches the database.
+        rows = []
+        for code in dict.fromkeys((query, query.upper())):
+            product = product_cache.get_by_code(code)
+            if product is not None and product.status == "active":
+                rows.append({field: getattr(product, field) for field in RESULT_FIELDS})
+        return rows
+
+    def code_prefix(self, query):
+        return self.active().filter(product_code__startswith=query.upper()).order_by("product_code")
+
+    def name_prefix(self, query):
+        return self.active().filter(product_name__istartswith=query).order_by("product_name")
+
+    def fuzzy(self, query):
+        return (
+            self.active()
+            .filter(Q(product_name__icontains=query) | Q(product_code__icontains=query))
+            .order_by("product_name")
+        )
+
+    def search(self, query):
+        query = query.strip()
+        results = self.exact(query)[:self.limit]
+        seen = {row["id"] for row in results}
+
+        for name in self.stages:
+            stage = getattr(self, name)
+            remaining = self.limit - len(results)
+            if remaining <= 0:
+                break
+            # Over-fetch by what we've already got so de-duping can't
+            # leave the page short.
+            for row in stage(query).values(*RESULT_FIELDS)[:remaining + len(seen)]:
+                if row["id"] not in seen:
+                    seen.add(row["id"])
+                    results.append(row)
+
+        return results[:self.limit]
+
+
+class PostgresSearchBackend(BasicSearchBackend):
+    # Needs the pg_trgm extension and the GIN indexes from migrations
+    # 0010 and 0019.
+    stages = BasicSearchBackend.stages + ("code_substring",)
+
+    def fuzzy(self, query):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        # %> already cuts off at pg_trgm.word_similarity_threshold; the
+        # rank is only used for ordering.
+        return (
+            self.active()
+            .filter(product_name__trigram_word_similar=query)
+            .annotate(rank=TrigramWordSimilarity(query, "product_name"))
+            .order_by("-rank", "product_name")
+        )
+
+    def code_substring(self, query):
+        # Kept apart from fuzzy so each stage can use its own index
+        return self.active().filter(product_code__icontains=query).order_by("product_name")
+
+
+def get_search_backend():
+    path = getattr(settings, "PRODUCT_SEARCH_BACKEND", None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == "postgresql":
+        return PostgresSearchBackend()
+    return BasicSearchBackend()
+
+
+def search_products(query):
+    return get_search_backend().search(query)
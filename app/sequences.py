@@ -0,0 +1,117 @@
+import os
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.timezone import localdate
+
+from .models import NumberSequence, Product
+
+# Block-allocated number sequences.
+#
+# Each process reserves a block of numbers at a time with one atomic
+# UPDATE on NumberSequence (last_value = last_value + block) and hands
+# them out from memory, so a number costs an in-memory counter bump and
+# the database is touched once per block. Numbers never repeat;
+# they increase within a process, may interleave between processes, and
+# the unused tail of a block is skipped when a process exits.
+#
+# Reservations commit on their own: call next() OUTSIDE any transaction
+# that might roll back, or a rolled-back block could be handed out twice.
+
+INVOICE_BLOCK_SIZE = 50
+
+
+def reserve_block(key, size):
+    # -> first number of a freshly reserved [first, first + size) range
+    with transaction.atomic():
+        rows = NumberSequence.objects.filter(key=key)
+        if not rows.update(last_value=F("last_value") + size):
+            try:
+                with transaction.atomic():
+                    NumberSequence.objects.create(key=key, last_value=size)
+                return 1
+            except IntegrityError:
+                rows.update(last_value=F("last_value") + size)
+        # The row stays locked by our UPDATE until commit
+        last = rows.values_list("last_value", flat=True).get()
+    return last - size + 1
+
+
+class BlockAllocator:
+    def __init__(self, block_size, max_keys=16):
+        self.block_size = block_size
+        # Keys like "invoice:01:<day>" change daily; keep the newest few
+        self.max_keys = max_keys
+        self._blocks = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.reservations = 0
+
+    def next(self, key):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker: the parent's blocks are not ours to use
+                self._blocks.clear()
+                self._pid = os.getpid()
+
+            block = self._blocks.get(key)
+            if block is None or block[0] >= block[1]:
+                start = reserve_block(key, self.block_size)
+                self._blocks.pop(key, None)
+                block = self._blocks[key] = [start, start + self.block_size]
+                self.reservations += 1
+                while len(self._blocks) > self.max_keys:
+                    del self._blocks[next(iter(self._blocks))]
+            value = block[0]
+            block[0] += 1
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+
+
+# ======================================================
+# INVOICE NUMBERS
+# ======================================================
+
+invoice_numbers = BlockAllocator(getattr(settings, "INVOICE_NUMBER_BLOCK_SIZE", INVOICE_BLOCK_SIZE))
+
+
+def next_invoice_number(day=None, store=None):
+    # <store>-<YYYYMMDD>-<seq>, e.g. 01-20250131-000042; restarts daily
+    day = day or localdate()
+    store = store or getattr(settings, "STORE_CODE", "01")
+    seq = invoice_numbers.next(f"invoice:{store}:{day:%Y%m%d}")
+    return f"{store}-{day:%Y%m%d}-{seq:06d}"
+
+
+# ======================================================
+# PRODUCT CODES
+# ======================================================
+
+PRODUCT_CODE_KEY = "product_code"
+
+
+def format_product_code(n):
+    return f"PRD{n:03d}"
+
+
+def allocate_product_codes(count):
+    # `count` codes from ONE reservation (add_product asks for 1, bulk
+    # imports for a whole batch). Codes already taken by hand-entered or
+    # imported products are skipped.
+    codes = []
+    while len(codes) < count:
+        need = count - len(codes)
+        first = reserve_block(PRODUCT_CODE_KEY, need)
+        batch = [format_product_code(n) for n in range(first, first + need)]
+        taken = set(Product.objects.filter(product_code__in=batch).values_list("product_code", flat=True))
+        codes += [code for code in batch if code not in taken]
+    return codes
+
+
+def next_product_code():
+    return allocate_product_codes(1)[0]
@@ -1,3 +1,1665 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import Client, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import localdate, now
+
+from .models import Profile, Product, Cart, CartItem, Customer, Invoice, InvoiceItem, SalesRollup, ProductSales
+from .checkout import finalize_invoice, OutOfStock, EmptyCart
+from .search import BasicSearchBackend, PostgresSearchBackend
+from .catalog import ProductCache, product_cache
+from .reports import shift_month, monthly_series, weekly_series
+from . import rollup
+from .rollup import rebuild_rollup
+from .invoice_pdf import PdfCache, pdf_cache, generate_invoice_pdf, render_invoice_pdf, get_logo
+from .importer import RowError, import_products, iter_json_array, iter_rows as iter_import_rows
+from .carts import add_item, add_items, _increment
+from .instrumentation import registry
+from .customers import find_customers, get_or_create_customer, lookup_cache
+from .models import normalize_phone
+from .sequences import BlockAllocator, invoice_numbers, next_invoice_number, reserve_block, allocate_product_codes
+from .management.commands import export_invoice_pdfs, loadgen_till
+from .payments import LocalGateway, RazorpayGateway, GatewayUnavailable, VerificationFailed, set_gateway, sign
+
+
+def make_products(n, price="19.99", start=0):
+    return Product.objects.bulk_create([
+        Product(
+            product_name=f"Item {i}",
+            product_code=f"T{i:06d}",
+            category="grocery",
+            price=Decimal(price),
+            cost_price=Decimal("10.00"),
+            stock_quantity=1000,
+        )
+        for i in range(start, start + n)
+    ])
+
+
+def make_user(username, role=None):
+    user = User.objects.create_user(username, password="pw")
+    if role:
+        Profile.objects.create(user=user, full_name=username, role=role)
+    return user
+
+
+def make_invoices(n, when, cashier=None, amount="105.00"):
+    invoices = Invoice.objects.bulk_create([
+        Invoice(
+            invoice_number=f"INV{Invoice.objects.count() + i:08d}",
+            cashier=cashier,
+            sub_total=Decimal("100.00"),
+            total_gst=Decimal("5.00"),
+            grand_total=Decimal(amount),
+            status="paid",
+        )
+        for i in range(n)
+    ])
+    # created_at is auto_now_add, so backdate with an update
+    Invoice.objects.filter(id__in=[i.id for i in invoices]).update(created_at=when)
+    return invoices
+
+
+# ======================================================
+# CART TOTALS
+# ======================================================
+
+class CartTotalsTests(TestCase):
+
+    def setUp(self):
+        self.cashier = User.objects.create_user("till1", password="pw")
+        self.cart = Cart.objects.create(cashier=self.cashier)
+
+    def fill(self, lines):
+        products = make_products(lines, price="13.37")
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product=p, quantity=(i % 7) + 1)
+            for i, p in enumerate(products)
+        ])
+
+    def old_totals(self):
+        # The previous per-line implementation, kept as the reference.
+        sub_total = sum(
+            item.product.price * item.quantity
+            for item in self.cart.items.select_related('product')
+        )
+        gst = sub_total * Decimal("0.05")
+        return {
+            'sub_total': round(sub_total, 2),
+            'total_gst': round(gst, 2),
+            'grand_total': round(sub_total + gst, 2),
+        }
+
+    def test_empty_cart(self):
+        self.assertEqual(
+            self.cart.get_totals,
+            {'sub_total': 0, 'total_gst': Decimal("0.00"), 'grand_total': 0}
+        )
+
+    def test_matches_per_line_rounding(self):
+        self.fill(37)
+        self.assertEqual(self.cart.get_totals, self.old_totals())
+
+    def test_query_count_is_flat(self):
+        # Benchmark-style check: one query whatever the basket size.
+        for lines in (1, 50, 250):
+            CartItem.objects.filter(cart=self.cart).delete()
+            Product.objects.all().delete()
+            self.fill(lines)
+            with CaptureQueriesContext(connection) as ctx:
+                self.cart.get_totals
+            self.assertEqual(len(ctx.captured_queries), 1, f"{lines} lines")
+
+    def test_uses_prefetched_rows(self):
+        self.fill(20)
+        cart = Cart.objects.prefetch_related('items__product').get(id=self.cart.id)
+        with self.assertNumQueries(0):
+            totals = cart.get_totals
+        self.assertEqual(totals, self.old_totals())
+
+
+# ======================================================
+# INVOICE FINALIZATION
+# ======================================================
+
+class FinalizeInvoiceTests(TestCase):
+
+    def setUp(self):
+        invoice_numbers.clear()
+        self.cashier = User.objects.create_user("till1", password="pw")
+        self.customer = Customer.objects.create(name="Guest", phone="9000000001")
+
+    def basket(self, lines, qty=2):
+        cart = Cart.objects.create(cashier=self.cashier)
+        products = make_products(lines, start=Product.objects.count())
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=p, quantity=qty) for p in products
+        ])
+        return cart, products
+
+    def finalize(self, cart):
+        return finalize_invoice(cart, self.cashier, self.customer, "cash")
+
+    def test_creates_items_and_deducts_stock(self):
+        cart, products = self.basket(3, qty=4)
+        invoice, cart = self.finalize(cart)
+
+        self.assertEqual(invoice.items.count(), 3)
+        self.assertEqual(invoice.grand_total, cart.get_totals["grand_total"])
+        self.assertEqual(cart.status, "completed")
+        for p in products:
+            p.refresh_from_db()
+            self.assertEqual(p.stock_quantity, 996)
+
+    def test_query_count_is_flat(self):
+        # First sale of the day also inserts the rollup rows
+        self.finalize(self.basket(1)[0])
+
+        counts = []
+        for lines in (5, 60):
+            cart, _ = self.basket(lines)
+            with CaptureQueriesContext(connection) as ctx:
+                self.finalize(cart)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_out_of_stock_rolls_back(self):
+        cart, products = self.basket(2, qty=5)
+        Product.objects.filter(id=products[1].id).update(stock_quantity=3)
+
+        with self.assertRaises(OutOfStock):
+            self.finalize(cart)
+
+        self.assertFalse(Invoice.objects.exists())
+        self.assertFalse(InvoiceItem.objects.exists())
+        products[0].refresh_from_db()
+        self.assertEqual(products[0].stock_quantity, 1000)
+
+    def test_cart_cannot_be_billed_twice(self):
+        cart, _ = self.basket(1)
+        self.finalize(cart)
+        with self.assertRaises(EmptyCart):
+            self.finalize(cart)
+        self.assertEqual(Invoice.objects.count(), 1)
+
+
+# ======================================================
+# PRODUCT SEARCH
+# ======================================================
+
+class ProductSearchTests(TestCase):
+
+    def setUp(self):
+        product_cache.clear()
+        for code, name in [
+            ("PRD100", "Milk Bread"),
+            ("PRD1001", "Basmati Rice"),
+            ("PRD200", "Rice Flour"),
+            ("PRD300", "Brown Rice"),
+        ]:
+            Product.objects.create(
+                product_name=name, product_code=code, category="grocery",
+                price=Decimal("10.00"), stock_quantity=5,
+            )
+
+    def codes(self, query, limit=10):
+        return [r["product_code"] for r in BasicSearchBackend(limit).search(query)]
+
+    def test_exact_code_then_code_prefix(self):
+        self.assertEqual(self.codes("prd100"), ["PRD100", "PRD1001"])
+
+    def test_name_prefix_before_substring(self):
+        self.assertEqual(self.codes("rice"), ["PRD200", "PRD1001", "PRD300"])
+
+    def test_inactive_products_are_hidden(self):
+        Product.objects.filter(product_code="PRD200").update(status="inactive")
+        self.assertNotIn("PRD200", self.codes("rice"))
+
+    def test_limit_and_no_duplicates(self):
+        self.assertEqual(self.codes("PRD", limit=2), ["PRD100", "PRD1001"])
+
+    def test_postgres_backend_still_finds_code_substrings(self):
+        # Trigram matching is on names only; the code stage keeps the two
+        # backends in step for partial codes
+        no_trigram = mock.patch.object(PostgresSearchBackend, "fuzzy", lambda self, q: Product.objects.none())
+        with no_trigram:
+            codes = [r["product_code"] for r in PostgresSearchBackend().search("d10")]
+        self.assertEqual(codes, self.codes("d10"))
+        self.assertEqual(codes, ["PRD1001", "PRD100"])
+
+
+# ======================================================
+# CATALOG CACHE
+# ======================================================
+
+class ProductCacheTests(TestCase):
+
+    def setUp(self):
+        self.cache = ProductCache(max_size=4, ttl=60)
+        self.products = make_products(3)
+
+    def test_hit_after_miss_on_either_key(self):
+        p = self.products[0]
+        self.assertEqual(self.cache.get(p.id).product_code, p.product_code)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cache.get(p.id).id, p.id)
+            self.assertEqual(self.cache.get_by_code(p.product_code).id, p.id)
+        self.assertEqual(self.cache.stats()["hits"], 2)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_unknown_code_is_cached(self):
+        self.assertIsNone(self.cache.get_by_code("NOPE"))
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.cache.get_by_code("NOPE"))
+
+    def test_unknown_codes_do_not_evict_products(self):
+        cache = ProductCache(max_size=4, ttl=60, miss_size=2)
+        for p in self.products[:2]:
+            cache.get(p.id)
+        for prefix in ("T", "T0", "T00", "T000", "T0000"):
+            self.assertIsNone(cache.get_by_code(prefix))
+        with self.assertNumQueries(0):
+            for p in self.products[:2]:
+                cache.get_by_code(p.product_code)
+            self.assertIsNone(cache.get_by_code("T0000"))
+        stats = cache.stats()
+        self.assertEqual((stats["size"], stats["unknown_size"], stats["evictions"]), (4, 2, 0))
+
+    def test_save_invalidates(self):
+        p = self.products[0]
+        self.cache.get(p.id)
+        p.price = Decimal("99.00")
+        p.save()
+        self.assertEqual(self.cache.get(p.id).price, Decimal("99.00"))
+
+    def test_lru_eviction(self):
+        for p in self.products:
+            self.cache.get(p.id)   # two entries each (id + code)
+        stats = self.cache.stats()
+        self.assertEqual(stats["size"], 4)
+        self.assertEqual(stats["evictions"], 2)
+
+
+# ======================================================
+# MANAGER DASHBOARD CHARTS
+# ======================================================
+
+class DashboardChartTests(TestCase):
+
+    def test_shift_month_crosses_years(self):
+        self.assertEqual(shift_month(date(2025, 2, 1), -5), date(2024, 9, 1))
+        self.assertEqual(shift_month(date(2025, 12, 1), 1), date(2026, 1, 1))
+
+    def test_series_are_zero_filled(self):
+        make_invoices(2, datetime(2025, 3, 31, 12, tzinfo=dt_timezone.utc))
+        make_invoices(1, datetime(2024, 11, 2, 12, tzinfo=dt_timezone.utc))
+        rebuild_rollup()
+
+        labels, data, six_labels, six_data = monthly_series(date(2025, 3, 31))
+        self.assertEqual(data[2], 210.0)
+        self.assertEqual(sum(data), 210.0)
+        self.assertEqual(six_labels, ["Oct 2024", "Nov 2024", "Dec 2024", "Jan 2025", "Feb 2025", "Mar 2025"])
+        self.assertEqual(six_data, [0.0, 105.0, 0.0, 0.0, 0.0, 210.0])
+
+        week_labels, week_data = weekly_series(date(2025, 3, 31))
+        self.assertEqual(week_labels[-1], "Mon")
+        self.assertEqual(week_data, [0.0] * 6 + [210.0])
+
+    def test_admin_dashboard_charts_are_aggregated(self):
+        make_products(3)
+        old = make_invoices(2, datetime(2024, 1, 5, 12, tzinfo=dt_timezone.utc))
+        Invoice.objects.filter(id=old[0].id).update(payment_method="upi")
+        make_invoices(1, now())
+        rebuild_rollup()
+
+        with self.assertNumQueries(6):
+            data = self.client.get("/api/dashboard/").json()
+        self.assertEqual(data["productsByCategory"], {"grocery": 3})
+        # Payment split covers every invoice, not just the chart window
+        self.assertEqual(data["paymentMethods"], {"cash": 2, "upi": 1})
+        self.assertEqual(len(data["dailyRevenue"]["labels"]), 30)
+        self.assertEqual(data["dailyRevenue"]["labels"][-1], localdate().isoformat())
+        self.assertEqual(data["dailyRevenue"]["data"][-1], 105.0)
+
+    def test_manager_dashboard_query_count_is_constant(self):
+        manager = make_user("boss", role="manager")
+        self.client.force_login(manager)
+
+        counts = []
+        for n in (1, 40):
+            make_invoices(n, datetime(2025, 1, 15, tzinfo=dt_timezone.utc))
+            rebuild_rollup()
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get("/manager-dashboard/")
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+# ======================================================
+# SALES ROLLUP
+# ======================================================
+
+class SalesRollupTests(TestCase):
+
+    def setUp(self):
+        self.cashier = make_user("till1")
+        self.customer = Customer.objects.create(name="Guest", phone="9000000001")
+
+    def sell(self, categories, payment_method="cash"):
+        cart = Cart.objects.create(cashier=self.cashier)
+        start = Product.objects.count()
+        for i, category in enumerate(categories):
+            p = Product.objects.create(
+                product_name=f"P{start + i}", product_code=f"R{start + i:05d}",
+                category=category, price=Decimal("10.00"), stock_quantity=50,
+            )
+            CartItem.objects.create(cart=cart, product=p, quantity=3)
+        return finalize_invoice(cart, self.cashier, self.customer, payment_method)[0]
+
+    def snapshot(self):
+        return sorted(
+            SalesRollup.objects.values_list(
+                "date", "cashier_id", "payment_method", "category",
+                "invoice_count", "grand_total", "quantity", "revenue",
+            )
+        )
+
+    def test_invoice_updates_rollup(self):
+        self.sell(["grocery", "snacks", "snacks"])
+        self.sell(["grocery"])
+
+        totals = SalesRollup.objects.get(category=SalesRollup.ALL)
+        self.assertEqual(totals.invoice_count, 2)
+        self.assertEqual(totals.grand_total, Invoice.objects.aggregate(t=Sum("grand_total"))["t"])
+        snacks = SalesRollup.objects.get(category="snacks")
+        self.assertEqual((snacks.quantity, snacks.revenue), (6, Decimal("60.00")))
+
+    def test_rebuild_matches_incremental(self):
+        self.sell(["grocery", "beverages"], payment_method="upi")
+        self.sell(["grocery"])
+        incremental = self.snapshot()
+
+        rebuild_rollup()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_rebuild_reads_inside_its_write_transaction(self):
+        self.sell(["grocery"])
+        depth = len(connection.atomic_blocks)
+        seen = []
+        read_rollups = rollup._read_rollups
+
+        def read(since):
+            seen.append(len(connection.atomic_blocks))
+            return read_rollups(since)
+
+        with mock.patch("app.rollup._read_rollups", read):
+            rebuild_rollup()
+        self.assertEqual(seen, [depth + 1])
+        self.assertEqual(SalesRollup.objects.get(category=SalesRollup.ALL).invoice_count, 1)
+
+    def test_deleted_cashiers_share_one_row_per_key(self):
+        self.sell(["grocery"])
+        first = self.cashier
+        self.cashier = make_user("till2")
+        self.sell(["grocery"])
+        first.delete()
+        self.cashier.delete()
+
+        totals = SalesRollup.objects.get(category=SalesRollup.ALL)
+        self.assertEqual((totals.cashier_id, totals.invoice_count), (None, 2))
+        grocery = SalesRollup.objects.get(category="grocery")
+        self.assertEqual((grocery.cashier_id, grocery.quantity), (None, 6))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SalesRollup.objects.create(date=totals.date, payment_method="cash", category=SalesRollup.ALL)
+        incremental = self.snapshot()
+        rebuild_rollup()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_reports_read_rollup(self):
+        self.sell(["grocery", "snacks"])
+        response = self.client.get("/api/category-revenue/")
+        self.assertEqual(
+            {row["category"] for row in response.json()}, {"grocery", "snacks"}
+        )
+        self.assertEqual(self.client.get("/api/dashboard/").json()["totalInvoices"], 1)
+
+    def product_sales(self):
+        return sorted(ProductSales.objects.values_list("product_id", "product_name", "units", "revenue", "cost"))
+
+    def test_invoice_updates_product_sales(self):
+        invoice = self.sell(["grocery", "snacks"])
+        Product.objects.update(cost_price=Decimal("7.50"))
+        product = invoice.items.first().product
+        cart = Cart.objects.create(cashier=self.cashier)
+        CartItem.objects.create(cart=cart, product=product, quantity=2)
+        finalize_invoice(cart, self.cashier, self.customer, "cash")
+
+        sales = ProductSales.objects.get(product=product)
+        # Cost is taken at the time of each sale: 3 x 0.00 + 2 x 7.50
+        self.assertEqual((sales.units, sales.revenue, sales.cost), (5, Decimal("50.00"), Decimal("15.00")))
+        self.assertEqual(ProductSales.objects.count(), 2)
+
+    def test_rebuild_product_sales(self):
+        self.sell(["grocery", "beverages"])
+        self.sell(["grocery"])
+        incremental = self.product_sales()
+
+        ProductSales.objects.all().delete()
+        rebuild_rollup()
+        self.assertEqual(self.product_sales(), incremental)
+
+    def test_product_names_follow_renames(self):
+        invoice = self.sell(["grocery"])
+        product = invoice.items.get().product
+        InvoiceItem.objects.filter(invoice=invoice).update(product_name="Old label")
+        product.product_name = "Renamed"
+        product.save()
+        self.assertEqual(ProductSales.objects.get().product_name, "Renamed")
+
+        self.sell(["grocery"])
+        incremental = self.product_sales()
+        rebuild_rollup()
+        self.assertEqual(self.product_sales(), incremental)
+
+    def test_cost_edits_do_not_rewrite_past_profit(self):
+        Product.objects.create(
+            product_name="Tea", product_code="R90000", category="beverages",
+            price=Decimal("10.00"), cost_price=Decimal("6.00"), stock_quantity=50,
+        )
+        cart = Cart.objects.create(cashier=self.cashier)
+        CartItem.objects.create(cart=cart, product=Product.objects.get(product_code="R90000"), quantity=4)
+        invoice = finalize_invoice(cart, self.cashier, self.customer, "cash")[0]
+        self.assertEqual(invoice.items.get().cost_at_sale, Decimal("6.00"))
+
+        Product.objects.update(cost_price=Decimal("9.00"))
+        rebuild_rollup()
+        self.assertEqual(ProductSales.objects.get().cost, Decimal("24.00"))
+
+    def test_profit_and_margin_read_product_sales(self):
+        invoice = self.sell(["grocery"])
+        ProductSales.objects.filter(product=invoice.items.get().product).update(cost=Decimal("12.00"))
+
+        with self.assertNumQueries(1):
+            profit = self.client.get("/api/report/profit/").json()
+        self.assertEqual(Decimal(profit[0]["total_profit"]), Decimal("18"))
+        with self.assertNumQueries(1):
+            margin = self.client.get("/api/report/margin/").json()
+        self.assertEqual(Decimal(margin[0]["margin"]), Decimal("60"))
+        self.assertEqual(self.client.get("/api/top-products/").json()[0]["total_qty"], 3)
+
+
+# ======================================================
+# PAGINATED JSON APIS
+# ======================================================
+
+class KeysetApiTests(TestCase):
+
+    def setUp(self):
+        make_invoices(5, datetime(2025, 1, 10, tzinfo=dt_timezone.utc))
+        make_invoices(3, datetime(2025, 2, 10, tzinfo=dt_timezone.utc))
+        Invoice.objects.filter(id__in=Invoice.objects.order_by("id").values("id")[:2]).update(payment_method="upi")
+
+    def walk(self, url):
+        ids, pages = [], 0
+        while url:
+            body = self.client.get(url).json()
+            ids += [row["id"] for row in body["results"]]
+            pages += 1
+            url = body["next"] and f"/api/invoices/?limit=3&cursor={body['next']}"
+        return ids, pages
+
+    def test_cursor_walks_every_row_once(self):
+        ids, pages = self.walk("/api/invoices/?limit=3")
+        expected = list(Invoice.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 3)
+
+    def test_page_query_count_is_constant(self):
+        first = self.client.get("/api/invoices/?limit=3").json()
+        with self.assertNumQueries(1):
+            self.client.get(f"/api/invoices/?limit=3&cursor={first['next']}")
+
+    def test_filters(self):
+        body = self.client.get("/api/invoices/?from=2025-02-01&to=2025-02-28").json()
+        self.assertEqual(len(body["results"]), 3)
+        body = self.client.get("/api/invoices/?payment_method=upi").json()
+        self.assertEqual(len(body["results"]), 2)
+
+    def test_limit_is_capped_and_bad_input_rejected(self):
+        self.assertEqual(len(self.client.get("/api/invoices/?limit=100000").json()["results"]), 8)
+        self.assertEqual(self.client.get("/api/invoices/?cursor=garbage").status_code, 400)
+        self.assertEqual(self.client.get("/api/invoices/?from=yesterday").status_code, 400)
+
+    def test_ndjson_stream(self):
+        make_products(4)
+        response = self.client.get("/api/products/?format=ndjson&category=grocery")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+
+
+# ======================================================
+# STREAMING REPORT EXPORTS
+# ======================================================
+
+class ReportExportTests(TestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Guest", phone="9000000001")
+        cart = Cart.objects.create(cashier=make_user("till1"))
+        for p in make_products(3):
+            CartItem.objects.create(cart=cart, product=p, quantity=2)
+        finalize_invoice(cart, cart.cashier, self.customer, "cash")
+
+    def body(self, response):
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_has_header_and_rows(self):
+        for url, header in [
+            ("/api/report/profit/", "product_name,total_revenue,total_cost,total_profit"),
+            ("/api/report/margin/", "product_name,margin"),
+            ("/api/report/sales/", "product_name,total_sold"),
+            ("/api/report/stock/", "product_name,stock_quantity,stock_value"),
+        ]:
+            lines = self.body(self.client.get(url + "?format=csv")).splitlines()
+            self.assertEqual(lines[0], header, url)
+            self.assertEqual(len(lines), 4, url)
+
+    def test_ndjson_matches_json(self):
+        for url in ("/api/report/margin/", "/api/report/manufacturer/"):
+            streamed = [json.loads(line) for line in self.body(self.client.get(url + "?format=ndjson")).splitlines()]
+            self.assertEqual(streamed, self.client.get(url).json(), url)
+
+
+# ======================================================
+# BULK CATALOG IMPORT
+# ======================================================
+
+def product_row(code, **extra):
+    row = {
+        "product_name": f"Name {code}", "product_code": code, "category": "snacks",
+        "price": "12.50", "cost_price": "8.00", "manufacturer": "Acme",
+        "stock_quantity": 40, "low_stock_threshold": 5, "description": "", "status": "active",
+    }
+    row.update(extra)
+    return row
+
+
+class ProductImportTests(TestCase):
+
+    def upload(self, name, content):
+        return import_products(iter_import_rows(SimpleUploadedFile(name, content.encode())))
+
+    def test_json_array_is_parsed_incrementally(self):
+        rows = [product_row(f"J{i}", price=i + 0.5) for i in range(50)]
+        parsed = list(iter_json_array(io.StringIO(json.dumps(rows, indent=2)), chunk_size=7))
+        self.assertEqual(parsed, rows)
+
+    def test_malformed_element_is_reported_without_reading_on(self):
+        good = json.dumps(product_row("J1"))
+        text = "[" + good + ', {"product_name": oops}, ' + ", ".join([good] * 2000) + "]"
+        stream = io.StringIO(text)
+        parsed = iter_json_array(stream, chunk_size=256)
+        self.assertEqual(next(parsed), product_row("J1"))
+        with self.assertRaisesRegex(RowError, "Malformed JSON at character"):
+            next(parsed)
+        self.assertLess(stream.tell(), 1024)
+
+    def test_truncated_array_is_reported(self):
+        for text in ('[{"product_name": "A"}', '[{"product_name": "A', "[1, tru"):
+            with self.assertRaises(RowError, msg=text):
+                list(iter_json_array(io.StringIO(text), chunk_size=4))
+
+    def test_upsert_on_product_code(self):
+        make_products(1)   # T000000
+        report = self.upload("feed.json", json.dumps([
+            product_row("T000000", price="99.00"),
+            product_row("NEW1"),
+        ]))
+        self.assertEqual(report, {"imported": 2, "failed": 0, "errors": []})
+        self.assertEqual(Product.objects.get(product_code="T000000").price, Decimal("99.00"))
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        report = self.upload("feed.ndjson", "\n".join([
+            json.dumps(product_row("OK1")),
+            json.dumps(product_row("BAD1", category="toys")),
+            "{not json",
+            json.dumps(product_row("OK1")),
+        ]))
+        self.assertEqual(report["imported"], 1)
+        self.assertEqual([e["row"] for e in report["errors"]], [2, 3, 4])
+        self.assertIn("Duplicate", report["errors"][2]["error"])
+
+    def test_out_of_range_numbers_are_row_errors(self):
+        rows = [
+            product_row("N1", price="NaN"),
+            product_row("N2", cost_price="nan"),
+            product_row("N3", price="Infinity"),
+            product_row("N4", stock_quantity=10 ** 12),
+            product_row("N5", stock_quantity=5.7),
+            product_row("N6", low_stock_threshold="5.7"),
+            product_row("N7", stock_quantity=True),
+            product_row("OK1", stock_quantity=2147483647, low_stock_threshold=3.0),
+        ]
+        report = import_products(rows)
+        self.assertEqual(report["imported"], 1)
+        self.assertEqual([e["row"] for e in report["errors"]], [1, 2, 3, 4, 5, 6, 7])
+        self.assertIn("at most 2147483647", report["errors"][3]["error"])
+        self.assertEqual(Product.objects.get().low_stock_threshold, 3)
+
+    def test_codes_are_reserved_outside_the_write_transaction(self):
+        depth = len(connection.atomic_blocks)
+        seen = []
+
+        def allocate(count):
+            seen.append(len(connection.atomic_blocks))
+            return allocate_product_codes(count)
+
+        rows = [product_row("") for _ in range(5)]
+        with mock.patch("app.importer.allocate_product_codes", allocate):
+            report = import_products(rows, batch_size=2)
+        self.assertEqual(report["imported"], 5)
+        self.assertEqual(seen, [depth] * 3)
+
+    def test_csv_and_batching(self):
+        lines = ["product_name,product_code,category,price,stock_quantity"]
+        lines += [f"Item {i},C{i},grocery,1.{i % 10}0,{i}" for i in range(25)]
+        report = import_products(
+            iter_import_rows(SimpleUploadedFile("feed.csv", "\n".join(lines).encode())),
+            batch_size=10,
+        )
+        self.assertEqual(report["imported"], 25)
+        self.assertEqual(Product.objects.get(product_code="C7").low_stock_threshold, 10)
+
+
+# ======================================================
+# INVOICE PDF
+# ======================================================
+
+class InvoicePdfTests(TestCase):
+
+    def setUp(self):
+        pdf_cache.clear()
+        self.cashier = make_user("till1")
+        customer = Customer.objects.create(name="Guest", phone="9000000001")
+        cart = Cart.objects.create(cashier=self.cashier)
+        for p in make_products(5):
+            CartItem.objects.create(cart=cart, product=p, quantity=1)
+        self.invoice, _ = finalize_invoice(cart, self.cashier, customer, "cash")
+        self.client.force_login(self.cashier)
+
+    def test_reprint_is_cached(self):
+        url = f"/print-invoice/{self.invoice.id}/"
+        first = self.client.get(url)
+        self.assertEqual(first["Content-Type"], "application/pdf")
+        self.assertTrue(first.content.startswith(b"%PDF"))
+
+        start = time.perf_counter()
+        second = self.client.get(url)
+        elapsed = time.perf_counter() - start
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(pdf_cache.hits, 1)
+        self.assertLess(elapsed, 0.05)
+
+    def test_status_change_renders_again(self):
+        generate_invoice_pdf(self.invoice)
+        self.invoice.status = "cancelled"
+        generate_invoice_pdf(self.invoice)
+        self.assertEqual(pdf_cache.misses, 2)
+
+    def test_customer_edit_renders_again(self):
+        generate_invoice_pdf(self.invoice)
+        Customer.objects.filter(id=self.invoice.customer_id).update(name="Asha", phone="9000000002")
+        invoice = Invoice.objects.select_related("customer").get(id=self.invoice.id)
+        generate_invoice_pdf(invoice)
+        generate_invoice_pdf(invoice)
+        self.assertEqual((pdf_cache.misses, pdf_cache.hits), (2, 1))
+
+    def test_concurrent_renders_get_their_own_logo(self):
+        self.assertIsNot(get_logo(), get_logo())
+        render_invoice_pdf(self.invoice)   # items prefetched on this thread
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            pdfs = list(pool.map(lambda _: render_invoice_pdf(self.invoice), range(8)))
+        for pdf in pdfs:
+            self.assertTrue(pdf.startswith(b"%PDF"))
+            self.assertEqual(pdf.count(b"/Subtype /Image"), 1)
+
+    def test_walk_in_customer(self):
+        self.invoice.customer = None
+        self.assertTrue(render_invoice_pdf(self.invoice).startswith(b"%PDF"))
+
+    def test_cache_is_size_bounded(self):
+        cache = PdfCache(max_bytes=10)
+        cache.put("a", b"12345")
+        cache.put("b", b"67890")
+        cache.put("c", b"x")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("c"), b"x")
+
+
+class BatchPdfExportTests(TestCase):
+
+    def setUp(self):
+        cashier = make_user("till1")
+        customer = Customer.objects.create(name="Guest", phone="9000000001")
+        products = make_products(2)
+        for _ in range(3):
+            cart = Cart.objects.create(cashier=cashier)
+            for p in products:
+                CartItem.objects.create(cart=cart, product=p, quantity=1)
+            finalize_invoice(cart, cashier, customer, "cash")
+
+    def export(self, output, **opts):
+        out = io.StringIO()
+        call_command("export_invoice_pdfs", output=output, workers=1, stdout=out, **opts)
+        return out.getvalue()
+
+    def test_zip_export_and_resume(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "invoices.zip")
+            ids = list(Invoice.objects.values_list("id", flat=True))
+
+            self.export(path, ids=ids[:2])
+            self.assertIn("Resuming: 2", self.export(path, ids=ids))
+            with zipfile.ZipFile(path) as zf:
+                names = zf.namelist()
+            self.assertEqual(len(names), 3)
+            self.assertTrue(all(n.endswith(".pdf") and "/" in n for n in names))
+
+    def test_interrupted_zip_export_is_packed_on_the_next_run(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "invoices.zip")
+            ids = list(Invoice.objects.values_list("id", flat=True))
+            self.export(path, ids=ids[:1])
+            # What a killed run leaves behind: rendered parts, one half
+            # written, and the previous archive untouched
+            invoice = Invoice.objects.get(id=ids[1])
+            parts = export_invoice_pdfs.ZipArchive(path).parts
+            parts.write(export_invoice_pdfs.archive_name(invoice.invoice_number, invoice.created_at), b"%PDF")
+            with open(os.path.join(parts.path, "junk.pdf.part"), "wb") as f:
+                f.write(b"%P")
+
+            self.assertIn("Resuming: 2", self.export(path, ids=ids))
+            with zipfile.ZipFile(path) as zf:
+                self.assertEqual(len(zf.namelist()), 3)
+            self.assertEqual(os.listdir(tmp), ["invoices.zip"])
+
+    def test_pool_keeps_a_bounded_number_of_chunks_in_flight(self):
+        in_flight, peak = 0, 0
+        lock = threading.Lock()
+
+        def render(ids):
+            nonlocal in_flight, peak
+            with lock:
+                in_flight += 1
+                peak = max(peak, in_flight)
+            time.sleep(0.01)
+            with lock:
+                in_flight -= 1
+            return [(f"x/{pk}.pdf", b"%PDF") for pk in ids]
+
+        def pool(max_workers, **kwargs):
+            return ThreadPoolExecutor(max_workers=max_workers)
+
+        command = export_invoice_pdfs.Command(stdout=io.StringIO())
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(export_invoice_pdfs, "render_chunk", render), \
+                mock.patch.object(export_invoice_pdfs, "ProcessPoolExecutor", pool), \
+                mock.patch.object(export_invoice_pdfs, "connections"):
+            archive = export_invoice_pdfs.DirectoryArchive(tmp)
+            command.run([[i] for i in range(40)], 40, archive, workers=2)
+            self.assertEqual(len(archive.existing()), 40)
+        self.assertLessEqual(peak, 4)
+
+    def test_directory_export(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = self.export(tmp, start=date(2000, 1, 1))
+            self.assertIn("invoices/s", output)
+            pdfs = [f for _, _, files in os.walk(tmp) for f in files]
+            self.assertEqual(len(pdfs), 3)
+
+
+# ======================================================
+# PRODUCT TABLE FRAGMENTS
+# ======================================================
+
+class ProductRowsFragmentTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        make_products(3)
+        Product.objects.create(
+            product_name="Cola", product_code="BEV1", category="beverages",
+            price=Decimal("40.00"), stock_quantity=12,
+        )
+
+    def rows(self, category):
+        return self.client.get(f"/filter-products/?category={category}").json()["html"]
+
+    def test_filter_renders_only_matching_rows(self):
+        html = self.rows("beverages")
+        self.assertEqual(html.count("<tr>"), 1)
+        self.assertIn("Beverages", html)
+        self.assertEqual(self.rows("").count("<tr>"), 4)
+
+    def test_fragment_is_cached_until_products_change(self):
+        self.rows("beverages")
+        # Only the stock column is read again
+        with self.assertNumQueries(1):
+            self.rows("beverages")
+
+        cola = Product.objects.get(product_code="BEV1")
+        cola.product_name = "Diet Cola"
+        cola.save()
+        self.assertIn("Diet Cola", self.rows("beverages"))
+
+    def test_stock_is_current_without_invalidating_the_page(self):
+        self.assertIn("<td>12</td>", self.rows("beverages"))
+        # A sale updates stock with F() and bumps no cache version
+        Product.objects.filter(product_code="BEV1").update(stock_quantity=7)
+        with self.assertNumQueries(1):
+            self.assertIn("<td>7</td>", self.rows("beverages"))
+
+    def test_deleted_rows_are_dropped_from_cached_pages(self):
+        self.rows("")
+        Product.objects.filter(product_code="BEV1").delete()
+        self.assertEqual(self.rows("").count("<tr>"), 3)
+
+
+# ======================================================
+# ADMIN DASHBOARD (LAZY TABLES)
+# ======================================================
+
+class AdminDashboardTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser("root", password="pw")
+        self.client.force_login(self.admin)
+
+    def test_page_cost_does_not_grow_with_data(self):
+        counts = []
+        for n in (1, 200):
+            cache.clear()
+            make_invoices(n, datetime(2025, 1, 15, tzinfo=dt_timezone.utc))
+            make_products(n, start=Product.objects.count())
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get("/admin-dashboard/").status_code, 200)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_stats_are_cached(self):
+        self.client.get("/admin-dashboard/")
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get("/admin-dashboard/")
+        self.assertFalse(any("app_product" in q["sql"] for q in ctx.captured_queries))
+
+    def test_invoice_rows_paginate_and_filter(self):
+        make_invoices(60, datetime(2025, 1, 15, tzinfo=dt_timezone.utc))
+        Invoice.objects.filter(id__in=Invoice.objects.values("id")[:5]).update(status="cancelled")
+
+        first = self.client.get("/admin-dashboard/invoices/").json()
+        self.assertEqual(first["html"].count("<tr>"), 50)
+        second = self.client.get(f"/admin-dashboard/invoices/?cursor={first['next']}").json()
+        self.assertEqual(second["html"].count("<tr>"), 10)
+        self.assertIsNone(second["next"])
+
+        cancelled = self.client.get("/admin-dashboard/invoices/?status=cancelled").json()
+        self.assertEqual(cancelled["html"].count("<tr>"), 5)
+
+    def test_user_and_stock_rows(self):
+        make_user("clerk", role="cashier")
+        make_products(2)
+        users = self.client.get("/admin-dashboard/users/").json()["html"]
+        self.assertIn("Cashier", users)
+        self.assertNotIn("root", users)
+        stock = self.client.get("/admin-dashboard/stock/").json()["html"]
+        self.assertEqual(stock.count("<tr>"), 2)
+
+    def test_rows_require_superuser(self):
+        self.client.force_login(make_user("clerk", role="cashier"))
+        self.assertEqual(self.client.get("/admin-dashboard/users/").status_code, 302)
+
+
+# ======================================================
+# CART LINE UPSERTS
+# ======================================================
+
+class CartUpsertTests(TestCase):
+
+    def setUp(self):
+        product_cache.clear()
+        self.cashier = make_user("till1")
+        self.cart = Cart.objects.create(cashier=self.cashier)
+        self.products = make_products(3)
+        self.client.force_login(self.cashier)
+        session = self.client.session
+        session["current_cart_id"] = self.cart.id
+        session.save()
+
+    def quantities(self):
+        return dict(self.cart.items.values_list("product_id", "quantity"))
+
+    def test_repeated_adds_accumulate(self):
+        p = self.products[0]
+        add_item(self.cart.id, p.id)
+        add_item(self.cart.id, p.id, 4)
+        self.assertEqual(self.quantities(), {p.id: 5})
+
+    def test_add_is_one_statement(self):
+        p = self.products[0]
+        add_item(self.cart.id, p.id)
+        with self.assertNumQueries(1):
+            add_item(self.cart.id, p.id)
+        with self.assertNumQueries(1):
+            add_items(self.cart.id, {q.id: 2 for q in self.products})
+        self.assertEqual(self.quantities(), {
+            self.products[0].id: 4, self.products[1].id: 2, self.products[2].id: 2,
+        })
+
+    def test_portable_fallback(self):
+        p = self.products[0]
+        _increment(self.cart.id, p.id, 2)
+        _increment(self.cart.id, p.id, 3)
+        self.assertEqual(self.quantities(), {p.id: 5})
+
+    def test_add_to_cart_view_with_quantity(self):
+        p = self.products[0]
+        self.client.post("/add-to-cart/", {"product_id": p.id})
+        response = self.client.post("/add-to-cart/", {"product_id": p.id, "quantity": 3})
+        self.assertEqual(response.json()["status"], "success")
+        self.assertEqual(self.quantities(), {p.id: 4})
+        self.assertEqual(response.json()["totals"]["sub_total"], "79.96")
+
+        bad = self.client.post("/add-to-cart/", {"product_id": p.id, "quantity": "0"})
+        self.assertEqual(bad.status_code, 400)
+        for product_id in ({}, {"product_id": ""}, {"product_id": "abc"}):
+            bad = self.client.post("/add-to-cart/", product_id)
+            self.assertEqual(bad.status_code, 400)
+            self.assertEqual(bad.json()["status"], "error")
+
+    def test_plain_scans_default_to_add(self):
+        a, b, _ = self.products
+        scans = [
+            {"product_id": a.id},
+            {"code": b.product_code, "quantity": 2},
+            {"product_id": a.id},
+            {"code": "NOPE"},
+        ]
+        response = self.client.post(
+            "/cart-ops/", json.dumps({"ops": scans}), content_type="application/json"
+        )
+        body = response.json()
+        self.assertEqual(body["status"], "partial")
+        self.assertEqual(body["added"], 4)
+        self.assertEqual(body["missing"], ["NOPE"])
+        self.assertEqual(self.quantities(), {a.id: 2, b.id: 2})
+
+        response = self.client.post("/cart-ops/", "{}", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_ordered_operations_in_one_request(self):
+        a, b, c = self.products
+        CartItem.objects.create(cart=self.cart, product=c, quantity=5)
+        ops = [
+            {"op": "add", "product_id": a.id},
+            {"op": "add", "code": b.product_code, "quantity": 2},
+            {"op": "add", "product_id": a.id},
+            {"op": "set", "product_id": b.id, "quantity": 7},
+            {"op": "add", "product_id": b.id},
+            {"op": "remove", "product_id": c.id},
+        ]
+        response = self.client.post("/cart-ops/", json.dumps({"ops": ops}), content_type="application/json")
+        body = response.json()
+        self.assertEqual(body["status"], "success")
+        self.assertEqual(body["applied"], 6)
+        self.assertEqual(self.quantities(), {a.id: 2, b.id: 8})
+        self.assertEqual(body["totals"]["sub_total"], "199.90")
+
+    def test_bad_operation_changes_nothing(self):
+        a = self.products[0]
+        ops = [{"op": "add", "product_id": a.id}, {"op": "explode", "product_id": a.id}]
+        response = self.client.post("/cart-ops/", json.dumps({"ops": ops}), content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.quantities(), {})
+
+    def test_operations_query_count(self):
+        ops = [{"op": "add", "product_id": p.id} for p in self.products] * 10
+        for p in self.products:
+            product_cache.get(p.id)
+        # session + user, then savepoint / one upsert / release, then totals
+        with self.assertNumQueries(6):
+            self.client.post("/cart-ops/", json.dumps({"ops": ops}), content_type="application/json")
+        self.assertEqual(set(self.quantities().values()), {10})
+
+
+# ======================================================
+# PAYMENT GATEWAY
+# ======================================================
+
+class PaymentGatewayTests(TestCase):
+
+    def setUp(self):
+        self.cashier = make_user("till1")
+        self.cart = Cart.objects.create(cashier=self.cashier)
+        CartItem.objects.create(cart=self.cart, product=make_products(1)[0], quantity=2)
+        self.client.force_login(self.cashier)
+        session = self.client.session
+        session["current_cart_id"] = self.cart.id
+        session.save()
+
+    def tearDown(self):
+        set_gateway(None)
+
+    def test_local_gateway_round_trip(self):
+        set_gateway(LocalGateway())
+        data = self.client.post("/start-payment/").json()
+        self.assertEqual(data["gateway"], "local")
+        self.assertEqual(data["amount"], 4198)
+        simulated = data["simulated"]
+        self.assertEqual(simulated["razorpay_order_id"], data["order_id"])
+
+        response = self.client.post("/generate-invoice/", dict(
+            simulated, customer_phone="9000000001", customer_name="A", payment_method="upi",
+        ))
+        self.assertEqual(response.json()["status"], "success")
+        self.assertEqual(Invoice.objects.get().payment_method, "upi")
+
+    def test_bad_signature_is_rejected(self):
+        gateway = LocalGateway()
+        set_gateway(gateway)
+        with self.assertRaises(VerificationFailed):
+            gateway.verify_payment("order_1", "pay_1", sign("other-secret", "order_1", "pay_1"))
+        response = self.client.post("/generate-invoice/", {
+            "customer_phone": "9000000001", "payment_method": "upi",
+            "razorpay_order_id": "order_1", "razorpay_payment_id": "pay_1", "razorpay_signature": "x",
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Invoice.objects.exists())
+
+    def test_latency_and_failure_injection(self):
+        gateway = LocalGateway(latency=0.05, failure_rate=1.0)
+        start = time.perf_counter()
+        with self.assertRaises(GatewayUnavailable):
+            gateway.create_order(100)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+        self.assertEqual((gateway.orders, gateway.failures), (1, 1))
+
+        set_gateway(LocalGateway(failure_rate=1.0))
+        self.assertEqual(self.client.post("/start-payment/").status_code, 503)
+
+    def test_razorpay_signature_matches_sdk(self):
+        from razorpay import Client
+        gateway = RazorpayGateway("rzp_test_key", "secret")
+        signature = sign("secret", "order_1", "pay_1")
+        self.assertTrue(Client(auth=("rzp_test_key", "secret")).utility.verify_payment_signature({
+            "razorpay_order_id": "order_1", "razorpay_payment_id": "pay_1", "razorpay_signature": signature,
+        }))
+        self.assertEqual(gateway.verify_payment("order_1", "pay_1", signature), "pay_1")
+        with self.assertRaises(VerificationFailed):
+            gateway.verify_payment("order_1", "pay_1", sign("other-secret", "order_1", "pay_1"))
+
+    def test_razorpay_retries_only_connects_and_maps_bad_requests(self):
+        from razorpay.errors import BadRequestError
+        gateway = RazorpayGateway("rzp_test_key", "secret", retries=2)
+        retry = gateway.client.session.get_adapter("https://api.razorpay.com").max_retries
+        self.assertEqual((retry.connect, retry.read, retry.status), (2, 0, 0))
+
+        with mock.patch.object(gateway.client.order, "create", side_effect=BadRequestError("Authentication failed")):
+            with self.assertRaises(GatewayUnavailable):
+                gateway.create_order(100)
+        with mock.patch.object(gateway.client.utility, "verify_payment_signature", side_effect=BadRequestError("bad")):
+            with self.assertRaises(VerificationFailed):
+                gateway.verify_payment("order_1", "pay_1", "x")
+
+
+# ======================================================
+# INVOICE NUMBERS
+# ======================================================
+
+class InvoiceNumberTests(TestCase):
+
+    def setUp(self):
+        invoice_numbers.clear()
+
+    def test_format_and_daily_restart(self):
+        day = date(2025, 1, 31)
+        self.assertEqual(next_invoice_number(day, store="07"), "07-20250131-000001")
+        self.assertEqual(next_invoice_number(day, store="07"), "07-20250131-000002")
+        self.assertEqual(next_invoice_number(date(2025, 2, 1), store="07"), "07-20250201-000001")
+        self.assertEqual(next_invoice_number(day, store="08"), "08-20250131-000001")
+
+    def test_one_query_pair_per_block(self):
+        allocator = BlockAllocator(block_size=10)
+        allocator.next("k")
+        with self.assertNumQueries(0):
+            values = [allocator.next("k") for _ in range(9)]
+        self.assertEqual(values, list(range(2, 11)))
+        allocator.next("k")
+        self.assertEqual(allocator.reservations, 2)
+
+    def test_workers_get_disjoint_blocks(self):
+        # Two processes' allocators sharing one counter row
+        a, b = BlockAllocator(block_size=3), BlockAllocator(block_size=3)
+        seen = [a.next("k"), b.next("k"), a.next("k"), b.next("k"),
+                a.next("k"), a.next("k"), b.next("k"), b.next("k"), b.next("k"), b.next("k")]
+        self.assertEqual(len(set(seen)), len(seen))
+        self.assertEqual(reserve_block("k", 3), 13)
+
+    def test_checkout_uses_sequence(self):
+        cashier = make_user("till1")
+        cart = Cart.objects.create(cashier=cashier)
+        CartItem.objects.create(cart=cart, product=make_products(1)[0])
+        invoice, _ = finalize_invoice(cart, cashier, None, "cash")
+        self.assertRegex(invoice.invoice_number, r"^01-\d{8}-000001$")
+
+
+@skipUnlessDBFeature("test_db_allows_multiple_connections")
+class InvoiceNumberConcurrencyTests(TransactionTestCase):
+
+    def test_threads_never_share_a_number(self):
+        import threading
+        from django.db import connections
+
+        allocators = [BlockAllocator(block_size=7) for _ in range(3)]
+        results = []
+        lock = threading.Lock()
+
+        def worker(allocator):
+            try:
+                numbers = [allocator.next("concurrent") for _ in range(40)]
+                with lock:
+                    results.extend(numbers)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(allocators[i % 3],)) for i in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(results), 240)
+        self.assertEqual(len(set(results)), 240)
+
+
+# ======================================================
+# PRODUCT CODES
+# ======================================================
+
+class ProductCodeTests(TestCase):
+
+    def add(self, name):
+        self.client.post("/add_product/", {
+            "name": name, "category": "grocery", "price": "1.00", "cost_price": "0.50",
+            "stock_quantity": "5", "low_stock_threshold": "1",
+        })
+        return Product.objects.get(product_name=name).product_code
+
+    def test_add_product_codes_are_sequential(self):
+        self.client.force_login(User.objects.create_superuser("root", password="pw"))
+        first = self.add("A")
+        self.assertRegex(first, r"^PRD\d{3,}$")
+        self.assertEqual(int(self.add("B")[3:]), int(first[3:]) + 1)
+
+    def test_taken_codes_are_skipped(self):
+        start = reserve_block("product_code", 1) + 1
+        Product.objects.create(product_name="Manual", product_code=f"PRD{start + 1:03d}",
+                               category="grocery", price=1, stock_quantity=1)
+        codes = allocate_product_codes(3)
+        self.assertEqual(codes, [f"PRD{n:03d}" for n in (start, start + 2, start + 3)])
+
+    def test_import_fills_blank_codes_in_one_reservation(self):
+        rows = [product_row("") for _ in range(5)] + [product_row("KEEP1")]
+        with CaptureQueriesContext(connection) as ctx:
+            report = import_products(rows, batch_size=100)
+        self.assertEqual(report["imported"], 6)
+        codes = set(Product.objects.values_list("product_code", flat=True))
+        self.assertEqual(len(codes), 6)
+        self.assertIn("KEEP1", codes)
+        bumps = [q for q in ctx.captured_queries if "app_numbersequence" in q["sql"] and "UPDATE" in q["sql"]]
+        self.assertEqual(len(bumps), 1)
+
+
+@skipUnlessDBFeature("test_db_allows_multiple_connections")
+class ProductCodeConcurrencyTests(TransactionTestCase):
+
+    def test_many_threads_get_unique_codes(self):
+        import threading
+        from django.db import connections
+
+        codes = []
+        lock = threading.Lock()
+
+        def worker(i):
+            try:
+                for _ in range(10):
+                    got = allocate_product_codes(1 + i % 4)
+                    with lock:
+                        codes.extend(got)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        expected = sum(10 * (1 + i % 4) for i in range(16))
+        self.assertEqual(len(codes), expected)
+        self.assertEqual(len(set(codes)), expected)
+
+
+# ======================================================
+# CUSTOMER LOOKUP
+# ======================================================
+
+class CustomerLookupTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        lookup_cache.clear()
+        for i, phone in enumerate(["9876543210", "+91 98765 00001", "09812345678", "9000012345"]):
+            Customer.objects.create(name=f"C{i}", phone=phone)
+
+    def test_normalize_phone(self):
+        for raw in ("9876543210", "+91-98765-43210", "098765 43210", "00919876543210"):
+            self.assertEqual(normalize_phone(raw), "919876543210")
+        self.assertEqual(normalize_phone("+1 415 555 0100"), "14155550100")
+        self.assertEqual(normalize_phone("9876"), "9876")
+
+    def test_ranked_candidates(self):
+        self.assertEqual([c["name"] for c in find_customers("+91 98765 43210")], ["C0"])
+        self.assertEqual([c["name"] for c in find_customers("98765")], ["C1", "C0"])
+        # last digits
+        self.assertEqual([c["name"] for c in find_customers("2345")], ["C3"])
+        self.assertEqual(find_customers("98"), [])
+
+    def test_lookups_are_cached_until_customers_change(self):
+        find_customers("98765")
+        with self.assertNumQueries(0):
+            find_customers("98765")
+        Customer.objects.create(name="C9", phone="9876599999")
+        self.assertEqual(len(find_customers("98765")), 3)
+
+    def test_checkout_reuses_customer_with_other_formatting(self):
+        customer, created = get_or_create_customer("+91 98765-43210", "Someone")
+        self.assertFalse(created)
+        self.assertEqual(customer.name, "C0")
+        _, created = get_or_create_customer("9111111111", "New")
+        self.assertTrue(created)
+
+    def test_lookup_view(self):
+        self.client.force_login(make_user("till1"))
+        data = self.client.get("/customer-lookup/?phone=9876543210").json()
+        self.assertTrue(data["found"])
+        self.assertTrue(data["exact"])
+        self.assertEqual(data["name"], "C0")
+        data = self.client.get("/customer-lookup/?phone=98765").json()
+        self.assertFalse(data["exact"])
+        self.assertEqual(len(data["candidates"]), 2)
+
+
+# ======================================================
+# REPORT BENCHMARK
+# ======================================================
+
+class ReportBenchmarkTests(TestCase):
+
+    def test_smoke_with_compare(self):
+        out = io.StringIO()
+        call_command(
+            "bench_reports", products=40, customers=10, invoices=30, days=3,
+            repeat=1, compare=True, explain=True, cleanup=True, stdout=out,
+        )
+        output = out.getvalue()
+        self.assertIn("before -> after", output)
+        self.assertNotIn("(HTTP", output)
+        self.assertIn("invoice_payment_created_idx", output)
+        self.assertFalse(Invoice.objects.exists())
+        # The dropped indexes came back with the rollback
+        with connection.cursor() as cursor:
+            names = {c for c in connection.introspection.get_constraints(cursor, "app_invoice")}
+        self.assertIn("invoice_created_idx", names)
+
+    def test_search_bench_cleanup_leaves_report_data_alone(self):
+        call_command(
+            "bench_reports", products=20, customers=5, invoices=10, days=2,
+            repeat=1, stdout=io.StringIO(),
+        )
+        seeded = Product.objects.count()
+        call_command(
+            "bench_product_search", products=30, queries=8, cleanup=True,
+            stdout=io.StringIO(),
+        )
+        self.assertEqual(Product.objects.count(), seeded)
+        self.assertTrue(Invoice.objects.exists())
+
+
+# ======================================================
+# INSTRUMENTATION
+# ======================================================
+
+class InstrumentationTests(TestCase):
+
+    def setUp(self):
+        registry.clear()
+        make_invoices(3, datetime(2025, 1, 15, tzinfo=dt_timezone.utc))
+
+    def test_server_timing_header(self):
+        self.client.force_login(User.objects.create_superuser("ops", password="pw"))
+        response = self.client.get("/admin-dashboard/invoices/")
+        self.assertRegex(response["Server-Timing"], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"$')
+
+    def test_server_timing_is_hidden_from_anonymous_clients(self):
+        self.assertNotIn("Server-Timing", self.client.get("/api/invoices/"))
+        with override_settings(DEBUG=True):
+            self.assertIn("Server-Timing", self.client.get("/api/invoices/"))
+
+    def test_metrics_are_per_route(self):
+        self.client.get("/api/invoices/")
+        self.client.get("/api/invoices/?limit=1")
+        self.client.get("/print-invoice/999999/")
+        with override_settings(METRICS_TOKEN="scrape-me"):
+            body = self.client.get("/metrics/", HTTP_AUTHORIZATION="Bearer scrape-me").content.decode()
+        self.assertIn('http_requests_total{route="/api/invoices/",method="GET"} 2', body)
+        self.assertIn('http_db_queries_total{route="/api/invoices/",method="GET"} 2', body)
+        self.assertIn('route="/print-invoice/<int:invoice_id>/"', body)
+        self.assertIn('http_request_duration_seconds_bucket{route="/api/invoices/",method="GET",le="+Inf"} 2', body)
+
+    def test_unknown_methods_share_one_series(self):
+        for method in ("BREW", 'X"}\nfake 1', "PROPFIND"):
+            self.client.generic(method, "/nowhere/")
+        routes = registry.snapshot()
+        self.assertEqual(set(routes), {("<unmatched>", "OTHER")})
+        self.assertEqual(routes[("<unmatched>", "OTHER")].requests, 3)
+
+    def test_metrics_are_not_public(self):
+        # Behind a proxy every request comes from 127.0.0.1
+        self.assertEqual(self.client.get("/metrics/", REMOTE_ADDR="127.0.0.1").status_code, 403)
+        with override_settings(METRICS_TOKEN="scrape-me"):
+            self.assertEqual(self.client.get("/metrics/", HTTP_AUTHORIZATION="Bearer guess").status_code, 403)
+        with override_settings(METRICS_TOKEN=""):
+            self.assertEqual(self.client.get("/metrics/", HTTP_AUTHORIZATION="Bearer ").status_code, 403)
+        self.client.force_login(User.objects.create_superuser("root", password="pw"))
+        self.assertEqual(self.client.get("/metrics/").status_code, 200)
+
+    @override_settings(SLOW_REQUEST_QUERIES=0)
+    def test_slow_requests_are_logged_with_sql(self):
+        with self.assertLogs("app.slow_requests", level="WARNING") as logs:
+            self.client.get("/api/invoices/")
+        self.assertIn("/api/invoices/", logs.output[0])
+        self.assertIn("app_invoice", logs.output[0])
+
+
+# ======================================================
+# TILL LOAD GENERATOR
+# ======================================================
+
+class LoadgenTillTests(TransactionTestCase):
+    # One till, so the worker thread's connection never competes with
+    # another writer (SQLite)
+
+    def setUp(self):
+        invoice_numbers.clear()
+
+    def test_smoke(self):
+        out = io.StringIO()
+        call_command(
+            "loadgen_till", cashiers=1, sales=4, products=30, hot=3, stock=2, hot_share=0.5,
+            upi_share=0.5, i_know_this_is_not_production=True, stdout=out, stderr=io.StringIO(),
+        )
+        output = out.getvalue()
+        for step in ("login", "product_lookup", "add_to_cart", "checkout_page", "generate_invoice"):
+            self.assertIn(step, output)
+        self.assertIn("integrity: OK", output)
+        self.assertNotIn("first ", output)
+        self.assertFalse(User.objects.get(username="loadgen_till000").check_password("loadgen"))
+
+    def test_refuses_without_debug_or_flag(self):
+        with self.assertRaisesMessage(CommandError, "--i-know-this-is-not-production"):
+            call_command("loadgen_till", cashiers=1, sales=1, stdout=io.StringIO())
+        self.assertFalse(User.objects.filter(username__startswith="loadgen_").exists())
+
+    def test_detects_oversold_stock(self):
+        product = make_products(1)[0]
+        # 5 units were on the shelf, none billed, but only 1 is left
+        Product.objects.filter(id=product.id).update(stock_quantity=1)
+        command = loadgen_till.Command(stdout=io.StringIO())
+        problems = command.check_integrity(loadgen_till.Results(), [], {product.id: 5}, 0)
+        self.assertEqual(len(problems), 1)
+        self.assertIn("5 in stock - 0 sold != 1 left", problems[0])
+
+
+# ======================================================
+# QUERY BUDGETS (every route in app/urls.py)
+# ======================================================
+#
+# Each route is requested once against a seeded data set (thousands of
+# products, customers and invoices) and must stay within its budget:
+#   queries  maximum SQL queries
+#   ms       wall time
+#   kb       peak Python allocations (tracemalloc)
+# A route that goes over fails the suite with a table of
+# budget vs actual and the SQL it ran. Raise a budget only when the extra
+# work is intended; lower it when a change makes a route cheaper.
+
+Budget = namedtuple("Budget", "route role method path data queries ms kb")
+
+BUDGETS = [
+    # route, role, method, path, data, queries, ms, kb
+    Budget("/", None, "GET", "/", None, 0, 500, 512),
+    Budget("/logout/", "cashier", "GET", "/logout/", None, 4, 500, 512),
+    Budget("/admin-dashboard/", "admin", "GET", "/admin-dashboard/", None, 5, 500, 1024),
+    Budget("/admin-dashboard/users/", "admin", "GET", "/admin-dashboard/users/", None, 3, 500, 512),
+    Budget("/admin-dashboard/invoices/", "admin", "GET", "/admin-dashboard/invoices/?status=paid", None, 3, 500, 1024),
+    Budget("/admin-dashboard/stock/", "admin", "GET", "/admin-dashboard/stock/", None, 3, 500, 512),
+    # Renders every product and customer: ~1 s and ~21 MB on the seeded data
+    Budget("/manager-dashboard/", "manager", "GET", "/manager-dashboard/", None, 11, 2000, 32_000),
+    Budget("/cashier-dashboard/", "cashier", "GET", "/cashier-dashboard/", None, 6, 500, 1024),
+    Budget("/add-user/", "admin", "POST", "/add-user/", "user", 6, 2000, 1024),
+    Budget("/edit-user/<int:user_id>/", "admin", "POST", "/edit-user/{cashier}/", "edit_user", 4, 500, 1024),
+    Budget("/delete-user/<int:user_id>/", "admin", "POST", "/delete-user/{spare_user}/", None, 11, 500, 1024),
+    Budget("/add_product/", "admin", "POST", "/add_product/", "product", 6, 500, 1024),
+    Budget("/edit-product/<int:product_id>/", "admin", "POST", "/edit-product/{product}/", "product", 3, 500, 1024),
+    Budget("/delete-product/<int:product_id>/", "admin", "POST", "/delete-product/{product}/", None, 3, 500, 1024),
+    Budget("/filter-products/", "admin", "GET", "/filter-products/?category=grocery", None, 2, 500, 1024),
+    Budget("/manager/product/<int:product_id>/", "manager", "GET", "/manager/product/{product}/", None, 4, 500, 512),
+    Budget("/manager/update-stock/<int:product_id>/", "manager", "POST", "/manager/update-stock/{product}/", "stock", 6, 500, 1024),
+    Budget("/product-lookup/", "cashier", "GET", "/product-lookup/?q=Item 1", None, 6, 500, 512),
+    Budget("/add-to-cart/", "cashier", "POST", "/add-to-cart/", "scan", 5, 500, 512),
+    Budget("/cart-ops/", "cashier", "JSON", "/cart-ops/", "ops", 8, 500, 512),
+    Budget("/remove-from-cart/", "cashier", "POST", "/remove-from-cart/", "scan", 5, 500, 512),
+    Budget("/update-qty/", "cashier", "POST", "/update-qty/", "qty", 4, 500, 512),
+    Budget("/generate-invoice/", "cashier", "POST", "/generate-invoice/", "pay", 32, 1000, 1024),
+    Budget("/create-cart/", "cashier", "POST", "/create-cart/", None, 7, 500, 1024),
+    Budget("/switch-cart/<int:cart_id>/", "cashier", "POST", "/switch-cart/{spare_cart}/", None, 5, 500, 1024),
+    Budget("/remove-cart/<int:cart_id>/", "cashier", "POST", "/remove-cart/{spare_cart}/", None, 5, 500, 512),
+    Budget("/checkout/", "cashier", "GET", "/checkout/", None, 5, 500, 1024),
+    Budget("/customer-lookup/", "cashier", "GET", "/customer-lookup/?phone=98765", None, 3, 500, 512),
+    Budget("/delete-customer/<int:customer_id>/", "manager", "POST", "/delete-customer/{customer}/", None, 7, 500, 1024),
+    Budget("/sales-report/", "manager", "GET", "/sales-report/", None, 4, 500, 512),
+    Budget("/api/dashboard/", None, "GET", "/api/dashboard/", None, 6, 500, 512),
+    Budget("/api/products/", None, "GET", "/api/products/?category=grocery", None, 1, 500, 512),
+    Budget("/api/category-revenue/", None, "GET", "/api/category-revenue/", None, 1, 500, 512),
+    Budget("/api/cashier-performance/", None, "GET", "/api/cashier-performance/", None, 1, 500, 512),
+    Budget("/api/top-products/", None, "GET", "/api/top-products/", None, 1, 500, 512),
+    Budget("/api/invoices/", None, "GET", "/api/invoices/?payment_method=upi", None, 1, 500, 512),
+    Budget("/api/report/profit/", None, "GET", "/api/report/profit/", None, 1, 500, 6000),
+    Budget("/api/report/margin/", None, "GET", "/api/report/margin/", None, 1, 500, 4000),
+    Budget("/api/report/sales/", None, "GET", "/api/report/sales/", None, 1, 500, 3000),
+    Budget("/api/report/stock/", None, "GET", "/api/report/stock/", None, 1, 500, 6000),
+    Budget("/api/report/manufacturer/", None, "GET", "/api/report/manufacturer/", None, 1, 500, 512),
+    Budget("/start-payment/", "cashier", "POST", "/start-payment/", None, 3, 500, 512),
+    Budget("/upload-products/", "admin", "POST", "/upload-products/", "upload", 5, 1000, 1536),
+    Budget("/print-invoice/<int:invoice_id>/", "cashier", "GET", "/print-invoice/{invoice}/", None, 4, 2000, 2048),
+    Budget("/metrics/", "admin", "GET", "/metrics/", None, 2, 500, 1024),
+]
+
+
+@override_settings(SLOW_REQUEST_MS=10 ** 9, SLOW_REQUEST_QUERIES=10 ** 9)
+class QueryBudgetTests(TestCase):
+
+    PRODUCTS = 3000
+    CUSTOMERS = 2000
+    INVOICES = 1500
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("root", password="pw")
+        cls.manager = make_user("boss", role="manager")
+        cls.cashier = make_user("till1", role="cashier")
+        spare_user = make_user("spare", role="cashier")
+
+        products = make_products(cls.PRODUCTS)
+        phones = [f"98765{i:05d}" for i in range(cls.CUSTOMERS)]
+        customers = Customer.objects.bulk_create([
+            Customer(name=f"C{i}", phone=phone, phone_normalized=normalize_phone(phone),
+                     phone_reversed=normalize_phone(phone)[::-1])
+            for i, phone in enumerate(phones)
+        ])
+
+        invoices = []
+        for day in range(30):
+            batch = make_invoices(cls.INVOICES // 30, datetime(2025, 1, day + 1, tzinfo=dt_timezone.utc), cls.cashier)
+            invoices += batch
+        InvoiceItem.objects.bulk_create([
+            InvoiceItem(invoice=inv, product=product, product_name=product.product_name,
+                        price_at_sale=product.price, quantity=k + 1)
+            for inv in invoices for k in range(3)
+            for product in [products[(inv.id * 7 + k) % len(products)]]
+        ])
+        rebuild_rollup()
+
+        cls.cart = Cart.objects.create(cashier=cls.cashier, cart_number=1)
+        CartItem.objects.bulk_create([CartItem(cart=cls.cart, product=p, quantity=2) for p in products[:25]])
+        spare_cart = Cart.objects.create(cashier=cls.cashier, cart_number=2)
+
+        cls.ids = {
+            "product": products[0].id,
+            "cashier": cls.cashier.id,
+            "spare_user": spare_user.id,
+            "spare_cart": spare_cart.id,
+            "customer": customers[-1].id,
+            "invoice": invoices[0].id,
+        }
+
+    def payload(self, name):
+        product = Product.objects.get(id=self.ids["product"])
+        scan = {"product_id": product.id}
+        rows = [product_row(f"UP{i}") for i in range(200)]
+        return {
+            None: {},
+            "user": {"username": "new", "email": "new@example.com", "password": "pw",
+                     "role": "cashier", "status": "active", "full_name": "New"},
+            "edit_user": {"username": "till1", "email": "t@example.com", "role": "cashier", "status": "active"},
+            "product": {"name": "Budget item", "category": "grocery", "price": "9.99", "cost_price": "5.00",
+                        "stock_quantity": "10", "low_stock_threshold": "2", "description": ""},
+            "stock": {"stock_quantity": "77"},
+            "scan": scan,
+            "qty": dict(scan, qty=5),
+            "ops": {"ops": [dict(scan, op="add")] * 40 + [dict(scan, op="set", quantity=3)]},
+            "pay": {"customer_phone": "9876500001", "customer_name": "C1", "payment_method": "cash"},
+            "upload": {"json_file": SimpleUploadedFile("feed.json", json.dumps(rows).encode())},
+        }[name]
+
+    def request(self, budget):
+        client = Client()
+        user = {"admin": self.admin, "manager": self.manager, "cashier": self.cashier}.get(budget.role)
+        if user:
+            client.force_login(user)
+            session = client.session
+            session["current_cart_id"] = self.cart.id
+            session.save()
+
+        path = budget.path.format(**self.ids)
+        data = self.payload(budget.data)
+        if budget.method == "GET":
+            return lambda: client.get(path)
+        if budget.method == "JSON":
+            return lambda: client.post(path, json.dumps(data), content_type="application/json")
+        return lambda: client.post(path, data)
+
+    def measure(self, budget, trace_memory=False):
+        # Runs in a savepoint that is rolled back, so every route sees the
+        # same data, and with cold caches.
+        with transaction.atomic():
+            cache.clear()
+            product_cache.clear()
+            pdf_cache.clear()
+            lookup_cache.clear()
+            send = self.request(budget)
+
+            if trace_memory:
+                tracemalloc.start()
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                response = send()
+                if response.streaming:
+                    b"".join(response.streaming_content)
+                elapsed_ms = (time.perf_counter() - start) * 1000
+            peak_kb = 0
+            if trace_memory:
+                peak_kb = tracemalloc.get_traced_memory()[1] // 1024
+                tracemalloc.stop()
+            transaction.set_rollback(True)
+
+        return response, ctx.captured_queries, elapsed_ms, peak_kb
+
+    def test_every_route_has_a_budget(self):
+        from .urls import urlpatterns
+        routes = {"/" + str(p.pattern) for p in urlpatterns}
+        self.assertEqual(routes - {b.route for b in BUDGETS}, set(), "Add a Budget for new routes")
+        self.assertEqual({b.route for b in BUDGETS} - routes, set(), "Remove budgets of deleted routes")
+
+    def test_budgets(self):
+        set_gateway(LocalGateway())
+        self.addCleanup(set_gateway, None)
+
+        over = []
+        for budget in BUDGETS:
+            # tracemalloc slows everything down, so time and memory are
+            # measured in separate runs
+            response, queries, ms, _ = self.measure(budget)
+            kb = self.measure(budget, trace_memory=True)[3]
+            self.assertLess(response.status_code, 500, f"{budget.route} returned {response.status_code}")
+            if len(queries) > budget.queries or ms > budget.ms or kb > budget.kb:
+                over.append((budget, queries, ms, kb))
+
+        if over:
+            lines = [f"{len(over)} route(s) over budget:", "",
+                     f"{'route':<42} {'queries':>15} {'ms':>15} {'kb':>17}"]
+            for budget, queries, ms, kb in over:
+                lines.append(
+                    f"{budget.route:<42} "
+                    f"{len(queries):>5} / {budget.queries:<7} "
+                    f"{ms:>6.0f} / {budget.ms:<6} "
+                    f"{kb:>7} / {budget.kb:<7}"
+                )
+            for budget, queries, _, _ in over:
+                if len(queries) > budget.queries:
+                    lines += ["", f"SQL for {budget.route}:"]
+                    lines += [f"  {q['sql'][:200]}" for q in queries]
+            self.fail("\n".join(lines))
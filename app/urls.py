@@ -5,6 +5,9 @@ urlpatterns = [
     path('', views.user_login, name='login'),
     path('logout/', views.user_logout, name='logout'),
     path('admin-dashboard/', views.admin_dashboard, name='admin_dashboard'),
+    path('admin-dashboard/users/', views.admin_users_rows, name='admin_users_rows'),
+    path('admin-dashboard/invoices/', views.admin_invoice_rows, name='admin_invoice_rows'),
+    path('admin-dashboard/stock/', views.admin_stock_rows, name='admin_stock_rows'),
     path('manager-dashboard/', views.manager_dashboard, name='manager_dashboard'),
     path('cashier-dashboard/', views.cashier_dashboard, name='cashier_dashboard'),
     path('add-user/', views.add_user, name='add_user'),
@@ -18,6 +21,7 @@ urlpatterns = [
     path('manager/update-stock/<int:product_id>/', views.update_stock, name='update_stock'),
     path("product-lookup/",views.product_lookup, name="product_lookup"),
     path("add-to-cart/", views.add_to_cart, name="add_to_cart"),
+    path("cart-ops/", views.cart_operations, name="cart_operations"),
     path("remove-from-cart/", views.remove_from_cart, name="remove_from_cart"),
     path("update-qty/", views.update_quantity, name="update_quantity"),
     path("generate-invoice/", views.generate_invoice, name="generate_invoice"),
@@ -42,6 +46,7 @@ urlpatterns = [
     path('start-payment/', views.start_payment, name='start_payment'),
     path('upload-products/', views.upload_products, name='upload_products'),
     path('print-invoice/<int:invoice_id>/', views.print_invoice_pdf, name='print_invoice_pdf'),
+    path('metrics/', views.metrics, name='metrics'),
 
 
 
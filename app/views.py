@@ -1,7 +1,7 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required,user_passes_test
-from .models import Profile,Product, Cart, CartItem, Customer, Invoice, InvoiceItem
+from .models import Profile,Product, Cart, CartItem, Customer, Invoice, SalesRollup, ProductSales, normalize_phone
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
 from django.contrib import messages
@@ -10,13 +10,29 @@ from django.http import HttpResponse
 from django.template.loader import render_to_string
 from django.db import models
 from .invoice_pdf import generate_invoice_pdf
+from .checkout import finalize_invoice, CheckoutError, EmptyCart
+from .search import search_products
+from .catalog import product_cache, current_version
+from .sequences import next_product_code
+from .instrumentation import registry as metrics_registry
+from .customers import find_customers, get_or_create_customer
+from .payments import get_gateway, GatewayUnavailable, VerificationFailed
+from .carts import add_item, set_quantity, parse_units, InvalidQuantity, BadCartOperation, build_operations, apply_operations
+from django.core.cache import cache
+from django.db.models import Case, When, Value
+from django.db.models.functions import Round
+from .pagination import keyset_page, page_size, date_range
+from .exports import stream_ndjson, export_response
+from .importer import import_products, iter_rows as iter_import_rows
+from django.core.exceptions import ValidationError
 from django.db.models import Sum,F
 from django.db.models import Q
-import razorpay
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
-from decimal import Decimal
-import uuid
+import hmac
+
+PRODUCT_ROWS_CACHE_TIMEOUT = 600
+ADMIN_STATS_CACHE_TIMEOUT = 60
 
 @csrf_exempt
 def user_login(request):
@@ -49,50 +65,51 @@ def superuser_required(view_func):
     decorated_view_func = user_passes_test(lambda u: u.is_superuser)(view_func)
     return decorated_view_func
 
-@superuser_required
-def admin_dashboard(request):
-    users = User.objects.filter(is_superuser=False).order_by('-date_joined')
-    products = Product.objects.all().order_by('-created_at')
-    categories = Product.CATEGORY_CHOICES  
-    invoices = Invoice.objects.all().order_by('-created_at')
-    low_stock_products = Product.objects.filter(
-    stock_quantity__lte=models.F("low_stock_threshold")
-).count()
-
-    # DASHBOARD STATS
-    total_users = Customer.objects.count()
-    total_products = products.count()
-    total_invoices = invoices.count()
+def admin_stats():
+    # Headline numbers for the admin dashboard: a fixed handful of
+    # queries, cached briefly so page loads don't repeat them.
+    stats = cache.get("admin_stats")
+    if stats is None:
+        product_stats = Product.objects.aggregate(
+            total=Count("id"),
+            low=Count("id", filter=Q(stock_quantity__lte=F("low_stock_threshold"))),
+        )
+        invoice_stats = invoice_totals().aggregate(
+            total=Sum("grand_total"), count=Sum("invoice_count")
+        )
+        stats = {
+            'total_users': Customer.objects.count(),
+            'total_products': product_stats['total'],
+            'low_stock_products': product_stats['low'],
+            'total_invoices': invoice_stats['count'] or 0,
+            'total_revenue': invoice_stats['total'] or 0,
+        }
+        cache.set("admin_stats", stats, timeout=ADMIN_STATS_CACHE_TIMEOUT)
+    return stats
 
-   
-    total_revenue = invoices.aggregate(total=Sum('grand_total'))['total'] or 0
 
+@superuser_required
+def admin_dashboard(request):
+    # Tables (users, products, invoices, stock) are loaded lazily, one
+    # page at a time, from the admin_*_rows endpoints; the page itself
+    # only needs the cached stats.
     context = {
-        'users': users,
-        'products': products,
-        'categories': categories,
-        'invoices': invoices,
-
-        # Stats for dashboard
-        'total_users': total_users,
-        'total_products': total_products,
-        'total_invoices': total_invoices,
-        'total_revenue': total_revenue,
-        'low_stock_products': low_stock_products,
+        'categories': Product.CATEGORY_CHOICES,
+        **admin_stats(),
     }
 
     return render(request, 'admin_dashboard.html', context)
 
 
 from django.db.models.functions import TruncWeek, TruncMonth
-from datetime import datetime, timedelta
+from datetime import datetime
 import json
 
 from django.db.models import Sum, F
-from django.utils.timezone import now
+from django.utils.timezone import localdate
+from django.db.models import Count
+from .reports import weekly_series, monthly_series, daily_series, invoice_totals
 from django.db.models.functions import TruncMonth
-from datetime import timedelta
-import calendar
 import json
 
 @login_required
@@ -104,62 +121,30 @@ def manager_dashboard(request):
 
     # ===== BASIC DASHBOARD DATA =====
     products = Product.objects.all().order_by('category', 'product_name')
-    invoices = Invoice.objects.order_by('-created_at')[:5]
-    low_stock_products = Product.objects.filter(stock_quantity__lte=F('low_stock_threshold')).count()
+    invoices = Invoice.objects.select_related('customer').order_by('-created_at')[:5]
 
     customers = Customer.objects.annotate(
         total_spent=Sum('invoice__grand_total')
     ).order_by('-total_spent')
 
-    total_sales = Invoice.objects.aggregate(total=Sum('grand_total'))['total'] or 0
-    total_invoices = Invoice.objects.count()
+    invoice_stats = invoice_totals().aggregate(total=Sum('grand_total'), count=Sum('invoice_count'))
+    total_sales = invoice_stats['total'] or 0
+    total_invoices = invoice_stats['count'] or 0
     total_customers = Customer.objects.count()
-    items_in_stock = Product.objects.aggregate(total=Sum('stock_quantity'))['total'] or 0
+
+    stock_stats = Product.objects.aggregate(
+        items=Sum('stock_quantity'),
+        low=Count('id', filter=Q(stock_quantity__lte=F('low_stock_threshold'))),
+    )
+    items_in_stock = stock_stats['items'] or 0
+    low_stock_products = stock_stats['low']
 
     # ===== CHART DATA =====
-    today = now().date()
-
-    # ---- WEEKLY SALES (LAST 7 DAYS) ----
-    weekly_labels = []
-    weekly_data = []
-    for i in range(7):
-        day = today - timedelta(days=6 - i)
-        total = Invoice.objects.filter(created_at__date=day).aggregate(
-            Sum("grand_total")
-        )["grand_total__sum"] or 0
-
-        weekly_labels.append(day.strftime("%a"))  # Mon, Tue
-        weekly_data.append(float(total))
-
-    # ---- MONTHLY SALES (Jan–Dec current year) ----
-    monthly_labels = []
-    monthly_data = []
-    year = today.year
-
-    for month in range(1, 13):
-        total = Invoice.objects.filter(
-            created_at__year=year,
-            created_at__month=month
-        ).aggregate(Sum("grand_total"))["grand_total__sum"] or 0
-
-        monthly_labels.append(calendar.month_abbr[month])  # Jan, Feb, Mar
-        monthly_data.append(float(total))
-
-    # ---- 6 MONTH SALES ----
-    six_month_labels = []
-    six_month_data = []
-    for i in range(6):
-        date_point = today.replace(day=1) - timedelta(days=30 * (5 - i))
-        year_val = date_point.year
-        month_val = date_point.month
-
-        total = Invoice.objects.filter(
-            created_at__year=year_val,
-            created_at__month=month_val,
-        ).aggregate(Sum("grand_total"))["grand_total__sum"] or 0
-
-        six_month_labels.append(f"{calendar.month_abbr[month_val]} {year_val}")
-        six_month_data.append(float(total))
+    # Grouped queries, zero-filled in Python (see reports.py)
+    today = localdate()
+
+    weekly_labels, weekly_data = weekly_series(today)
+    monthly_labels, monthly_data, six_month_labels, six_month_data = monthly_series(today)
 
     # ===== CONTEXT =====
     context = {
@@ -219,7 +204,7 @@ def cashier_dashboard(request):
     current_cart_id = request.session["current_cart_id"]
     cart = Cart.objects.get(id=current_cart_id)
 
-    cart_items = cart.items.all()
+    cart_items = cart.items.select_related('product')
 
     # Load ALL active carts (for multi-tab display)
     active_carts = Cart.objects.filter(
@@ -340,15 +325,6 @@ def delete_user(request, user_id):
     messages.success(request, f'User "{username}" deleted successfully!')
     return redirect('admin_dashboard')
 
-def generate_product_code():
-    last_product = Product.objects.order_by('id').last()
-    if not last_product:
-        return "PRD001"
-    product_id = last_product.id + 1
-    return f"PRD{product_id:03d}"
-
-
-
 def add_product(request):
     if request.method == 'POST':
         product_name = request.POST.get('name')
@@ -360,7 +336,8 @@ def add_product(request):
         low_stock_threshold = request.POST.get('low_stock_threshold')
         description = request.POST.get('description', '')
 
-        product_code = generate_product_code()
+        # Sequence-backed, safe when two admins add products at once
+        product_code = next_product_code()
 
         Product.objects.create(
             product_name=product_name,
@@ -412,54 +389,177 @@ def delete_product(request, product_id):
     return redirect('admin_dashboard')
 
 
+PRODUCT_ROW_FIELDS = (
+    "id", "product_name", "product_code", "price", "status", "category_label", "created_at",
+)
+STOCK_ROW_FIELDS = (
+    "id", "product_name", "category_label", "stock_quantity", "low_stock_threshold", "created_at",
+)
+ADMIN_TABLE_PAGE_SIZE = 50
+
+
+def with_category_label(products):
+    # get_category_display() for values() querysets, computed in SQL
+    return products.annotate(category_label=Case(
+        *[When(category=value, then=Value(label)) for value, label in Product.CATEGORY_CHOICES],
+        default=F("category"),
+        output_field=models.CharField(),
+    ))
+
+
+def rows_page(queryset, fields, template, cursor=None, order_field="created_at"):
+    page = keyset_page(queryset, fields, cursor, ADMIN_TABLE_PAGE_SIZE, order_field)
+    return {
+        "html": render_to_string(template, {"rows": page["results"]}),
+        "next": page["next"],
+    }
+
+
+def product_rows_page(category="", cursor=None):
+    # Renders only the products table rows (product_rows.html). The page
+    # of rows is cached per category/page until a product is saved (see
+    # catalog.py); stock is left out of the cached copy and re-read by id
+    # on every request. Keying the page on the stock version instead would
+    # throw away every cached page on every sale, and with the default
+    # per-process cache other workers would show old stock until the
+    # timeout. Names and prices can still lag by up to
+    # PRODUCT_ROWS_CACHE_TIMEOUT in other workers unless CACHES points at
+    # a shared backend.
+    key = f"product_rows:{current_version()}:{category}:{cursor or ''}"
+    page = cache.get(key)
+    if page is None:
+        products = Product.objects.all()
+        if category:
+            products = products.filter(category=category)
+
+        page = keyset_page(with_category_label(products), PRODUCT_ROW_FIELDS, cursor, ADMIN_TABLE_PAGE_SIZE)
+        cache.set(key, page, timeout=PRODUCT_ROWS_CACHE_TIMEOUT)
+
+    ids = [row["id"] for row in page["results"]]
+    stock = dict(Product.objects.filter(id__in=ids).values_list("id", "stock_quantity")) if ids else {}
+    # Rows missing here were deleted since the page was cached
+    rows = [{**row, "stock_quantity": stock[row["id"]]} for row in page["results"] if row["id"] in stock]
+    return {
+        "html": render_to_string("product_rows.html", {"rows": rows}),
+        "next": page["next"],
+    }
+
+
 def filter_products(request):
     category = request.GET.get('category', '')
-    if category:
-        products = Product.objects.filter(category=category)
-    else:
-        products = Product.objects.all()
+    if category not in dict(Product.CATEGORY_CHOICES):
+        category = ''
+    try:
+        return JsonResponse(product_rows_page(category, request.GET.get('cursor')))
+    except ValidationError as e:
+        return JsonResponse({"error": e.messages[0]}, status=400)
 
-    # Directly render the same part of admin_dashboard
-    html = render_to_string(
-        'admin_dashboard.html',
-        {'products': products},
-        request=request
+
+@superuser_required
+def admin_users_rows(request):
+    users = User.objects.filter(is_superuser=False)
+    fields = ("id", "username", "email", "profile__role", "profile__status", "date_joined")
+    try:
+        return JsonResponse(rows_page(users, fields, "user_rows.html", request.GET.get("cursor"), "date_joined"))
+    except ValidationError as e:
+        return JsonResponse({"error": e.messages[0]}, status=400)
+
+
+@superuser_required
+def admin_invoice_rows(request):
+    invoices = Invoice.objects.all()
+    fields = (
+        "id", "invoice_number", "customer__name", "grand_total",
+        "payment_method", "status", "created_at",
     )
+    try:
+        invoices = date_range(request, invoices)
+        if request.GET.get("status"):
+            invoices = invoices.filter(status=request.GET["status"])
+        return JsonResponse(rows_page(invoices, fields, "invoice_rows.html", request.GET.get("cursor")))
+    except ValidationError as e:
+        return JsonResponse({"error": e.messages[0]}, status=400)
 
-    # Extract only the tbody content (optional but cleaner)
-    start = html.find('<tbody id="productsTableBody">')
-    end = html.find('</tbody>', start)
-    rows_html = html[start + len('<tbody id="productsTableBody">'):end]
 
-    return JsonResponse({'html': rows_html})
+@superuser_required
+def admin_stock_rows(request):
+    products = with_category_label(Product.objects.all())
+    try:
+        return JsonResponse(rows_page(products, STOCK_ROW_FIELDS, "stock_rows.html", request.GET.get("cursor")))
+    except ValidationError as e:
+        return JsonResponse({"error": e.messages[0]}, status=400)
 
 def dashboard_data(request):
     total_users = Customer.objects.count()
     total_products = Product.objects.count()
-    total_invoices = Invoice.objects.count()
 
-    total_revenue = Invoice.objects.aggregate(
-        total=Sum("grand_total")
-    )["total"] or 0
+    # Read from the sales rollup instead of scanning every invoice
+    invoice_stats = invoice_totals().aggregate(
+        total=Sum("grand_total"), count=Sum("invoice_count")
+    )
+    total_invoices = invoice_stats["count"] or 0
+    total_revenue = invoice_stats["total"] or 0
+
+    # Chart data as grouped aggregates, so the page never downloads the
+    # catalog or the invoice list
+    day_labels, day_revenue = daily_series(localdate())
+    categories = Product.objects.values("category").annotate(count=Count("id")).order_by("category")
+    payments = (
+        invoice_totals()
+        .values("payment_method")
+        .annotate(count=Sum("invoice_count"))
+        .order_by("payment_method")
+    )
 
     return JsonResponse({
         "totalUsers": total_users,
         "totalProducts": total_products,
         "totalInvoices": total_invoices,
-        "totalRevenue": float(total_revenue)
+        "totalRevenue": float(total_revenue),
+        "dailyRevenue": {"labels": day_labels, "data": day_revenue},
+        "productsByCategory": {row["category"]: row["count"] for row in categories},
+        "paymentMethods": {row["payment_method"]: row["count"] for row in payments},
     })
 
 def invoices_data(request):
-    invoices = Invoice.objects.values(
-        "id", "grand_total", "payment_method", "created_at"
-    )
-    return JsonResponse(list(invoices), safe=False)
+    # Keyset-paginated: ?cursor=&limit=&from=&to=&payment_method=
+    # Add ?format=ndjson to stream every matching row instead.
+    invoices = Invoice.objects.all()
+    fields = ("id", "grand_total", "payment_method", "created_at")
+
+    try:
+        invoices = date_range(request, invoices)
+        if request.GET.get("payment_method"):
+            invoices = invoices.filter(payment_method=request.GET["payment_method"])
+
+        if request.GET.get("format") == "ndjson":
+            return stream_ndjson(invoices.order_by("-created_at", "-id").values(*fields), "invoices")
+
+        page = keyset_page(invoices, fields, request.GET.get("cursor"), page_size(request))
+    except ValidationError as e:
+        return JsonResponse({"error": e.messages[0]}, status=400)
+
+    return JsonResponse(page)
 
 def products_data(request):
-    products = Product.objects.values(
-        "id", "product_name", "category", "stock_quantity"
-    )
-    return JsonResponse(list(products), safe=False)
+    # Keyset-paginated: ?cursor=&limit=&from=&to=&category=
+    # Add ?format=ndjson to stream every matching row instead.
+    products = Product.objects.all()
+    fields = ("id", "product_name", "category", "stock_quantity", "created_at")
+
+    try:
+        products = date_range(request, products)
+        if request.GET.get("category"):
+            products = products.filter(category=request.GET["category"])
+
+        if request.GET.get("format") == "ndjson":
+            return stream_ndjson(products.order_by("-created_at", "-id").values(*fields), "products")
+
+        page = keyset_page(products, fields, request.GET.get("cursor"), page_size(request))
+    except ValidationError as e:
+        return JsonResponse({"error": e.messages[0]}, status=400)
+
+    return JsonResponse(page)
 
 @login_required
 def view_product_details(request, product_id):
@@ -494,18 +594,15 @@ def product_lookup(request):
     if len(query) < 2:
         return JsonResponse({"products": []})
 
-    products = Product.objects.filter(
-        Q(product_name__icontains=query) |
-        Q(product_code__icontains=query),
-        status="active"
-    )[:10]
+    # Exact code first, then prefix matches, then fuzzy (see search.py)
+    products = search_products(query)
 
     data = [
         {
-            "id": p.id,
-            "name": p.product_name,
-            "price": str(p.price),
-            "sku": p.product_code,
+            "id": p["id"],
+            "name": p["product_name"],
+            "price": str(p["price"]),
+            "sku": p["product_code"],
         }
         for p in products
     ]
@@ -515,28 +612,57 @@ def product_lookup(request):
 @login_required
 def add_to_cart(request):
     if request.method == "POST":
-        product_id = request.POST.get("product_id")
-        product = Product.objects.get(id=product_id)
-
-        cart_id = request.session["current_cart_id"]
-        cart = Cart.objects.get(id=cart_id)
-
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product
-        )
+        try:
+            product_id = int(request.POST.get("product_id", ""))
+        except ValueError:
+            return JsonResponse({"status": "error", "message": "product_id must be a whole number."}, status=400)
+        product = product_cache.get(product_id)
+        if product is None:
+            return JsonResponse({"status": "error", "message": "Product not found"}, status=404)
 
-        if not created:
-            cart_item.quantity += 1
+        try:
+            units = parse_units(request.POST.get("quantity"))
+        except InvalidQuantity as e:
+            return JsonResponse({"status": "error", "message": str(e)}, status=400)
 
-        cart_item.save()
+        # One INSERT ... ON CONFLICT, safe against concurrent scans
+        cart = Cart(id=request.session["current_cart_id"])
+        add_item(cart.id, product.id, units)
 
         return JsonResponse({
             "status": "success",
             "message": "Product added",
             "totals": cart.get_totals
         })
-client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
+
+
+@login_required
+def cart_operations(request):
+    # Body: {"ops": [{"op": "add", "product_id": 12},
+    #                {"op": "add", "code": "8901234", "quantity": 3},
+    #                {"op": "set", "product_id": 7, "quantity": 2},
+    #                {"op": "remove", "product_id": 9}, ...]}
+    # Applied in order in one transaction; totals are computed once.
+    # "op" defaults to "add", so a plain list of scans works too.
+    if request.method != "POST":
+        return JsonResponse({"status": "error", "message": "POST required"}, status=405)
+    try:
+        ops, missing = build_operations(json.loads(request.body)["ops"])
+    except (ValueError, KeyError, TypeError) as e:
+        message = str(e) if isinstance(e, BadCartOperation) else 'Expected {"ops": [...]}'
+        return JsonResponse({"status": "error", "message": message}, status=400)
+
+    cart = Cart(id=request.session["current_cart_id"])
+    apply_operations(cart.id, ops)
+
+    return JsonResponse({
+        "status": "success" if not missing else "partial",
+        "applied": len(ops),
+        "added": sum(units for kind, _, units in ops if kind == "add"),
+        "missing": missing,
+        "totals": cart.get_totals
+    })
+
 
 # 1. NEW VIEW: Start Payment (Creates Order ID)
 def start_payment(request):
@@ -544,24 +670,25 @@ def start_payment(request):
         cart_id = request.session.get("current_cart_id")
         cart = get_object_or_404(Cart, id=cart_id)
         
-        # Razorpay expects amount in PAISE (Rupees * 100)
+        # Gateways expect amount in PAISE (Rupees * 100)
         amount_in_paise = int(cart.get_totals['grand_total'] * 100)
         
-        # Create Order
-        data = { 
-            "amount": amount_in_paise, 
-            "currency": "INR", 
-            "payment_capture": "1" 
-        }
-        order = client.order.create(data=data)
+        # Create Order (bounded by PAYMENT_GATEWAY_TIMEOUT, see payments.py)
+        gateway = get_gateway()
+        try:
+            order_id = gateway.create_order(amount_in_paise, receipt=f"cart-{cart.id}")
+        except GatewayUnavailable:
+            return JsonResponse({"error": "Payment gateway unavailable, try again or take cash."}, status=503)
         
         return JsonResponse({
-            "order_id": order['id'],
+            "order_id": order_id,
             "amount": amount_in_paise,
-            "key": settings.RAZORPAY_KEY_ID,
+            "key": gateway.key_id,
+            "gateway": gateway.name,
             "name": "Supermarket POS",
             "description": f"Bill #{cart.cart_number}",
-            "prefill_contact": "9999999999"
+            "prefill_contact": "9999999999",
+            **gateway.checkout_options(order_id),
         })
 @login_required
 def remove_from_cart(request):
@@ -583,12 +710,8 @@ def update_quantity(request):
     product_id = request.POST.get("product_id")
     qty = int(request.POST.get("qty", 1))
 
-    cart_id = request.session["current_cart_id"]
-    cart = Cart.objects.get(id=cart_id)
-
-    item = CartItem.objects.get(cart=cart, product_id=product_id)
-    item.quantity = qty
-    item.save()
+    cart = Cart(id=request.session["current_cart_id"])
+    set_quantity(cart.id, product_id, qty)
 
     return JsonResponse({
         "status": "success",
@@ -608,43 +731,25 @@ def generate_invoice(request):
     # ---------------------------------------------------------
     # 2. RAZORPAY VERIFICATION (Only if UPI/Online is selected)
     # ---------------------------------------------------------
-    transaction_id = "" # Default empty for Cash/Card
-    
     if payment_method == 'upi':
         razorpay_payment_id = request.POST.get('razorpay_payment_id')
         razorpay_order_id = request.POST.get('razorpay_order_id')
         razorpay_signature = request.POST.get('razorpay_signature')
 
-        # Prepare dictionary for verification
-        params_dict = {
-            'razorpay_order_id': razorpay_order_id,
-            'razorpay_payment_id': razorpay_payment_id,
-            'razorpay_signature': razorpay_signature
-        }
-
         try:
             # Verify the signature
-            client.utility.verify_payment_signature(params_dict)
-            
-            # If we reach here, payment is successful
-            transaction_id = razorpay_payment_id
-            print(f"Payment Verified: {transaction_id}")
-            
-        except razorpay.errors.SignatureVerificationError:
+            get_gateway().verify_payment(
+                razorpay_order_id, razorpay_payment_id, razorpay_signature
+            )
+        except VerificationFailed:
             # Security Breach: Signature didn't match
             return HttpResponse("Payment Verification Failed! Do not release goods.", status=400)
-        except Exception as e:
-            print(e)
-            return HttpResponse("Error verifying payment", status=400)
 
     # ---------------------------------------------------------
     # 3. CUSTOMER & CART LOGIC (Existing Logic)
     # ---------------------------------------------------------
     
-    customer, created = Customer.objects.get_or_create(
-        phone=customer_phone,
-        defaults={"name": customer_name or "Guest"}
-    )
+    customer, created = get_or_create_customer(customer_phone, customer_name)
 
     cart_id = request.session.get("current_cart_id")
     # Safety check if session expired or cart missing
@@ -652,52 +757,22 @@ def generate_invoice(request):
         return redirect("cashier_dashboard")
         
     cart = get_object_or_404(Cart, id=cart_id)
-    cart_items = cart.items.all()
-
-    if not cart_items:
-        messages.error(request, "Cart is empty.")
-        return redirect("cashier_dashboard")
-
-    # 4. STOCK CHECK
-    for item in cart_items:
-        if item.quantity > item.product.stock_quantity:
-            messages.error(request, f"Not enough stock for {item.product.product_name}")
-            return redirect("checkout")
-
-    totals = cart.get_totals
-
-    # 5. CREATE INVOICE
-    invoice = Invoice.objects.create(
-        invoice_number=str(uuid.uuid4())[:8].upper(),
-        cashier=request.user,
-        customer=customer,
-        sub_total=totals["sub_total"],
-        total_gst=totals["total_gst"],
-        grand_total=totals["grand_total"],
-        payment_method=payment_method,
-        status="paid",
-        # Optional: If your Invoice model has a transaction_id field, uncomment below:
-        # transaction_id=transaction_id 
-    )
 
-    # 6. MOVE ITEMS TO INVOICE & DEDUCT STOCK
-    for item in cart_items:
-        InvoiceItem.objects.create(
-            invoice=invoice,
-            product=item.product,
-            product_name=item.product.product_name,
-            price_at_sale=item.product.price,
-            quantity=item.quantity
+    # 4-7. LOCK STOCK, CREATE INVOICE, DEDUCT STOCK, CLOSE CART
+    #      (one transaction, constant number of queries)
+    try:
+        invoice, cart = finalize_invoice(
+            cart,
+            cashier=request.user,
+            customer=customer,
+            payment_method=payment_method,
         )
-
-        # Deduct Stock
-        new_stock = item.product.stock_quantity - item.quantity
-        item.product.stock_quantity = max(new_stock, 0)
-        item.product.save()
-
-    # 7. CLOSE CURRENT CART
-    cart.status = "completed"
-    cart.save()
+    except EmptyCart as e:
+        messages.error(request, str(e))
+        return redirect("cashier_dashboard")
+    except CheckoutError as e:
+        messages.error(request, str(e))
+        return redirect("checkout")
 
     # 8. CREATE NEW CART FOR NEXT CUSTOMER
     new_cart = Cart.objects.create(
@@ -716,26 +791,11 @@ def generate_invoice(request):
 
 @login_required
 def print_invoice_pdf(request, invoice_id):
-    invoice = get_object_or_404(Invoice, id=invoice_id)
-    # Call your existing PDF helper function here
+    invoice = get_object_or_404(Invoice.objects.select_related("customer"), id=invoice_id)
+    # Served from the PDF cache on reprints; items are only loaded on a miss
     return generate_invoice_pdf(invoice)
 
 
-@property
-def get_totals(self):
-    items = self.items.all()
-    sub_total = sum(item.total_price for item in items)
-
-    gst_rate = Decimal("0.05")
-    gst = sub_total * gst_rate
-
-    grand = sub_total + gst
-
-    return {
-        "sub_total": round(sub_total, 2),
-        "total_gst": round(gst, 2),
-        "grand_total": round(grand, 2),
-    }
 @login_required
 def remove_cart(request, cart_id):
     cart = Cart.objects.get(id=cart_id, cashier=request.user)
@@ -806,33 +866,31 @@ def checkout_page(request):
 def customer_lookup(request):
     phone = request.GET.get("phone", "")
 
-    
-    if len(phone) < 3:
-        return JsonResponse({"found": False})
+    # Ranked, indexed prefix/suffix matches (see customers.py)
+    candidates = find_customers(phone)
+    if not candidates:
+        return JsonResponse({"found": False, "candidates": []})
 
-    
-    customer = Customer.objects.filter(phone__icontains=phone).first()
-
-    if customer:
-        data = {
-            "found": True,
-            "name": customer.name,
-            "phone": customer.phone,
-            "email": customer.email
-        }
-    else:
-        data = {"found": False}
-    
-    return JsonResponse(data)
+    best = candidates[0]
+    return JsonResponse({
+        "found": True,
+        "exact": normalize_phone(best["phone"]) == normalize_phone(phone),
+        "name": best["name"],
+        "phone": best["phone"],
+        "email": best["email"],
+        "candidates": [
+            {"name": c["name"], "phone": c["phone"], "email": c["email"]} for c in candidates
+        ],
+    })
 
 @login_required
 def sales_report(request):
     if not hasattr(request.user, 'profile') or request.user.profile.role != 'manager':
         return redirect('login')
 
-    sales_data = Invoice.objects.values('created_at__date').annotate(
+    sales_data = invoice_totals().values('date').annotate(
         daily_sales=Sum('grand_total')
-    ).order_by('-created_at__date')
+    ).order_by('-date')
 
     context = {
         'sales_data': sales_data,
@@ -842,9 +900,10 @@ def sales_report(request):
 
 def api_category_revenue(request):
     data = (
-        InvoiceItem.objects
-        .values(category=F('product__category'))
-        .annotate(revenue=Sum(F('price_at_sale') * F('quantity')))
+        SalesRollup.objects
+        .exclude(category=SalesRollup.ALL)
+        .values('category')
+        .annotate(revenue=Sum('revenue'))
         .order_by('-revenue')
     )
 
@@ -852,7 +911,7 @@ def api_category_revenue(request):
 
 def api_cashier_performance(request):
     data = (
-        Invoice.objects
+        invoice_totals()
         .values(cashier_name=F('cashier__username'))
         .annotate(total_sales=Sum('grand_total'))
         .order_by('-total_sales')
@@ -862,71 +921,64 @@ def api_cashier_performance(request):
 
 def api_top_products(request):
     data = (
-        InvoiceItem.objects
-        .values(product_label=F('product__product_name'))
-        .annotate(total_qty=Sum('quantity'))
-        .order_by('-total_qty')[:10]
+        ProductSales.objects
+        .values(product_label=F('product_name'), total_qty=F('units'))
+        .order_by('-units')[:10]
     )
 
     return JsonResponse(list(data), safe=False)
 
 from django.db.models import Sum, F, ExpressionWrapper, DecimalField
 
+# Profit, margin and sales reports read ProductSales (one row per
+# product, kept up to date at checkout) instead of grouping every
+# InvoiceItem on each call.
+
 def api_profit_report(request):
     data = (
-        InvoiceItem.objects
-        .annotate(
-            revenue=F("price_at_sale") * F("quantity"),
-            cost=F("product__cost_price") * F("quantity"),
-            profit=ExpressionWrapper(
-                F("price_at_sale") * F("quantity") - F("product__cost_price") * F("quantity"),
-                output_field=DecimalField(max_digits=10, decimal_places=2)
-            )
-        )
-        .values("product_name")
-        .annotate(
-            total_revenue=Sum("revenue"),
-            total_cost=Sum("cost"),
-            total_profit=Sum("profit")
+        ProductSales.objects
+        .values(
+            "product_name",
+            total_revenue=F("revenue"),
+            total_cost=F("cost"),
+            total_profit=ExpressionWrapper(
+                F("revenue") - F("cost"),
+                output_field=DecimalField(max_digits=14, decimal_places=2)
+            ),
         )
         .order_by("-total_profit")
     )
 
-    return JsonResponse(list(data), safe=False)
+    fields = ["product_name", "total_revenue", "total_cost", "total_profit"]
+    return export_response(request, data, "profit_report", fields) or JsonResponse(list(data), safe=False)
+
+
 def api_margin_report(request):
     data = (
-        InvoiceItem.objects
-        .annotate(
-            revenue=F("price_at_sale") * F("quantity"),
-            cost=F("product__cost_price") * F("quantity"),
-        )
-        .values("product_name")
-        .annotate(
-            total_revenue=Sum("revenue"),
-            total_cost=Sum("cost"),
+        ProductSales.objects
+        .values(
+            "product_name",
+            margin=Case(
+                When(revenue__gt=0, then=Round((F("revenue") - F("cost")) * 100 / F("revenue"), 2)),
+                default=Value(0),
+                output_field=DecimalField(max_digits=9, decimal_places=2),
+            ),
         )
+        .order_by("product_name")
     )
 
-    final = []
-    for d in data:
-        rev = d["total_revenue"]
-        cost = d["total_cost"]
-        margin = ((rev - cost) / rev * 100) if rev > 0 else 0
+    fields = ["product_name", "margin"]
+    return export_response(request, data, "margin_report", fields) or JsonResponse(list(data), safe=False)
 
-        final.append({
-            "product_name": d["product_name"],
-            "margin": round(margin, 2)
-        })
 
-    return JsonResponse(final, safe=False)
 def api_sales_report(request):
     data = (
-        InvoiceItem.objects
-        .values("product_name")
-        .annotate(total_sold=Sum("quantity"))
-        .order_by("-total_sold")
+        ProductSales.objects
+        .values("product_name", total_sold=F("units"))
+        .order_by("-units")
     )
-    return JsonResponse(list(data), safe=False)
+    fields = ["product_name", "total_sold"]
+    return export_response(request, data, "sales_report", fields) or JsonResponse(list(data), safe=False)
 
 
 def api_stock_report(request):
@@ -938,7 +990,8 @@ def api_stock_report(request):
         .values("product_name", "stock_quantity", "stock_value")
         .order_by("product_name")
     )
-    return JsonResponse(list(data), safe=False)
+    fields = ["product_name", "stock_quantity", "stock_value"]
+    return export_response(request, data, "stock_report", fields) or JsonResponse(list(data), safe=False)
 
 def api_manufacturer_report(request):
     data = (
@@ -951,31 +1004,31 @@ def api_manufacturer_report(request):
         )
         .order_by("manufacturer")
     )
-    return JsonResponse(list(data), safe=False)
-    import json
-from django.shortcuts import render
-from .models import Product
+    fields = ["manufacturer", "total_products", "total_stock", "stock_value"]
+    return export_response(request, data, "manufacturer_report", fields) or JsonResponse(list(data), safe=False)
 
 def upload_products(request):
     if request.method == "POST":
         file = request.FILES['json_file']
-        data = json.load(file)
-
-        for item in data:
-            Product.objects.create(
-                product_name=item['product_name'],
-                product_code=item['product_code'],
-                category=item['category'],
-                price=item['price'],
-                cost_price=item['cost_price'],
-                manufacturer=item['manufacturer'],
-                stock_quantity=item['stock_quantity'],
-                low_stock_threshold=item['low_stock_threshold'],
-                description=item['description'],
-                status=item['status']
-            )
 
-        return render(request, 'upload_products.html', {"msg": "Products uploaded successfully!"})
+        # Streamed parse (JSON array / NDJSON / CSV) + batched upserts
+        report = import_products(iter_import_rows(file))
+
+        msg = f"{report['imported']} products imported"
+        if report["failed"]:
+            msg += f", {report['failed']} rows skipped"
+        return render(request, 'upload_products.html', {"msg": msg + ".", "report": report})
 
     return render(request, 'upload_products.html')
 
+
+def metrics(request):
+    # Prometheus scrape target (see instrumentation.py). Needs the
+    # METRICS_TOKEN bearer token or a logged-in superuser; the client
+    # address proves nothing behind a reverse proxy.
+    token = getattr(settings, "METRICS_TOKEN", "")
+    sent = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if not (token and hmac.compare_digest(sent, token)) and not request.user.is_superuser:
+        return HttpResponse(status=403)
+    return HttpResponse(metrics_registry.render(), content_type="text/plain; version=0.0.4")
+
@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import config, Csv
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -29,7 +29,7 @@ SECRET_KEY = config('SECRET_KEY')
 DEBUG = config('DEBUG', default=False, cast=bool)
 
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='', cast=Csv())
 
 
 # Application definition
@@ -41,10 +41,13 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'app',
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware as well
+    'app.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -139,5 +142,13 @@ STATICFILES_DIRS = [
 
 LOGIN_URL = 'login'
 
-RAZORPAY_KEY_ID = config('RAZORPAY_KEY_ID')
-RAZORPAY_KEY_SECRET = config('RAZORPAY_KEY_SECRET')
+# "razorpay" or "local" (in-process stand-in, see app/payments.py)
+PAYMENT_GATEWAY = config('PAYMENT_GATEWAY', default='razorpay')
+RAZORPAY_KEY_ID = config('RAZORPAY_KEY_ID', default='')
+RAZORPAY_KEY_SECRET = config('RAZORPAY_KEY_SECRET', default='')
+LOCAL_GATEWAY_LATENCY = config('LOCAL_GATEWAY_LATENCY', default=0.0, cast=float)
+LOCAL_GATEWAY_FAILURE_RATE = config('LOCAL_GATEWAY_FAILURE_RATE', default=0.0, cast=float)
+
+# Bearer token for Prometheus scrapes of /metrics/ (see app/instrumentation.py).
+# Empty: only logged-in superusers can read it.
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
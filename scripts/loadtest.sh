@@ -0,0 +1,50 @@
+#!/usr/bin/env bash
+# Capacity test: start gunicorn with a fixed number of workers and the
+# local payment gateway, then run the till load generator against it with
+# more and more concurrent cashiers. Throughput stops growing once the
+# workers (or the database) are saturated; divide it by WORKERS for the
+# capacity per core.
+#
+#   pip install gunicorn
+#   WORKERS=4 CASHIERS="4 8 16 32" scripts/loadtest.sh
+#
+# Uses the database from .env, which must not be a live till database:
+# the run creates cashier logins. Data is prefixed LOADGEN; pass
+# CLEANUP=1 to remove it afterwards.
+
+set -euo pipefail
+cd "$(dirname "$0")/.."
+
+WORKERS=${WORKERS:-$(nproc)}
+THREADS=${THREADS:-1}
+CASHIERS=${CASHIERS:-"1 2 4 8 16"}
+SALES=${SALES:-20}
+PORT=${PORT:-8765}
+GATEWAY_LATENCY=${GATEWAY_LATENCY:-0.3}
+EXTRA_ARGS=${EXTRA_ARGS:-}
+
+export PAYMENT_GATEWAY=local
+export LOCAL_GATEWAY_LATENCY=$GATEWAY_LATENCY
+export ALLOWED_HOSTS=127.0.0.1,localhost
+export DEBUG=False
+
+gunicorn billing_system.wsgi:application \
+    --bind 127.0.0.1:$PORT --workers "$WORKERS" --threads "$THREADS" \
+    --access-logfile /dev/null --log-level warning &
+SERVER=$!
+trap 'kill $SERVER 2>/dev/null' EXIT
+
+for _ in $(seq 50); do
+    curl -s -o /dev/null "http://127.0.0.1:$PORT/" && break
+    sleep 0.2
+done
+
+for cashiers in $CASHIERS; do
+    python manage.py loadgen_till --url "http://127.0.0.1:$PORT" \
+        --cashiers "$cashiers" --sales "$SALES" --server-cores "$WORKERS" \
+        --i-know-this-is-not-production $EXTRA_ARGS
+done
+
+if [ "${CLEANUP:-0}" = "1" ]; then
+    python manage.py loadgen_till --cashiers 0 --sales 0 --cleanup
+fi